@@ -0,0 +1,354 @@
+#############################################################################
+# advice_cache.py
+#
+# This file contains the persistent cache for Gemini-generated advice.
+#
+# Advice only changes when the user's workout history changes, so it is
+# stored under a fingerprint of that history. Unchanged history returns the
+# stored advice without calling the model. Entries expire after a TTL.
+#
+# The app runs on several Cloud Run instances whose disks are wiped on
+# restart, and precompute_advice.py fills the cache from elsewhere, so the
+# entries live in a shared BigQuery table (AdviceCache, one row per stored
+# advice, the newest row for a fingerprint wins). Each process keeps the
+# entries it has read or written in memory, so repeat lookups do not query
+# BigQuery. FileAdviceStore keeps the same entries in a local JSON file and
+# is only meant for tests and offline runs.
+#############################################################################
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from google.cloud import bigquery
+
+from bigquery_pool import get_bigquery_client, PROJECT_ID
+
+try:
+    import fcntl
+except ImportError:     # Windows: the file store is then only safe for one process
+    fcntl = None
+
+
+ADVICE_TABLE = f"{PROJECT_ID}.section_e3.AdviceCache"
+ADVICE_TTL = 24 * 60 * 60   # seconds; advice is regenerated daily at most
+MAX_ADVICE_ENTRIES = 5000
+
+# Bump when the prompt or model changes so old advice is not reused
+ADVICE_VERSION = "2"
+
+
+def fingerprint(user_id, workouts, version=ADVICE_VERSION):
+    """
+    Builds a cache key from the user's workout history.
+
+    Args:
+        user_id (str): Owner of the workouts
+        workouts (list): Workout dicts the advice is generated from
+        version (str): Prompt/model version the advice belongs to
+
+    Returns:
+        str: Hex digest that changes whenever the history changes
+    """
+    payload = json.dumps(
+        {"user_id": user_id, "workouts": workouts, "version": version},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class BigQueryAdviceStore:
+    """
+    Advice entries in the shared AdviceCache table.
+
+    The table is partitioned by day of stored_at and clustered on
+    fingerprint, so a lookup reads one fingerprint's rows in the last few
+    partitions.
+
+    Args:
+        table (str): Full table ID
+    """
+
+    def __init__(self, table=ADVICE_TABLE):
+        self.table = table
+
+    def get(self, key, since):
+        """
+        Returns the newest entry for `key` stored at or after `since`.
+
+        Args:
+            key (str): Fingerprint
+            since (float): Unix time; older entries are expired
+
+        Returns:
+            dict: {"advice", "stored_at", "latency"}, or None
+        """
+        query = f"""
+        SELECT advice, UNIX_MICROS(stored_at) / 1000000 AS stored_at, latency
+        FROM `{self.table}`
+        WHERE fingerprint = @fingerprint AND stored_at >= @since
+        ORDER BY stored_at DESC
+        LIMIT 1
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter("fingerprint", "STRING", key),
+            bigquery.ScalarQueryParameter("since", "TIMESTAMP", _as_timestamp(since)),
+        ])
+        for row in get_bigquery_client().query(query, job_config=job_config).result():
+            return {"advice": json.loads(row.advice), "stored_at": row.stored_at, "latency": row.latency or 0.0}
+        return None
+
+    def put(self, key, entry):
+        """Adds an entry; older rows for the same key are shadowed by it."""
+        query = f"""
+        INSERT INTO `{self.table}` (fingerprint, advice, stored_at, latency)
+        VALUES (@fingerprint, @advice, @stored_at, @latency)
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter("fingerprint", "STRING", key),
+            bigquery.ScalarQueryParameter("advice", "STRING", json.dumps(entry["advice"])),
+            bigquery.ScalarQueryParameter("stored_at", "TIMESTAMP", _as_timestamp(entry["stored_at"])),
+            bigquery.ScalarQueryParameter("latency", "FLOAT64", entry["latency"]),
+        ])
+        get_bigquery_client().query(query, job_config=job_config).result()
+
+    def delete_expired(self, before):
+        """Deletes the entries stored before `before` (Unix time)."""
+        query = f"""
+        DELETE FROM `{self.table}`
+        WHERE stored_at < @before
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter("before", "TIMESTAMP", _as_timestamp(before)),
+        ])
+        get_bigquery_client().query(query, job_config=job_config).result()
+
+
+class FileAdviceStore:
+    """
+    Advice entries in a local JSON file, for tests and offline runs.
+
+    Writers take an exclusive lock on `<path>.lock` around the
+    read-merge-write, so processes sharing the file do not lose each
+    other's entries.
+
+    Args:
+        path (str): JSON file the entries are kept in
+        max_entries (int): Entries kept before the oldest are dropped
+    """
+
+    def __init__(self, path, max_entries=MAX_ADVICE_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+
+    def get(self, key, since):
+        """Returns the entry for `key` if it was stored at or after `since`, else None."""
+        entry = self._load().get(key)
+        if entry is None or entry["stored_at"] < since:
+            return None
+        return entry
+
+    def put(self, key, entry):
+        """Adds an entry, keeping whichever of it and the file's entry is newer."""
+        with self._locked():
+            entries = self._load()
+            current = entries.get(key)
+            if current is None or entry["stored_at"] > current["stored_at"]:
+                entries[key] = entry
+            if len(entries) > self.max_entries:
+                newest = sorted(entries.items(), key=lambda item: item[1]["stored_at"])
+                entries = dict(newest[-self.max_entries:])
+            self._save(entries)
+
+    def delete_expired(self, before):
+        """Deletes the entries stored before `before` (Unix time)."""
+        with self._locked():
+            entries = self._load()
+            self._save({key: entry for key, entry in entries.items() if entry["stored_at"] >= before})
+
+    def _locked(self):
+        return _FileLock(f"{self.path}.lock")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading advice cache: {e}")
+            return {}
+
+    def _save(self, entries):
+        # Write to a temporary file first so a crash never leaves half a file
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
+
+
+class _FileLock:
+    """Exclusive advisory lock on a file, held for the duration of a `with` block."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a")
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+def _as_timestamp(unix_time):
+    return datetime.fromtimestamp(unix_time, tz=timezone.utc)
+
+
+class AdviceCache:
+    """
+    Fingerprint-keyed advice cache with a TTL, backed by a shared store.
+
+    Args:
+        store (optional): BigQueryAdviceStore or FileAdviceStore the entries
+            are shared through; None keeps them in this process only
+        ttl (float): Seconds an entry is served before it is regenerated
+        max_entries (int): Entries kept in memory before the oldest are dropped
+    """
+
+    def __init__(self, store=None, ttl=ADVICE_TTL, max_entries=MAX_ADVICE_ENTRIES):
+        self.store = store
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}              # key -> {"advice", "stored_at", "latency"}
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def get(self, key):
+        """Returns the stored advice for `key`, or None if missing or expired."""
+        entry = self._lookup(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.saved_seconds += entry.get("latency", 0.0)
+            return entry["advice"]
+
+    def peek(self, key):
+        """Like get(), but without counting a hit or miss."""
+        entry = self._lookup(key)
+        return entry["advice"] if entry else None
+
+    def set(self, key, advice, latency=0.0):
+        """
+        Stores advice in memory and in the shared store.
+
+        Args:
+            key (str): Fingerprint from fingerprint()
+            advice (dict): Advice returned by the model
+            latency (float): Seconds the model took, counted as saved on each hit
+        """
+        entry = {
+            "advice": advice,
+            "stored_at": time.time(),
+            "latency": latency,
+        }
+        self._remember(key, entry)
+        if self.store is not None:
+            try:
+                self.store.put(key, entry)
+            except Exception as e:
+                print(f"Error saving advice to the shared cache: {e}")
+
+    def purge_expired(self):
+        """Deletes expired entries from the shared store."""
+        if self.store is None:
+            return
+        try:
+            self.store.delete_expired(time.time() - self.ttl)
+        except Exception as e:
+            print(f"Error purging the advice cache: {e}")
+
+    def clear(self):
+        """Drops the entries held in memory and resets the counters."""
+        with self._lock:
+            self._entries = {}
+            self.hits = self.misses = 0
+            self.saved_seconds = 0.0
+
+    def stats(self):
+        """Returns hit/miss counters and the model latency saved by hits."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_seconds": self.saved_seconds,
+                "size": len(self._entries),
+            }
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and not self._expired(entry):
+            return entry
+        if self.store is None:
+            return None
+
+        # Another instance or the precompute job may have stored it
+        try:
+            entry = self.store.get(key, since=time.time() - self.ttl)
+        except Exception as e:
+            print(f"Error reading the shared advice cache: {e}")
+            return None
+        if entry is None or self._expired(entry):
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key, entry):
+        with self._lock:
+            current = self._entries.get(key)
+            if current is None or entry["stored_at"] >= current["stored_at"]:
+                self._entries[key] = entry
+            self._prune()
+
+    def _expired(self, entry):
+        return entry["stored_at"] + self.ttl <= time.time()
+
+    def _prune(self):
+        self._entries = {
+            key: entry for key, entry in self._entries.items()
+            if not self._expired(entry)
+        }
+        if len(self._entries) > self.max_entries:
+            newest = sorted(self._entries.items(), key=lambda item: item[1]["stored_at"])
+            self._entries = dict(newest[-self.max_entries:])
+
+
+# One advice cache per server process, shared by every Streamlit session
+_advice_cache = AdviceCache(store=BigQueryAdviceStore())
+
+
+def get_advice_cache():
+    """Returns the shared advice cache."""
+    return _advice_cache
+
+
+def advice_cache_stats():
+    """Returns the shared advice cache's counters."""
+    return _advice_cache.stats()
@@ -0,0 +1,137 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from advice_cache import ADVICE_TABLE, AdviceCache, BigQueryAdviceStore, FileAdviceStore, fingerprint
+from bigquery_pool import LocalBigQueryBackend, use_local_backend, reset_bigquery_client
+
+
+class TestFingerprint(unittest.TestCase):
+    def test_same_history_same_key(self):
+        workouts = [{"workout_id": "w1", "distance": 5.0}]
+        self.assertEqual(fingerprint("user1", workouts), fingerprint("user1", list(workouts)))
+
+    def test_changed_history_changes_key(self):
+        before = fingerprint("user1", [{"workout_id": "w1"}])
+        self.assertNotEqual(before, fingerprint("user1", [{"workout_id": "w1"}, {"workout_id": "w2"}]))
+        self.assertNotEqual(before, fingerprint("user2", [{"workout_id": "w1"}]))
+        self.assertNotEqual(before, fingerprint("user1", [{"workout_id": "w1"}], version="test"))
+
+
+class TestAdviceCache(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, "advice.json")
+
+    def test_hit_counts_saved_latency(self):
+        cache = AdviceCache(store=FileAdviceStore(self.path))
+        self.assertIsNone(cache.get("key"))
+        cache.set("key", {"content": "Run more."}, latency=2.5)
+
+        self.assertEqual(cache.get("key"), {"content": "Run more."})
+        self.assertEqual(cache.get("key"), {"content": "Run more."})
+
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 1)
+        self.assertAlmostEqual(stats["saved_seconds"], 5.0)
+
+    def test_peek_does_not_count(self):
+        cache = AdviceCache()
+        cache.set("key", {"content": "Rest."})
+        self.assertEqual(cache.peek("key"), {"content": "Rest."})
+        self.assertIsNone(cache.peek("other"))
+        self.assertEqual(cache.stats()["hits"] + cache.stats()["misses"], 0)
+
+    def test_entries_survive_restart(self):
+        AdviceCache(store=FileAdviceStore(self.path)).set("key", {"content": "Stretch."})
+        self.assertEqual(AdviceCache(store=FileAdviceStore(self.path)).get("key"), {"content": "Stretch."})
+
+    def test_separate_processes_share_the_store(self):
+        # The app and the precompute job each hold their own cache
+        app = AdviceCache(store=FileAdviceStore(self.path))
+        job = AdviceCache(store=FileAdviceStore(self.path))
+
+        job.set("precomputed", {"content": "Run easy today."})
+        self.assertEqual(app.get("precomputed"), {"content": "Run easy today."})
+
+        # The app's own save keeps what the job wrote after the app last read
+        job.set("later", {"content": "Rest tomorrow."})
+        app.set("generated", {"content": "Go long."})
+        reloaded = AdviceCache(store=FileAdviceStore(self.path))
+        for key in ["precomputed", "later", "generated"]:
+            self.assertIsNotNone(reloaded.peek(key))
+
+    def test_entries_expire(self):
+        cache = AdviceCache(store=FileAdviceStore(self.path), ttl=60)
+        with patch("advice_cache.time.time", return_value=1000.0):
+            cache.set("key", {"content": "Hydrate."})
+        with patch("advice_cache.time.time", return_value=1061.0):
+            self.assertIsNone(cache.get("key"))
+
+    def test_oldest_entries_are_dropped(self):
+        cache = AdviceCache(max_entries=2)
+        for n, key in enumerate(["a", "b", "c"]):
+            with patch("advice_cache.time.time", return_value=1000.0 + n):
+                cache.set(key, {"content": key})
+        self.assertEqual(cache.stats()["size"], 2)
+        self.assertIsNone(cache.get("a"))
+
+    def test_purge_expired_trims_the_store(self):
+        store = FileAdviceStore(self.path)
+        cache = AdviceCache(store=store, ttl=60)
+        with patch("advice_cache.time.time", return_value=1000.0):
+            cache.set("old", {"content": "Old."})
+        with patch("advice_cache.time.time", return_value=1050.0):
+            cache.set("new", {"content": "New."})
+        with patch("advice_cache.time.time", return_value=1070.0):
+            cache.purge_expired()
+        self.assertIsNone(store.get("old", since=0))
+        self.assertIsNotNone(store.get("new", since=0))
+
+
+class TestBigQueryAdviceStore(unittest.TestCase):
+    def setUp(self):
+        self.backend = LocalBigQueryBackend()
+        use_local_backend(self.backend)
+        self.addCleanup(use_local_backend, None)
+        self.addCleanup(reset_bigquery_client)
+
+    def test_instances_share_advice_through_the_table(self):
+        app = AdviceCache(store=BigQueryAdviceStore())
+        job = AdviceCache(store=BigQueryAdviceStore())
+
+        job.set("key", {"content": "Run easy today."}, latency=2.0)
+        insert, params = self.backend.queries[-1]
+        self.assertIn(f"INSERT INTO `{ADVICE_TABLE}`", insert)
+        self.assertEqual(params["fingerprint"], "key")
+
+        stored_at = params["stored_at"].timestamp()
+        self.backend.add_result("WHERE fingerprint = @fingerprint", lambda query_params: [{
+            "advice": params["advice"], "stored_at": stored_at, "latency": params["latency"],
+        }] if query_params["fingerprint"] == "key" else [])
+
+        self.assertEqual(app.get("key"), {"content": "Run easy today."})
+        self.assertIsNone(app.get("other"))
+        lookups = [q for q, _ in self.backend.queries if "WHERE fingerprint" in q]
+        self.assertEqual(len(lookups), 2)
+
+        # Once read, the entry is served from memory
+        app.get("key")
+        self.assertEqual(len([q for q, _ in self.backend.queries if "WHERE fingerprint" in q]), 2)
+
+    def test_store_errors_are_misses(self):
+        def fail(params):
+            raise Exception("BigQuery error")
+        self.backend.add_result("AdviceCache", fail)
+
+        cache = AdviceCache(store=BigQueryAdviceStore())
+        cache.set("key", {"content": "Rest."})
+        self.assertEqual(cache.get("key"), {"content": "Rest."})
+        self.assertIsNone(cache.get("other"))
+
+
+if __name__ == "__main__":
+    unittest.main()
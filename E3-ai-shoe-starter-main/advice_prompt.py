@@ -0,0 +1,211 @@
+#############################################################################
+# advice_prompt.py
+#
+# This file builds the Gemini prompt for GenAI advice and parses the reply.
+#
+# Instead of pasting every workout into the prompt, the history is reduced
+# to a fixed-size feature summary (this week vs last week, trends, streak,
+# pace and personal bests), so the prompt stays the same size however many
+# workouts a user has. The model is asked to answer in JSON with one field
+# per advice card, which parse_advice turns back into content1-content4.
+#############################################################################
+
+import json
+import re
+from datetime import datetime
+
+import numpy as np
+
+from workout_frame import WorkoutFrame, to_datetime
+
+
+# Advice cards shown by display_genai_advice, in order
+ADVICE_FIELDS = ["content1", "content2", "content3", "content4"]
+
+# "contentN": "text... (the closing quote may not have arrived yet)
+_PARTIAL_FIELD = re.compile(r'"(content\d)"\s*:\s*"((?:[^"\\]|\\.)*\\?)')
+
+ADVICE_INSTRUCTIONS = """
+You are a running coach writing short advice for a fitness app user.
+Use the workout summary below. Do not mention the user's ID or name.
+
+Reply with JSON only, in exactly this shape:
+{
+  "content1": "one or two sentences to keep the user motivated",
+  "content2": "one or two sentences on a challenge to take on next",
+  "content3": "one or two sentences of encouragement based on their progress",
+  "content4": "one or two sentences with a concrete next step"
+}
+"""
+
+
+def summarize_workouts(workouts, now=None):
+    """
+    Reduces a workout history to a fixed-size feature summary.
+
+    Args:
+        workouts (list or WorkoutFrame): Workout dicts or a frame of them
+        now (datetime, optional): Reference time for the weekly windows
+
+    Returns:
+        dict: JSON-serializable features; only {"workouts": 0} if empty
+    """
+    frame = workouts if isinstance(workouts, WorkoutFrame) else WorkoutFrame.from_workouts(workouts)
+    if len(frame) == 0:
+        return {"workouts": 0}
+
+    now = np.datetime64(now or datetime.now(), "us")
+    week = np.timedelta64(7, "D")
+    this_week = frame.select((frame.start > now - week) & (frame.start <= now))
+    last_week = frame.select((frame.start > now - 2 * week) & (frame.start <= now - week))
+
+    last_workout = to_datetime(frame.start.max())
+    days_since_last = (to_datetime(now) - last_workout).days if last_workout else None
+    summary = {
+        "workouts": len(frame),
+        "days_since_last_workout": days_since_last,
+        "this_week": _period_totals(this_week),
+        "last_week": _period_totals(last_week),
+        "distance_change_pct": _percent_change(last_week.total_distance(), this_week.total_distance()),
+        "pace_change_pct": _percent_change(last_week.average_pace(), this_week.average_pace()),
+        # A streak only counts as current if it reaches yesterday or today
+        "current_streak_days": _latest_streak(frame) if days_since_last is not None and days_since_last <= 1 else 0,
+        "personal_bests": _personal_bests(frame),
+    }
+    return summary
+
+
+def build_advice_prompt(summary):
+    """
+    Builds the advice prompt from a feature summary.
+
+    Args:
+        summary (dict): Output of summarize_workouts
+
+    Returns:
+        str: Prompt asking for JSON advice
+    """
+    if not summary.get("workouts"):
+        context = "The user has not logged any workouts yet. Give general motivation to get started."
+    else:
+        context = "Workout summary:\n" + json.dumps(summary, sort_keys=True)
+    return f"{ADVICE_INSTRUCTIONS.strip()}\n\n{context}"
+
+
+def parse_advice(text):
+    """
+    Parses the model's reply into advice card fields.
+
+    Args:
+        text (str): Model reply, ideally the JSON asked for in the prompt
+
+    Returns:
+        dict: content1-content4 (any may be None) and "content", all cards joined
+    """
+    cards = _parse_json_cards(text)
+    if cards is None:
+        # The model ignored the JSON instruction; fall back to sentences
+        cards = split_sentences(text)[:len(ADVICE_FIELDS)]
+
+    advice = {field: None for field in ADVICE_FIELDS}
+    for field, card in zip(ADVICE_FIELDS, cards):
+        advice[field] = card
+    advice["content"] = " ".join(card for card in cards if card)
+    return advice
+
+
+def parse_partial_advice(text):
+    """
+    Extracts the advice cards from a JSON reply that is still streaming in.
+
+    Cards whose string has started are returned with the text received so
+    far, so each card can be shown while the model is still writing it.
+
+    Args:
+        text (str): The reply received so far
+
+    Returns:
+        dict: content1-content4, None for cards that have not started yet
+    """
+    advice = {field: None for field in ADVICE_FIELDS}
+    for match in _PARTIAL_FIELD.finditer(text or ""):
+        field, raw = match.group(1), match.group(2)
+        if field in advice:
+            advice[field] = _decode_partial_string(raw)
+    return advice
+
+
+def split_sentences(text):
+    """Splits text into sentences at '.', '!' or '?' followed by whitespace."""
+    if not text:
+        return []
+    return [part.strip() for part in re.split(r"(?<=[.!?])\s+", text.strip()) if part.strip()]
+
+
+def _decode_partial_string(raw):
+    # Drop a trailing lone backslash whose escaped character has not arrived yet
+    if (len(raw) - len(raw.rstrip("\\"))) % 2:
+        raw = raw[:-1]
+    try:
+        return json.loads(f'"{raw}"')
+    except ValueError:
+        return raw
+
+
+def _parse_json_cards(text):
+    if not text:
+        return None
+    # Strip a ```json ... ``` fence if the model added one
+    cleaned = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip())
+    try:
+        data = json.loads(cleaned)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    cards = [data.get(field) for field in ADVICE_FIELDS]
+    cards = [str(card).strip() if card else None for card in cards]
+    return cards if any(cards) else None
+
+
+def _period_totals(frame):
+    return {
+        "workouts": len(frame),
+        "distance": round(frame.total_distance(), 2),
+        "steps": frame.total_steps(),
+        "calories": round(frame.total_calories(), 1),
+        "minutes": round(frame.total_minutes(), 1),
+        "average_pace": _round(frame.average_pace()),
+    }
+
+
+def _percent_change(before, after):
+    if not before or after is None:
+        return None
+    return round((after - before) / before * 100, 1)
+
+
+def _latest_streak(frame):
+    """Counts consecutive days with a workout, ending on the latest workout day."""
+    days = np.unique(frame.start[~np.isnat(frame.start)].astype("datetime64[D]"))
+    if len(days) == 0:
+        return 0
+    gaps = np.diff(days[::-1]) != np.timedelta64(-1, "D")
+    return int(np.argmax(gaps)) + 1 if gaps.any() else len(days)
+
+
+def _personal_bests(frame):
+    pace = frame.pace()
+    durations = frame.durations_minutes()
+    return {
+        "longest_distance": round(float(frame.distance.max()), 2),
+        "most_steps": int(frame.steps.max()),
+        "most_calories": round(float(frame.calories.max()), 1),
+        "longest_minutes": _round(np.nanmax(durations)) if not np.isnan(durations).all() else None,
+        "fastest_pace": _round(np.nanmin(pace)) if not np.isnan(pace).all() else None,
+    }
+
+
+def _round(value, digits=2):
+    return None if value is None else round(float(value), digits)
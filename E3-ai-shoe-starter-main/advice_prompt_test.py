@@ -0,0 +1,79 @@
+import json
+import unittest
+from datetime import datetime, timedelta
+
+from advice_prompt import build_advice_prompt, parse_advice, split_sentences, summarize_workouts
+
+
+def _workout(n, start, minutes=30, distance=5.0):
+    return {
+        "workout_id": f"w{n}",
+        "start_timestamp": start.isoformat(),
+        "end_timestamp": (start + timedelta(minutes=minutes)).isoformat(),
+        "distance": distance,
+        "steps": 6000,
+        "calories_burned": 300,
+    }
+
+
+class TestSummarizeWorkouts(unittest.TestCase):
+    def setUp(self):
+        self.now = datetime(2024, 3, 15, 20, 0)
+
+    def test_weekly_windows_and_trend(self):
+        workouts = [
+            _workout(1, self.now - timedelta(days=1), distance=6.0),
+            _workout(2, self.now - timedelta(days=2), distance=6.0),
+            _workout(3, self.now - timedelta(days=9), distance=4.0),
+        ]
+        summary = summarize_workouts(workouts, now=self.now)
+        self.assertEqual(summary["this_week"]["workouts"], 2)
+        self.assertEqual(summary["this_week"]["distance"], 12.0)
+        self.assertEqual(summary["last_week"]["distance"], 4.0)
+        self.assertEqual(summary["distance_change_pct"], 200.0)
+        self.assertEqual(summary["current_streak_days"], 2)
+        self.assertEqual(summary["days_since_last_workout"], 1)
+        self.assertEqual(summary["personal_bests"]["longest_distance"], 6.0)
+        self.assertEqual(summary["personal_bests"]["fastest_pace"], 5.0)
+
+    def test_streak_is_zero_after_a_break(self):
+        summary = summarize_workouts([_workout(1, self.now - timedelta(days=5))], now=self.now)
+        self.assertEqual(summary["current_streak_days"], 0)
+
+    def test_prompt_size_is_bounded(self):
+        few = [_workout(n, self.now - timedelta(days=n)) for n in range(5)]
+        many = [_workout(n, self.now - timedelta(hours=n)) for n in range(2000)]
+        small = build_advice_prompt(summarize_workouts(few, now=self.now))
+        large = build_advice_prompt(summarize_workouts(many, now=self.now))
+        self.assertLess(abs(len(large) - len(small)), 100)
+
+    def test_no_workouts(self):
+        summary = summarize_workouts([])
+        self.assertEqual(summary, {"workouts": 0})
+        self.assertIn("not logged any workouts", build_advice_prompt(summary))
+
+
+class TestParseAdvice(unittest.TestCase):
+    def test_json_reply(self):
+        reply = json.dumps({"content1": "A.", "content2": "B.", "content3": "C.", "content4": "D."})
+        advice = parse_advice(reply)
+        self.assertEqual(advice["content3"], "C.")
+        self.assertEqual(advice["content"], "A. B. C. D.")
+
+    def test_fenced_json_reply(self):
+        advice = parse_advice('```json\n{"content1": "Run 5 km.", "content2": "Rest."}\n```')
+        self.assertEqual(advice["content1"], "Run 5 km.")
+        self.assertIsNone(advice["content4"])
+
+    def test_plain_text_falls_back_to_sentences(self):
+        advice = parse_advice("Great week! Add a 2.5 km run. Why not stretch? Sleep well.")
+        self.assertEqual(advice["content1"], "Great week!")
+        self.assertEqual(advice["content2"], "Add a 2.5 km run.")
+        self.assertEqual(advice["content4"], "Sleep well.")
+
+    def test_split_sentences_keeps_decimals(self):
+        self.assertEqual(split_sentences("Pace was 5.5 min/km. Nice"), ["Pace was 5.5 min/km.", "Nice"])
+
+
+if __name__ == "__main__":
+    unittest.main()
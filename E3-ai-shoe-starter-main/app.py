@@ -14,23 +14,22 @@ from modules import (
     display_post,
     display_genai_advice,
     display_activity_summary,
-    display_recent_workouts,
     display_my_community_page,
     display_sidebar,
     handle_auth,
     logout,
-    get_user_id_from_auth0_id,
     show_activity_page,
     display_share_stats,
     display_share_post,
     handle_new_user,
-    display_challenges,
+    display_challenge_catalog,
     display_leaderboard,
     display_single_user_challenges,
     display_create_challenge_ui,
     display_log_workout_ui,
     load_global_css,
-    show_friend_section
+    show_friend_section,
+    display_workout_history,
    
     
     
@@ -38,20 +37,19 @@ from modules import (
 from data_fetcher import (
     get_user_posts,
     get_genai_advice,
-    get_user_profile,
     get_user_sensor_data,
-    get_user_workouts,
     get_data_for_community_page,
     create_user_post,
     insert_new_user,
    
 )
 from challenge_fetcher import (
-    get_challenges,
     get_user_points,
     get_single_user_challenges,
     
 )
+from identity import get_identity, current_profile
+from write_pipeline import start_write_pipeline
 
 
 
@@ -127,11 +125,11 @@ def display_app_content(user_id):
     # Display selected page content
     if page == "Home":
         
-        mockdata = get_data_for_community_page(user_id)
+        mockdata = get_data_for_community_page(user_id, profile=current_profile())
         display_my_community_page(mockdata)
 
     elif page == "Post":
-        profile = get_user_profile(user_id)
+        profile = current_profile()
 
         
         if profile is None:
@@ -167,7 +165,7 @@ def display_app_content(user_id):
 
     elif page == "GenAI Advice":
 
-        profile = get_user_profile(user_id)
+        profile = current_profile()
         if profile is None:
             st.error("User profile not found.")
             return
@@ -182,7 +180,7 @@ def display_app_content(user_id):
             f"<p style='text-align: center;'>After analyzing your previous workouts, here is some tailored advice just for you, {full_name}!</p>",
             unsafe_allow_html=True,
         )
-        display_genai_advice(user_id)
+        display_genai_advice(user_id, stream=True)
 
     
     elif page == "Activity Summary":
@@ -194,34 +192,15 @@ def display_app_content(user_id):
     elif page == "Recent Workouts":
         st.header("My Recent Workouts")
  
-        workouts_list = get_user_workouts(user_id)
-        display_recent_workouts(workouts_list)
+        display_workout_history(user_id)
 
         display_log_workout_ui()
 
     elif page == "Challenges":
             st.title("Challenge Yourself! 🏆")
             display_create_challenge_ui()
-            # Display tabs for different challenge statuses
-            tab1, tab2, tab3 = st.tabs(["Active Challenges", "Upcoming Challenges", "Past Challenges"])
-            
-            with tab1:
-                st.header("Active Challenges")
-                st.markdown("----------------")
-                active_challenges = get_challenges(status="active")
-                display_challenges(active_challenges)
-                
-            with tab2:
-                st.header("Upcoming Challenges")
-                st.markdown("----------------")
-                upcoming_challenges = get_challenges(status="upcoming")
-                display_challenges(upcoming_challenges)
-                
-            with tab3:
-                st.header("Past Challenges")
-                st.markdown("----------------")
-                closed_challenges = get_challenges(status="closed")
-                display_challenges(closed_challenges)
+            # One catalog query, only the selected status is rendered
+            display_challenge_catalog()
                 
     elif page == "My Challenges":
 
@@ -252,6 +231,8 @@ def main():
     """
     Main application function.
     """
+    # Replay writes a previous instance could not finish
+    start_write_pipeline()
     load_global_css()
     # Always display the sidebar with logo
     display_sidebar()
@@ -259,17 +240,11 @@ def main():
     if not st.session_state["logged_in"]:
         display_login_page()
     else:
-        # Get Auth0 ID from session state after login
-        auth0_id = st.session_state["user_id"]
-        
-        # Try to find the internal user ID associated with this Auth0 ID
-        user_id = get_user_id_from_auth0_id(auth0_id)
-    
-        
-        # Check if user has a profile
-        profile = None
-        if user_id:
-            profile = get_user_profile(user_id)
+        # Resolve the Auth0 ID to our user ID and profile once per session
+        identity = get_identity()
+        auth0_id = identity["auth0_id"]
+        user_id = identity["user_id"]
+        profile = identity["profile"]
             
         
         # If no profile exists, show the new user form
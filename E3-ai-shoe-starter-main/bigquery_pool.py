@@ -0,0 +1,262 @@
+#############################################################################
+# bigquery_pool.py
+#
+# This file contains the process-wide BigQuery client used by every fetcher.
+#
+# Building a bigquery.Client resolves credentials and opens a new HTTP session,
+# so we build it once per server process and share it between Streamlit
+# sessions. A local stand-in backend can be swapped in for offline runs/tests.
+#############################################################################
+
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+
+import google.auth.transport.requests
+import requests.adapters
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+
+PROJECT_ID = "e3-ai-shoe-starter"
+
+# HTTP connection pool sizing. Streamlit serves every session from its own
+# thread, so the pool needs to be at least as large as the number of
+# concurrent reruns we expect to hit BigQuery at the same time.
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 32
+HTTP_MAX_RETRIES = 3
+
+# Refresh the access token this long before it actually expires, so that no
+# request ever has to wait for a token refresh in the middle of a page load.
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+
+class BigQueryClientProvider:
+    """
+    Thread-safe holder for one long-lived BigQuery client.
+
+    Args:
+        project (str): Google Cloud project the client is bound to
+        pool_connections (int): Number of host pools kept by the HTTP adapter
+        pool_maxsize (int): Maximum open connections per host pool
+        refresh_margin (timedelta): How early to refresh the access token
+    """
+
+    def __init__(self, project=PROJECT_ID, pool_connections=POOL_CONNECTIONS,
+                 pool_maxsize=POOL_MAXSIZE, refresh_margin=TOKEN_REFRESH_MARGIN):
+        self.project = project
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.refresh_margin = refresh_margin
+        self._client = None
+        self._backend = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def get_client(self):
+        """Returns the shared client, building it on first use."""
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._backend or self._build_client()
+                client = self._client
+
+        if self._backend is None:
+            self._refresh_credentials(client)
+        return client
+
+    def set_backend(self, backend):
+        """
+        Replaces the real BigQuery client with a stand-in backend.
+
+        Args:
+            backend: Any object exposing the bigquery.Client methods the app
+                uses (e.g. LocalBigQueryBackend), or None to go back to BigQuery
+        """
+        with self._lock:
+            self._backend = backend
+            self._client = backend
+
+    def reset(self):
+        """Drops the cached client so the next call builds a fresh one."""
+        with self._lock:
+            self._client = self._backend
+
+    def _build_client(self):
+        client = bigquery.Client(project=self.project)
+
+        # Mount a larger connection pool on the client's authorized session so
+        # concurrent reruns reuse warm TLS connections instead of opening new ones.
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=HTTP_MAX_RETRIES,
+        )
+        client._http.mount("https://", adapter)
+        return client
+
+    def _refresh_credentials(self, client):
+        credentials = getattr(client, "_credentials", None)
+        if not _token_is_stale(credentials, self.refresh_margin):
+            return
+
+        with self._refresh_lock:
+            # Another thread may have refreshed while we waited for the lock
+            if not _token_is_stale(credentials, self.refresh_margin):
+                return
+            try:
+                credentials.refresh(google.auth.transport.requests.Request())
+            except Exception as e:
+                # The authorized session will retry the refresh on its own
+                print(f"Error refreshing BigQuery credentials: {e}")
+
+
+def _token_is_stale(credentials, margin):
+    """Returns True when the credentials' token expires within `margin`."""
+    expiry = getattr(credentials, "expiry", None)
+    if not isinstance(expiry, datetime):
+        # No token fetched yet; the session fetches one on the first request
+        return False
+    # google-auth stores expiry as a naive UTC datetime
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return expiry - margin <= now
+
+
+_provider = BigQueryClientProvider()
+
+
+def get_bigquery_client():
+    """Returns the process-wide BigQuery client shared by every fetcher."""
+    return _provider.get_client()
+
+
+def use_local_backend(backend):
+    """Routes every fetcher to `backend` (pass None to restore BigQuery)."""
+    _provider.set_backend(backend)
+
+
+def reset_bigquery_client():
+    """Forgets the shared client; the next fetch builds a new one."""
+    _provider.reset()
+
+
+# LOCAL BACKEND
+
+class LocalRow(dict):
+    """A result row that supports both row["col"] and row.col access."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class LocalRowIterator:
+    """Iterable query result that can also be consumed page by page."""
+
+    def __init__(self, rows, page_size=None):
+        self._rows = [row if isinstance(row, LocalRow) else LocalRow(row) for row in rows]
+        self.page_size = page_size
+        self.total_rows = len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    @property
+    def pages(self):
+        size = self.page_size or max(self.total_rows, 1)
+        for start in range(0, self.total_rows, size):
+            yield iter(self._rows[start:start + size])
+
+
+class LocalQueryJob:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def result(self, page_size=None, max_results=None, timeout=None):
+        rows = self._rows if max_results is None else self._rows[:max_results]
+        return LocalRowIterator(rows, page_size=page_size)
+
+
+class LocalLoadJob:
+    def __init__(self, output_rows):
+        self.output_rows = output_rows
+
+    def result(self, timeout=None):
+        return self
+
+
+class LocalBigQueryBackend:
+    """
+    In-memory stand-in for bigquery.Client, for offline runs and tests.
+
+    Canned results are registered against a substring of the SQL text with
+    add_result(). Every query, its parameters and every inserted row are
+    recorded so callers can assert on what would have been sent to BigQuery.
+    Rows from load jobs are recorded alongside inserted rows, and get_table()
+    finds every table rows went into.
+    """
+
+    def __init__(self, project=PROJECT_ID):
+        self.project = project
+        self.queries = []
+        self.inserted_rows = {}
+        self.load_jobs = []
+        self._results = []
+
+    def add_result(self, match, rows):
+        """
+        Registers the rows returned by any query whose SQL contains `match`.
+
+        Args:
+            match (str): Substring of the SQL text to match on
+            rows: List of dicts, or a callable taking the query parameters
+                (as a dict) and returning a list of dicts
+
+        Later registrations win over earlier ones for the same query.
+        """
+        self._results.append((match, rows))
+
+    def query(self, query, job_config=None, **kwargs):
+        params = _params_to_dict(job_config)
+        self.queries.append((query, params))
+
+        for match, rows in reversed(self._results):
+            if match in query:
+                return LocalQueryJob(list(rows(params) if callable(rows) else rows))
+        return LocalQueryJob([])
+
+    def get_table(self, table):
+        """Returns the table if rows were inserted or loaded into it, else raises NotFound."""
+        if str(table) not in self.inserted_rows:
+            raise NotFound(f"Table {table} not found")
+        return bigquery.Table(str(table))
+
+    def insert_rows_json(self, table, json_rows, row_ids=None, **kwargs):
+        self.inserted_rows.setdefault(str(table), []).extend(json_rows)
+        return []
+
+    def load_table_from_file(self, file_obj, destination, job_config=None, **kwargs):
+        source_format = getattr(job_config, "source_format", None) or "NEWLINE_DELIMITED_JSON"
+        if source_format == "PARQUET":
+            import pyarrow.parquet as pq
+            rows = pq.read_table(file_obj).to_pylist()
+        else:
+            rows = [json.loads(line) for line in file_obj.read().decode("utf-8").splitlines() if line.strip()]
+
+        self.load_jobs.append((str(destination), source_format, getattr(job_config, "write_disposition", None)))
+        self.inserted_rows.setdefault(str(destination), []).extend(rows)
+        return LocalLoadJob(len(rows))
+
+
+def _params_to_dict(job_config):
+    params = {}
+    for param in getattr(job_config, "query_parameters", None) or []:
+        if hasattr(param, "values"):
+            params[param.name] = list(param.values)
+        else:
+            params[param.name] = param.value
+    return params
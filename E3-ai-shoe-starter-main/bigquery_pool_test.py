@@ -0,0 +1,133 @@
+import threading
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch, MagicMock
+
+from google.cloud import bigquery
+from bigquery_pool import (
+    BigQueryClientProvider,
+    LocalBigQueryBackend,
+    get_bigquery_client,
+    use_local_backend,
+    reset_bigquery_client,
+)
+from query_cache import clear_cache
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class TestBigQueryClientProvider(unittest.TestCase):
+    @patch("bigquery_pool.bigquery.Client")
+    def test_client_is_built_once(self, mock_bigquery_client):
+        provider = BigQueryClientProvider()
+
+        first = provider.get_client()
+        second = provider.get_client()
+
+        self.assertIs(first, second)
+        mock_bigquery_client.assert_called_once_with(project="e3-ai-shoe-starter")
+
+    @patch("bigquery_pool.bigquery.Client")
+    def test_client_is_built_once_across_threads(self, mock_bigquery_client):
+        provider = BigQueryClientProvider()
+        clients = []
+
+        threads = [threading.Thread(target=lambda: clients.append(provider.get_client())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(map(id, clients))), 1)
+        mock_bigquery_client.assert_called_once()
+
+    @patch("bigquery_pool.bigquery.Client")
+    def test_connection_pool_is_mounted(self, mock_bigquery_client):
+        provider = BigQueryClientProvider(pool_maxsize=64)
+
+        client = provider.get_client()
+
+        client._http.mount.assert_called_once()
+        prefix, adapter = client._http.mount.call_args[0]
+        self.assertEqual(prefix, "https://")
+        self.assertEqual(adapter._pool_maxsize, 64)
+
+    @patch("bigquery_pool.bigquery.Client")
+    def test_stale_token_is_refreshed(self, mock_bigquery_client):
+        credentials = MagicMock(expiry=_utcnow() + timedelta(minutes=1))
+        mock_bigquery_client.return_value._credentials = credentials
+        provider = BigQueryClientProvider(refresh_margin=timedelta(minutes=5))
+
+        provider.get_client()
+
+        credentials.refresh.assert_called_once()
+
+    @patch("bigquery_pool.bigquery.Client")
+    def test_fresh_token_is_not_refreshed(self, mock_bigquery_client):
+        credentials = MagicMock(expiry=_utcnow() + timedelta(minutes=30))
+        mock_bigquery_client.return_value._credentials = credentials
+        provider = BigQueryClientProvider(refresh_margin=timedelta(minutes=5))
+
+        provider.get_client()
+
+        credentials.refresh.assert_not_called()
+
+    @patch("bigquery_pool.bigquery.Client")
+    def test_reset_builds_new_client(self, mock_bigquery_client):
+        provider = BigQueryClientProvider()
+        provider.get_client()
+        provider.reset()
+        provider.get_client()
+
+        self.assertEqual(mock_bigquery_client.call_count, 2)
+
+
+class TestLocalBigQueryBackend(unittest.TestCase):
+    def setUp(self):
+        self.backend = LocalBigQueryBackend()
+        use_local_backend(self.backend)
+        self.addCleanup(use_local_backend, None)
+        self.addCleanup(reset_bigquery_client)
+        clear_cache()
+        self.addCleanup(clear_cache)
+
+    def test_fetchers_use_local_backend(self):
+        from data_fetcher import get_user_posts
+
+        self.backend.add_result("FROM `e3-ai-shoe-starter.section_e3.Posts`", [{
+            "user_id": "user1",
+            "post_id": "post1",
+            "timestamp": "2024-07-29 12:00:00",
+            "content": "Hello",
+            "image": None,
+        }])
+
+        posts = get_user_posts("user1")
+
+        self.assertIs(get_bigquery_client(), self.backend)
+        self.assertEqual(posts[0]["post_id"], "post1")
+        query, params = self.backend.queries[0]
+        self.assertEqual(params, {"user_id": "user1"})
+
+    def test_callable_results_receive_params(self):
+        self.backend.add_result("SELECT", lambda params: [{"value": params["x"] * 2}])
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter("x", "INT64", 21),
+        ])
+
+        rows = list(self.backend.query("SELECT @x", job_config=job_config).result())
+
+        self.assertEqual(rows[0].value, 42)
+
+    def test_result_pages(self):
+        self.backend.add_result("SELECT", [{"n": n} for n in range(5)])
+
+        pages = list(self.backend.query("SELECT n").result(page_size=2).pages)
+
+        self.assertEqual([len(list(page)) for page in pages], [2, 2, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
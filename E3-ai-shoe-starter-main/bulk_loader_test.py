@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+from unittest.mock import MagicMock
+
+from google.api_core.exceptions import NotFound
+
+from bigquery_pool import LocalBigQueryBackend, use_local_backend, reset_bigquery_client
+from bulk_loader import LoadSource, bulk_load, load_rows, sources_from_directory
+from synthetic_data import SyntheticDataset, write_dataset
+
+
+CHALLENGES_TABLE = "e3-ai-shoe-starter.section_e3.Challenges"
+
+
+class TestBulkLoader(unittest.TestCase):
+    def setUp(self):
+        self.backend = LocalBigQueryBackend()
+        use_local_backend(self.backend)
+        self.addCleanup(use_local_backend, None)
+        self.addCleanup(reset_bigquery_client)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_rows_are_loaded_in_one_job(self):
+        rows = [{"challenge_id": f"c{n}", "title": "Run", "start_date": date(2025, 1, 1),
+                 "end_date": date(2025, 2, 1), "status": "active"} for n in range(50)]
+
+        result = load_rows("Challenges", rows)
+
+        self.assertEqual(result["rows"], 50)
+        self.assertGreater(result["bytes"], 0)
+        self.assertEqual(len(self.backend.load_jobs), 1)
+        self.assertEqual(self.backend.queries, [])
+        loaded = self.backend.inserted_rows[CHALLENGES_TABLE]
+        self.assertEqual(loaded[0]["start_date"], "2025-01-01")
+
+    def test_dry_run_counts_without_loading(self):
+        result = bulk_load([LoadSource("UserPoints", rows=[{"user_id": "u1", "total_points": 5}])], dry_run=True)
+
+        self.assertEqual(result["rows"], 1)
+        self.assertGreater(result["bytes"], 0)
+        self.assertEqual(self.backend.load_jobs, [])
+
+    def test_directory_is_loaded_one_job_per_table(self):
+        dataset = SyntheticDataset(users=10, workouts_per_user=3, challenges=4, sensor_ratio=0.0, as_of=date(2025, 6, 1))
+        written = write_dataset(dataset, self.tmp.name, tables=["Users", "Workouts", "Challenges"])
+
+        result = bulk_load(sources_from_directory(self.tmp.name), concurrency=3)
+
+        self.assertEqual(result["failed"], [])
+        self.assertEqual(len(self.backend.load_jobs), 3)
+        for table, info in written.items():
+            self.assertEqual(result["tables"][table]["rows"], info["rows"])
+            self.assertEqual(result["tables"][table]["bytes"], os.path.getsize(info["path"]))
+
+    def test_failed_table_is_reported(self):
+        client = MagicMock()
+        client.load_table_from_file.side_effect = Exception("quota")
+
+        result = bulk_load([LoadSource("Users", rows=[{"UserId": "u1"}])], client=client)
+
+        self.assertEqual(result["failed"], ["Users"])
+        self.assertEqual(result["tables"]["Users"]["error"], "quota")
+
+    def test_existing_table_keeps_its_schema(self):
+        rows = [{"challenge_id": "c1", "title": "Run", "start_date": date(2025, 1, 1),
+                 "end_date": date(2025, 2, 1), "status": "active"}]
+        client = MagicMock()
+        client.get_table.side_effect = NotFound("missing")
+        load_rows("Challenges", rows, client=client)
+        self.assertEqual(client.load_table_from_file.call_args[1]["job_config"].schema[0].name, "challenge_id")
+
+        client.get_table.side_effect = None
+        load_rows("Challenges", rows, client=client)
+        self.assertIsNone(client.load_table_from_file.call_args[1]["job_config"].schema)
+
+    def test_source_needs_rows_or_path(self):
+        with self.assertRaises(ValueError):
+            LoadSource("Users")
+        with self.assertRaises(ValueError):
+            LoadSource("NotATable", rows=[])
+
+
+if __name__ == "__main__":
+    unittest.main()
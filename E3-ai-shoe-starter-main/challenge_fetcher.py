@@ -1,12 +1,28 @@
 from google.cloud import bigquery
+from bigquery_pool import get_bigquery_client
+from query_cache import cached_query, cached_value, invalidate
+from write_pipeline import enqueue_row
+from ids import normalize_id
+from leaderboard import award_points, points_totals_sql
+from challenge_status import CHALLENGE_STATUSES, derive_status, status_filter_sql, status_sql, utc_today
+import time
 import uuid
 from datetime import datetime, timezone, date
 
 
+# New workouts are written through the batched write pipeline
+WORKOUTS_TABLE = "e3-ai-shoe-starter.section_e3.Workouts"
+
+# Attempts at the activity transaction when a concurrent log aborts it
+ACTIVITY_RETRIES = 3
+
 
 def get_challenges(status=None):
     """
     Fetches all challenges from BigQuery, optionally filtered by status.
+
+    Status comes from each challenge's dates (see challenge_status.py), not
+    from the stored column, so it is current even before the daily job runs.
     
     Args:
         status (str, optional): Challenge status to filter by (e.g., 'active', 'closed')
@@ -15,63 +31,93 @@ def get_challenges(status=None):
         list: List of challenge dictionaries
     """
     try:
-        client = bigquery.Client(project="e3-ai-shoe-starter")
+        return _fetch_challenges(status)
+    except Exception as e:
+        print(f"❌ Error retrieving challenges: {e}")
+        return []
 
-        query = """
-        SELECT 
-            challenge_id,
-            title,
-            rules,
-            difficulty,
-            FORMAT_DATE('%Y-%m-%d', start_date) as start_date,
-            FORMAT_DATE('%Y-%m-%d', end_date) as end_date,
-            max_participants,
-            status,
-            goal_miles,
-            goal_runs,
-            points
-        FROM `e3-ai-shoe-starter.section_e3.Challenges`
-        """
 
-        if status:
-            query += " WHERE status = @status"
-            query_params = [bigquery.ScalarQueryParameter("status", "STRING", status)]
-            job_config = bigquery.QueryJobConfig(query_parameters=query_params)
-        else:
-            job_config = bigquery.QueryJobConfig()
+def _fetch_challenges(status=None, today=None):
+    client = get_bigquery_client()
+
+    query = f"""
+    SELECT 
+        challenge_id,
+        title,
+        rules,
+        difficulty,
+        FORMAT_DATE('%Y-%m-%d', start_date) as start_date,
+        FORMAT_DATE('%Y-%m-%d', end_date) as end_date,
+        max_participants,
+        {status_sql()} AS status,
+        goal_miles,
+        goal_runs,
+        points
+    FROM `e3-ai-shoe-starter.section_e3.Challenges`
+    """
 
-        query_job = client.query(query, job_config=job_config)
-        results = query_job.result()
+    if status:
+        # Compares the dates, so blocks of other statuses are skipped
+        query += f" WHERE {status_filter_sql(status)}"
 
-        challenges = []
-        for row in results:
-            challenges.append({
-                "challenge_id": row.challenge_id,
-                "title": row.title,
-                "rules": row.rules,
-                "difficulty": row.difficulty,
-                "start_date": row.start_date,
-                "end_date": row.end_date,
-                "max_participants": row.max_participants,
-                "status": row.status,
-                "goal_miles": row.goal_miles,
-                "goal_runs": row.goal_runs,
-                "points": row.points
-            })
+    # Today is a parameter, so cached results are not reused on a later day
+    query_params = [bigquery.ScalarQueryParameter("today", "DATE", today or utc_today())]
+    job_config = bigquery.QueryJobConfig(query_parameters=query_params)
+
+    results = cached_query(client, query, job_config, tags=["challenges"])
+
+    challenges = []
+    for row in results:
+        challenges.append({
+            "challenge_id": row.challenge_id,
+            "title": row.title,
+            "rules": row.rules,
+            "difficulty": row.difficulty,
+            "start_date": row.start_date,
+            "end_date": row.end_date,
+            "max_participants": row.max_participants,
+            "status": row.status,
+            "goal_miles": row.goal_miles,
+            "goal_runs": row.goal_runs,
+            "points": row.points
+        })
+
+    return challenges
 
-        return challenges
 
+def get_challenge_catalog():
+    """
+    Fetches every challenge with one query and groups them by status.
+
+    The grouped result is cached for the day until a challenge is created,
+    so the Challenges page costs at most one query however many tabs are
+    opened.
+
+    Returns:
+        dict: status ('active', 'upcoming', 'closed') -> list of challenge
+            dictionaries; every list is empty if the query fails
+    """
+    today = utc_today()
+
+    def compute():
+        catalog = {status: [] for status in CHALLENGE_STATUSES}
+        for challenge in _fetch_challenges(today=today):
+            catalog.setdefault(challenge["status"], []).append(challenge)
+        return catalog
+
+    try:
+        return cached_value(("challenge_catalog", today), compute, tags=["challenges"])
     except Exception as e:
         print(f"❌ Error retrieving challenges: {e}")
-        return []
+        return {status: [] for status in CHALLENGE_STATUSES}
 
 
 def create_challenge(title, rules, difficulty, start_date, end_date,
                      goal_miles, goal_runs, points, max_participants=None):
-    client = bigquery.Client(project="e3-ai-shoe-starter")
+    client = get_bigquery_client()
 
-    challenge_id = str(uuid.uuid4())
-    status = "upcoming"
+    challenge_id = normalize_id(uuid.uuid4())
+    status = derive_status(start_date, end_date)
 
     query = """
     INSERT INTO `e3-ai-shoe-starter.section_e3.Challenges` (
@@ -102,112 +148,163 @@ def create_challenge(title, rules, difficulty, start_date, end_date,
 
     job_config = bigquery.QueryJobConfig(query_parameters=params)
     client.query(query, job_config=job_config).result()
+    invalidate("challenges")
 
     return challenge_id
 
 
-def log_user_activity(user_id, challenge_id, miles_logged, runs_logged):
-    
+def log_user_activity(user_id, challenge_id, miles_logged, runs_logged, return_progress=False):
+    """
+    Adds miles and runs to a user's active challenge and awards its points
+    when the goal is reached.
+
+    Everything runs as one BigQuery script inside a transaction: the
+    progress update, the completion check, marking the challenge done and
+    appending the award to the points ledger either all happen or none do. The challenge is only
+    marked done (and points awarded) while it is still 'active', so two
+    logs racing each other cannot award the points twice. Activity only
+    counts between the challenge's start and end dates.
+
+    Args:
+        user_id (str): User logging the activity
+        challenge_id (str): Challenge the activity counts towards
+        miles_logged (float): Miles to add
+        runs_logged (int): Runs to add
+        return_progress (bool): Also return the progress after the update
 
-    client = bigquery.Client(project="e3-ai-shoe-starter")
-    user_id = str(user_id).strip()
-    challenge_id = str(challenge_id).strip()
+    Returns:
+        str: Message for the user, or (message, progress dict) when
+            return_progress is True; progress is None if nothing was found
+    """
+    client = get_bigquery_client()
+    user_id = normalize_id(user_id)
+    challenge_id = normalize_id(challenge_id)
 
     try:
-        print(f"[INFO] Starting activity logging for user: {user_id}, challenge: {challenge_id}")
+        print(f"[INFO] Logging activity for user: {user_id}, challenge: {challenge_id}")
         print(f"[INFO] Miles: {miles_logged}, Runs: {runs_logged}")
 
-        # Step 1: Update activity
-        update_activity_query = """
+        script = f"""
+        DECLARE completed BOOL DEFAULT FALSE;
+        DECLARE awarded INT64 DEFAULT 0;
+
+        BEGIN TRANSACTION;
+
         UPDATE `e3-ai-shoe-starter.section_e3.UserChallenges`
         SET 
             miles_completed = miles_completed + @miles_logged,
             runs_completed = runs_completed + @runs_logged
         WHERE 
-            TRIM(user_id) = TRIM(@user_id)
-            AND TRIM(challenge_id) = TRIM(@challenge_id)
+            user_id = @user_id
+            AND challenge_id = @challenge_id
             AND status = 'active'
-        """
-        update_params = [
-            bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
-            bigquery.ScalarQueryParameter("challenge_id", "STRING", challenge_id),
-            bigquery.ScalarQueryParameter("miles_logged", "FLOAT", miles_logged),
-            bigquery.ScalarQueryParameter("runs_logged", "INT64", runs_logged),
-        ]
-        job_config = bigquery.QueryJobConfig(query_parameters=update_params)
-        print("[INFO] Running update_activity_query...")
-        client.query(update_activity_query, job_config=job_config).result()
+            AND challenge_id IN (
+                SELECT challenge_id
+                FROM `e3-ai-shoe-starter.section_e3.Challenges`
+                WHERE {status_filter_sql("active", today="CURRENT_DATE()")}
+            );
+
+        SET (completed, awarded) = (
+            SELECT AS STRUCT
+                uc.miles_completed >= IFNULL(c.goal_miles, 0)
+                    AND uc.runs_completed >= IFNULL(c.goal_runs, 0),
+                IFNULL(c.points, 0)
+            FROM `e3-ai-shoe-starter.section_e3.UserChallenges` uc
+            JOIN `e3-ai-shoe-starter.section_e3.Challenges` c
+            ON uc.challenge_id = c.challenge_id
+            WHERE uc.user_id = @user_id
+                AND uc.challenge_id = @challenge_id
+                AND uc.status = 'active'
+            LIMIT 1
+        );
+
+        IF IFNULL(completed, FALSE) THEN
+            UPDATE `e3-ai-shoe-starter.section_e3.UserChallenges`
+            SET status = 'done'
+            WHERE user_id = @user_id
+                AND challenge_id = @challenge_id
+                AND status = 'active';
+
+            -- Append-only: concurrent awards never touch the same row
+            INSERT INTO `e3-ai-shoe-starter.section_e3.PointsLedger`
+                (award_id, user_id, challenge_id, points, awarded_at)
+            VALUES (GENERATE_UUID(), @user_id, @challenge_id, awarded, CURRENT_TIMESTAMP());
+        END IF;
+
+        COMMIT TRANSACTION;
 
-        # Step 2: Fetch progress
-        fetch_query = """
         SELECT 
             uc.miles_completed,
             uc.runs_completed,
+            uc.status,
             c.goal_miles,
             c.goal_runs,
-            c.points
+            c.points,
+            IFNULL(completed, FALSE) AS completed_now
         FROM `e3-ai-shoe-starter.section_e3.UserChallenges` uc
         JOIN `e3-ai-shoe-starter.section_e3.Challenges` c
-        ON TRIM(uc.challenge_id) = TRIM(c.challenge_id)
-        WHERE TRIM(uc.user_id) = TRIM(@user_id) AND TRIM(uc.challenge_id) = TRIM(@challenge_id)
-        LIMIT 1
+        ON uc.challenge_id = c.challenge_id
+        WHERE uc.user_id = @user_id AND uc.challenge_id = @challenge_id
+        LIMIT 1;
         """
-        fetch_job_config = bigquery.QueryJobConfig(query_parameters=update_params[:2])
-        print("[INFO] Running fetch_query...")
-        results = client.query(fetch_query, job_config=fetch_job_config).result()
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+            bigquery.ScalarQueryParameter("challenge_id", "STRING", challenge_id),
+            bigquery.ScalarQueryParameter("miles_logged", "FLOAT", miles_logged),
+            bigquery.ScalarQueryParameter("runs_logged", "INT64", runs_logged),
+        ])
 
-        for row in results:
-            goal_miles = row.goal_miles or 0
-            goal_runs = row.goal_runs or 0
-            points = row.points
-            miles_completed = row.miles_completed
-            runs_completed = row.runs_completed
-
-            print(f"[DEBUG] Progress: {miles_completed}/{goal_miles} miles, {runs_completed}/{goal_runs} runs")
-
-            if miles_completed >= goal_miles and runs_completed >= goal_runs:
-                print("[INFO] Challenge is complete. Marking as done and awarding points.")
-
-                # Step 4: Mark challenge as done
-                mark_done_query = """
-                UPDATE `e3-ai-shoe-starter.section_e3.UserChallenges`
-                SET status = 'done'
-                WHERE TRIM(user_id) = TRIM(@user_id) AND TRIM(challenge_id) = TRIM(@challenge_id)
-                """
-                client.query(mark_done_query, job_config=fetch_job_config).result()
-
-                # Step 5: Upsert points
-                merge_points_query = """
-                MERGE `e3-ai-shoe-starter.section_e3.UserPoints` T
-                USING (SELECT @user_id AS user_id, @points AS points) S
-                ON T.user_id = S.user_id
-                WHEN MATCHED THEN
-                  UPDATE SET total_points = T.total_points + S.points
-                WHEN NOT MATCHED THEN
-                  INSERT (user_id, total_points) VALUES (S.user_id, S.points)
-                """
-                merge_points_config = bigquery.QueryJobConfig(query_parameters=[
-                    bigquery.ScalarQueryParameter("points", "INT64", points),
-                    bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
-                ])
-                print("[INFO] Running merge_points_query...")
-                client.query(merge_points_query, job_config=merge_points_config).result()
-
-                return f"✅ Challenge completed! {points} points awarded."
-
-        return f"✅ Logged {miles_logged} miles and {runs_logged} runs."
+        rows = _run_activity_script(client, script, job_config)
+        invalidate(f"user_challenges:{user_id}", f"challenge_board:{challenge_id}")
+
+        progress = None
+        message = f"✅ Logged {miles_logged} miles and {runs_logged} runs."
+        for row in rows:
+            progress = {
+                "miles_completed": row.miles_completed,
+                "runs_completed": row.runs_completed,
+                "goal_miles": row.goal_miles or 0,
+                "goal_runs": row.goal_runs or 0,
+                "status": row.status,
+                "completed": bool(row.completed_now),
+            }
+            print(f"[DEBUG] Progress: {row.miles_completed}/{progress['goal_miles']} miles, "
+                  f"{row.runs_completed}/{progress['goal_runs']} runs")
+
+            if row.completed_now:
+                print("[INFO] Challenge is complete. Points awarded.")
+                invalidate(f"points:{user_id}", "friends_board", "points_window")
+                award_points(user_id, row.points or 0)
+                message = f"✅ Challenge completed! {row.points} points awarded."
+            break
+
+        return (message, progress) if return_progress else message
 
     except Exception as e:
-        print("[ERROR] An error occurred during log_user_activity:")
-        
-        return f"❌ Error logging activity: {e}"
+        print(f"[ERROR] An error occurred during log_user_activity: {e}")
+        message = f"❌ Error logging activity: {e}"
+        return (message, None) if return_progress else message
+
+
+def _run_activity_script(client, script, job_config):
+    """Runs the activity script, retrying if a concurrent log aborted its transaction."""
+    for attempt in range(ACTIVITY_RETRIES):
+        try:
+            return list(client.query(script, job_config=job_config).result())
+        except Exception as e:
+            # BigQuery aborts one of two transactions updating the same table
+            if "concurrent update" not in str(e).lower() or attempt + 1 == ACTIVITY_RETRIES:
+                raise
+            print("[WARN] Activity log conflicted with another update, retrying...")
+            time.sleep(0.5 * (attempt + 1))
 
 
 def get_single_user_challenges(user_id):
     try:
-        client = bigquery.Client(project="e3-ai-shoe-starter")
+        client = get_bigquery_client()
+        user_id = normalize_id(user_id)
         
-        query = """
+        query = f"""
         SELECT 
             uc.user_id,
             uc.challenge_id,
@@ -222,18 +319,20 @@ def get_single_user_challenges(user_id):
             c.difficulty,
             c.start_date,
             c.end_date,
-            c.status AS challenge_status
+            {status_sql("c")} AS challenge_status
         FROM `e3-ai-shoe-starter.section_e3.UserChallenges` uc
         JOIN `e3-ai-shoe-starter.section_e3.Challenges` c
-        ON TRIM(uc.challenge_id) = TRIM(c.challenge_id)
+        ON uc.challenge_id = c.challenge_id
         WHERE uc.user_id = @user_id
         """
         
-        query_params = [bigquery.ScalarQueryParameter("user_id", "STRING", user_id)]
+        query_params = [
+            bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+            bigquery.ScalarQueryParameter("today", "DATE", utc_today()),
+        ]
         job_config = bigquery.QueryJobConfig(query_parameters=query_params)
         
-        query_job = client.query(query, job_config=job_config)
-        results = query_job.result()
+        results = cached_query(client, query, job_config, tags=[f"user_challenges:{user_id}", "challenges"])
 
         detailed_challenges = []
         for row in results:
@@ -274,25 +373,25 @@ def get_user_points(user_id):
     """
     try:
 
-        client = bigquery.Client(project="e3-ai-shoe-starter")
-        user_id = str(user_id).strip()
+        client = get_bigquery_client()
+        user_id = normalize_id(user_id)
 
         print(f"[INFO] Fetching points for user: {user_id}")
 
-        query = """
-        SELECT total_points
-        FROM `e3-ai-shoe-starter.section_e3.UserPoints`
-        WHERE TRIM(user_id) = TRIM(@user_id)
-        LIMIT 1
+        # Same totals as the leaderboard: UserPoints plus awards not yet rolled up
+        query = f"""
+        SELECT SUM(points) AS total_points
+        FROM ({points_totals_sql("user_id = @user_id")})
         """
 
         query_params = [bigquery.ScalarQueryParameter("user_id", "STRING", user_id)]
         job_config = bigquery.QueryJobConfig(query_parameters=query_params)
 
-        query_job = client.query(query, job_config=job_config)
-        results = query_job.result()
+        results = cached_query(client, query, job_config, tags=[f"points:{user_id}"])
 
         for row in results:
+            if row.total_points is None:
+                break
             print(f"[INFO] User found. Points: {row.total_points}")
             return row.total_points
 
@@ -316,10 +415,11 @@ def get_challenge_by_id(challenge_id):
     """
     try:
         # Initialize BigQuery client
-        client = bigquery.Client(project="e3-ai-shoe-starter")
+        client = get_bigquery_client()
+        challenge_id = normalize_id(challenge_id)
         
         # Query to get the challenge
-        challenge_query = """
+        challenge_query = f"""
         SELECT 
             challenge_id,
             title,
@@ -330,18 +430,20 @@ def get_challenge_by_id(challenge_id):
             FORMAT_DATE('%Y-%m-%d', start_date) as start_date,
             FORMAT_DATE('%Y-%m-%d', end_date) as end_date,
             max_participants,
-            status
+            {status_sql()} AS status
         FROM `e3-ai-shoe-starter.section_e3.Challenges`
         WHERE challenge_id = @challenge_id
         """
         
         # Set query parameters
-        query_params = [bigquery.ScalarQueryParameter("challenge_id", "STRING", challenge_id)]
+        query_params = [
+            bigquery.ScalarQueryParameter("challenge_id", "STRING", challenge_id),
+            bigquery.ScalarQueryParameter("today", "DATE", utc_today()),
+        ]
         job_config = bigquery.QueryJobConfig(query_parameters=query_params)
         
         # Execute query
-        query_job = client.query(challenge_query, job_config=job_config)
-        results = query_job.result()
+        results = cached_query(client, challenge_query, job_config, tags=["challenges"])
         
         # Process results
         challenge = None
@@ -393,7 +495,9 @@ def join_challenge(user_id, challenge_id):
     Adds a new row to the UserChallenges table when a user joins a challenge.
     If the user already joined, do nothing.
     """
-    client = bigquery.Client(project="e3-ai-shoe-starter")
+    client = get_bigquery_client()
+    user_id = normalize_id(user_id)
+    challenge_id = normalize_id(challenge_id)
 
     # Step 1: Check if user already joined this challenge
     check_query = """
@@ -422,6 +526,7 @@ def join_challenge(user_id, challenge_id):
         bigquery.ScalarQueryParameter("challenge_id", "STRING", challenge_id),
     ])
     client.query(insert_query, job_config=insert_config).result()
+    invalidate(f"user_challenges:{user_id}", f"challenge_board:{challenge_id}")
     
     return f"✅ Successfully joined the challenge!"
 
@@ -430,6 +535,9 @@ def log_workout(user_id, start_time, end_time, start_lat, start_long,
                end_lat, end_long, distance, steps, calories):
     """
     Records a workout in the database and updates challenge progress.
+
+    The workout is queued on the write pipeline and written in the next
+    batch, so this returns without waiting for BigQuery.
     
     Args:
         user_id (str): User ID
@@ -450,43 +558,24 @@ def log_workout(user_id, start_time, end_time, start_lat, start_long,
     
     try:
         # Generate workout ID
-        workout_id = str(uuid.uuid4())
-        
-        # Create BigQuery client
-        client = bigquery.Client(project="e3-ai-shoe-starter")
-        
-        # Create the query
-        query = """
-        INSERT INTO `e3-ai-shoe-starter.section_e3.Workouts` (
-            WorkoutId, UserId, StartTimestamp, EndTimestamp,
-            StartLocationLat, StartLocationLong, EndLocationLat, EndLocationLong,
-            TotalDistance, TotalSteps, CaloriesBurned
-        )
-        VALUES (
-            @workout_id, @user_id, @start_timestamp, @end_timestamp,
-            @start_lat, @start_long, @end_lat, @end_long,
-            @total_distance, @total_steps, @calories_burned
-        )
-        """
-        
-        # Set up parameters
-        params = [
-            bigquery.ScalarQueryParameter("workout_id", "STRING", workout_id),
-            bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
-            bigquery.ScalarQueryParameter("start_timestamp", "DATETIME", start_time.isoformat()),
-            bigquery.ScalarQueryParameter("end_timestamp", "DATETIME", end_time.isoformat()),
-            bigquery.ScalarQueryParameter("start_lat", "FLOAT", start_lat),
-            bigquery.ScalarQueryParameter("start_long", "FLOAT", start_long),
-            bigquery.ScalarQueryParameter("end_lat", "FLOAT", end_lat),
-            bigquery.ScalarQueryParameter("end_long", "FLOAT", end_long),
-            bigquery.ScalarQueryParameter("total_distance", "FLOAT", distance),
-            bigquery.ScalarQueryParameter("total_steps", "INT64", steps),
-            bigquery.ScalarQueryParameter("calories_burned", "FLOAT", calories)
-        ]
+        workout_id = normalize_id(uuid.uuid4())
+        user_id = normalize_id(user_id)
         
-        # Execute the query
-        job_config = bigquery.QueryJobConfig(query_parameters=params)
-        client.query(query, job_config=job_config).result()
+        # Queue the row; it is written to BigQuery in the next batch
+        row = {
+            "WorkoutId": workout_id,
+            "UserId": user_id,
+            "StartTimestamp": start_time.isoformat(),
+            "EndTimestamp": end_time.isoformat(),
+            "StartLocationLat": start_lat,
+            "StartLocationLong": start_long,
+            "EndLocationLat": end_lat,
+            "EndLocationLong": end_long,
+            "TotalDistance": distance,
+            "TotalSteps": steps,
+            "CaloriesBurned": calories,
+        }
+        enqueue_row(WORKOUTS_TABLE, row, row_id=workout_id, tags=[f"workouts:{user_id}"])
         
         return "🎉 Workout logged successfully!"
     
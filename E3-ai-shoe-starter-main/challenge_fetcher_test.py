@@ -1,8 +1,13 @@
+import json
 import unittest
 from unittest.mock import patch, MagicMock
 from google.cloud import bigquery
+from bigquery_pool import reset_bigquery_client
+from query_cache import clear_cache
+from write_pipeline import WriteQueueFull, flush_writes
 from challenge_fetcher import (
     get_challenges,
+    get_challenge_catalog,
     create_challenge,
     log_user_activity,
     get_single_user_challenges,
@@ -16,6 +21,14 @@ from datetime import datetime, date
 
 
 class TestChallengeFetcher(unittest.TestCase):
+    def setUp(self):
+        # Each test patches bigquery.Client, so drop the pooled client and
+        # any results cached by an earlier test
+        reset_bigquery_client()
+        self.addCleanup(reset_bigquery_client)
+        clear_cache()
+        self.addCleanup(clear_cache)
+
     @patch("challenge_fetcher.bigquery.Client")
     def test_get_challenges_no_filter(self, mock_bigquery_client):
         # Mock the BigQuery client and its query method
@@ -117,6 +130,11 @@ class TestChallengeFetcher(unittest.TestCase):
         self.assertEqual(challenges[0]["status"], "active")
         mock_client.query.assert_called_once()
 
+        # The filter compares dates rather than the stored status column
+        query = mock_client.query.call_args[0][0]
+        self.assertIn("WHERE end_date >= @today AND start_date <= @today", query)
+        self.assertNotIn("status = @status", query)
+
     @patch("challenge_fetcher.bigquery.Client")
     def test_get_challenges_exception(self, mock_bigquery_client):
         # Mock the BigQuery client to raise an exception
@@ -130,6 +148,42 @@ class TestChallengeFetcher(unittest.TestCase):
         # Assertions
         self.assertEqual(challenges, [])
 
+    @patch("challenge_fetcher.bigquery.Client")
+    def test_get_challenge_catalog_groups_by_status(self, mock_bigquery_client):
+        mock_client = MagicMock()
+        mock_bigquery_client.return_value = mock_client
+        mock_client.query.return_value.result.return_value = [
+            MagicMock(challenge_id=f"c{n}", title=f"Challenge {n}", rules="", difficulty="Beginner",
+                      start_date="2024-01-01", end_date="2024-01-31", max_participants=None,
+                      status=status, goal_miles=10.0, goal_runs=None, points=100)
+            for n, status in enumerate(["active", "closed", "active", "upcoming"])
+        ]
+
+        catalog = get_challenge_catalog()
+        get_challenge_catalog()
+
+        # One query for all three statuses, cached for later views
+        mock_client.query.assert_called_once()
+        self.assertNotIn("WHERE status", mock_client.query.call_args[0][0])
+        self.assertEqual([c["challenge_id"] for c in catalog["active"]], ["c0", "c2"])
+        self.assertEqual(len(catalog["upcoming"]), 1)
+        self.assertEqual(len(catalog["closed"]), 1)
+
+        # Creating a challenge drops the cached catalog
+        create_challenge("New", "Rules", "Beginner", "2024-03-01", "2024-03-31", 10.0, 5, 100)
+        get_challenge_catalog()
+        self.assertEqual(mock_client.query.call_count, 3)
+
+    @patch("challenge_fetcher.bigquery.Client")
+    def test_get_challenge_catalog_error_is_not_cached(self, mock_bigquery_client):
+        mock_client = MagicMock()
+        mock_bigquery_client.return_value = mock_client
+        mock_client.query.side_effect = Exception("BigQuery error")
+
+        self.assertEqual(get_challenge_catalog(), {"active": [], "upcoming": [], "closed": []})
+        get_challenge_catalog()
+        self.assertEqual(mock_client.query.call_count, 2)
+
     @patch("challenge_fetcher.bigquery.Client")
     def test_create_challenge(self, mock_bigquery_client):
         # Mock the BigQuery client and its query method
@@ -156,6 +210,10 @@ class TestChallengeFetcher(unittest.TestCase):
         self.assertIsNotNone(challenge_id)
         mock_client.query.assert_called_once()
 
+        # The stored status follows the dates (this one ended in 2024)
+        params = mock_client.query.call_args[1]["job_config"].query_parameters
+        self.assertEqual({p.name: p.value for p in params}["status"], "closed")
+
     @patch("challenge_fetcher.bigquery.Client")
     def test_log_user_activity_update_activity(self, mock_bigquery_client):
         # Mock the BigQuery client and its query method
@@ -163,31 +221,36 @@ class TestChallengeFetcher(unittest.TestCase):
         mock_bigquery_client.return_value = mock_client
         mock_query_job = MagicMock()
         mock_client.query.return_value = mock_query_job
-        mock_result = [
+        # The script returns the progress after the update
+        mock_query_job.result.return_value = [
             MagicMock(
                 miles_completed=5.0,
                 runs_completed=3,
+                status="active",
                 goal_miles=10.0,
                 goal_runs=5,
                 points=100,
+                completed_now=False,
             )
         ]
-        mock_query_job.result.side_effect = [
-            None,  # Mock result for the first query (update)
-            mock_result,  # Mock result for the second query (fetch)
-        ]
 
         # Call the function
-        message = log_user_activity(
+        message, progress = log_user_activity(
             user_id="user1",
             challenge_id="challenge1",
             miles_logged=2.0,
             runs_logged=1,
+            return_progress=True,
         )
 
         # Assertions
         self.assertEqual(message, "✅ Logged 2.0 miles and 1 runs.")
-        self.assertEqual(mock_client.query.call_count, 2)
+        self.assertEqual(progress["miles_completed"], 5.0)
+        self.assertFalse(progress["completed"])
+        mock_client.query.assert_called_once()
+        script = mock_client.query.call_args[0][0]
+        self.assertIn("BEGIN TRANSACTION", script)
+        self.assertIn("COMMIT TRANSACTION", script)
 
     @patch("challenge_fetcher.bigquery.Client")
     def test_log_user_activity_complete_challenge(self, mock_bigquery_client):
@@ -196,33 +259,53 @@ class TestChallengeFetcher(unittest.TestCase):
         mock_bigquery_client.return_value = mock_client
         mock_query_job = MagicMock()
         mock_client.query.return_value = mock_query_job
-        mock_result = [
+        mock_query_job.result.return_value = [
             MagicMock(
                 miles_completed=10.0,
                 runs_completed=5,
+                status="done",
                 goal_miles=10.0,
                 goal_runs=5,
                 points=100,
+                completed_now=True,
             )
         ]
-        mock_query_job.result.side_effect = [
-            None,  # Mock result for the first query (update)
-            mock_result,  # Mock result for the second query (fetch)
-            None,  # Mock result for the third query (mark as done)
-            None # Mock result for the fourth query (update points)
-        ]
 
         # Call the function
-        message = log_user_activity(
-            user_id="user1",
-            challenge_id="challenge1",
-            miles_logged=5.0,
-            runs_logged=2,
-        )
+        with patch("challenge_fetcher.award_points") as award:
+            message = log_user_activity(
+                user_id="user1",
+                challenge_id="challenge1",
+                miles_logged=5.0,
+                runs_logged=2,
+            )
 
-        # Assertions
+        # Update, completion check and points all run in one scripted transaction
         self.assertEqual(message, "✅ Challenge completed! 100 points awarded.")
-        self.assertEqual(mock_client.query.call_count, 4)
+        self.assertEqual(mock_client.query.call_count, 1)
+        # The leaderboard is updated in place
+        award.assert_called_once_with("user1", 100)
+        # Points are appended to the ledger, never merged into a shared row
+        script = mock_client.query.call_args[0][0]
+        self.assertIn("INSERT INTO `e3-ai-shoe-starter.section_e3.PointsLedger`", script)
+        self.assertNotIn("MERGE", script)
+
+    @patch("challenge_fetcher.time.sleep")
+    @patch("challenge_fetcher.bigquery.Client")
+    def test_log_user_activity_retries_concurrent_update(self, mock_bigquery_client, mock_sleep):
+        mock_client = MagicMock()
+        mock_bigquery_client.return_value = mock_client
+        mock_query_job = MagicMock()
+        mock_query_job.result.side_effect = [
+            Exception("Transaction is aborted due to concurrent update against table"),
+            [],
+        ]
+        mock_client.query.return_value = mock_query_job
+
+        message = log_user_activity("user1", "challenge1", 1.0, 1)
+
+        self.assertEqual(message, "✅ Logged 1.0 miles and 1 runs.")
+        self.assertEqual(mock_client.query.call_count, 2)
 
     @patch("challenge_fetcher.bigquery.Client")
     def test_get_single_user_challenges(self, mock_bigquery_client):
@@ -289,6 +372,11 @@ class TestChallengeFetcher(unittest.TestCase):
         self.assertEqual(points, 150)
         mock_client.query.assert_called_once()
 
+        # Read the same way as the leaderboard's totals
+        query = mock_client.query.call_args[0][0]
+        self.assertIn("FROM `e3-ai-shoe-starter.section_e3.UserPoints`", query)
+        self.assertIn("FROM `e3-ai-shoe-starter.section_e3.PointsRollupState`", query)
+
     @patch("challenge_fetcher.bigquery.Client")
     def test_get_user_points_exception(self, mock_bigquery_client):
         # Mock the BigQuery client to raise an exception
@@ -454,16 +542,18 @@ class TestChallengeFetcher(unittest.TestCase):
             calories=300,
         )
 
-        # Assertions
+        # The row is queued and written by the pipeline's batch MERGE
+        self.assertTrue(flush_writes(timeout=5))
         self.assertEqual(message, "🎉 Workout logged successfully!")
         mock_client.query.assert_called_once()
-
-    @patch("challenge_fetcher.bigquery.Client")
-    def test_log_workout_exception(self, mock_bigquery_client):
-        # Mock the BigQuery client to raise an exception
-        mock_client = MagicMock()
-        mock_bigquery_client.return_value = mock_client
-        mock_client.query.side_effect = Exception("BigQuery error")
+        query = mock_client.query.call_args[0][0]
+        self.assertIn("MERGE `e3-ai-shoe-starter.section_e3.Workouts`", query)
+        rows = [json.loads(row) for row in mock_client.query.call_args[1]["job_config"].query_parameters[0].values]
+        self.assertEqual(rows[0]["UserId"], "user1")
+
+    @patch("challenge_fetcher.enqueue_row", side_effect=WriteQueueFull("too many pending writes"))
+    def test_log_workout_exception(self, mock_enqueue_row):
+        # The write queue is full and pushes back
 
         # Call the function
         message = log_workout(
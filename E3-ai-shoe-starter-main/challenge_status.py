@@ -0,0 +1,187 @@
+#############################################################################
+# challenge_status.py
+#
+# This file contains the date-driven challenge status rules and the job that
+# applies them to the stored rows.
+#
+# A challenge's status used to be a string that create_challenge set to
+# "upcoming" and nothing ever changed. It now follows from its dates:
+#
+#   upcoming    today < start_date
+#   active      start_date <= today <= end_date
+#   closed      end_date < today
+#
+# Reads derive it in SQL (status_sql) and filter on the dates themselves
+# (status_filter_sql), so a status filter prunes on the date clustering of
+# Challenges and is right the moment a date passes.
+#
+# transition_statuses() brings the stored columns in line with one bulk
+# UPDATE per table: Challenges whose stored status no longer matches their
+# dates, and 'active' UserChallenges rows of closed challenges, which become
+# 'expired' so no more activity can be logged against them. It runs once a
+# day just after midnight UTC (python challenge_status.py) as the
+# challenge-status Cloud Run job, started by the Cloud Scheduler job of the
+# same name; both are deployed by .github/workflows/cloud-run.yml.
+#############################################################################
+
+import argparse
+from datetime import date, datetime, timezone
+
+from google.cloud import bigquery
+
+from bigquery_pool import get_bigquery_client
+from query_cache import invalidate
+
+
+CHALLENGES_TABLE = "e3-ai-shoe-starter.section_e3.Challenges"
+USER_CHALLENGES_TABLE = "e3-ai-shoe-starter.section_e3.UserChallenges"
+
+# Challenge statuses, in the order the Challenges page shows them
+CHALLENGE_STATUSES = ("active", "upcoming", "closed")
+
+# UserChallenges status of a challenge that closed before it was completed
+EXPIRED = "expired"
+
+
+def utc_today():
+    """Returns today's date in UTC, the day BigQuery's CURRENT_DATE() uses."""
+    return datetime.now(timezone.utc).date()
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+def derive_status(start_date, end_date, today=None):
+    """
+    Returns the status a challenge has on `today`.
+
+    Args:
+        start_date (date or str): First day of the challenge
+        end_date (date or str): Last day of the challenge
+        today (date, optional): Day to evaluate; today in UTC if None
+
+    Returns:
+        str: 'upcoming', 'active' or 'closed'
+    """
+    today = today or utc_today()
+    if today < _as_date(start_date):
+        return "upcoming"
+    if today > _as_date(end_date):
+        return "closed"
+    return "active"
+
+
+def status_sql(alias="", today="@today"):
+    """
+    Returns a SQL expression giving a challenge's status from its dates.
+
+    Args:
+        alias (str): Table alias of Challenges in the query, if any
+        today (str): SQL expression for the current day
+    """
+    prefix = f"{alias}." if alias else ""
+    return (f"CASE WHEN {today} < {prefix}start_date THEN 'upcoming' "
+            f"WHEN {today} > {prefix}end_date THEN 'closed' "
+            f"ELSE 'active' END")
+
+
+def status_filter_sql(status, alias="", today="@today"):
+    """
+    Returns a SQL predicate matching challenges with `status`.
+
+    The predicate compares the dates directly (not the derived status), so
+    BigQuery can skip blocks using the clustering on end_date, start_date.
+
+    Raises:
+        ValueError: If `status` is not one of CHALLENGE_STATUSES
+    """
+    prefix = f"{alias}." if alias else ""
+    if status == "upcoming":
+        return f"{prefix}start_date > {today}"
+    if status == "closed":
+        return f"{prefix}end_date < {today}"
+    if status == "active":
+        return f"{prefix}end_date >= {today} AND {prefix}start_date <= {today}"
+    raise ValueError(f"Unknown challenge status: {status}")
+
+
+def transition_statuses(today=None, client=None):
+    """
+    Stores the date-derived status on every challenge that changed and
+    expires the unfinished UserChallenges rows of closed challenges.
+
+    Both UPDATEs run in one transaction and only touch rows whose status
+    actually changes, so running the job twice on a day is a no-op.
+
+    Args:
+        today (date, optional): Day to apply; today in UTC if None
+        client (optional): BigQuery client; the shared one if None
+
+    Returns:
+        dict: Rows changed ("challenges", "user_challenges"), or None if
+            the job failed
+    """
+    client = client or get_bigquery_client()
+    derived = status_sql()
+
+    script = f"""
+    DECLARE challenges_changed INT64 DEFAULT 0;
+    DECLARE user_challenges_expired INT64 DEFAULT 0;
+
+    BEGIN TRANSACTION;
+
+    UPDATE `{CHALLENGES_TABLE}`
+    SET status = {derived}
+    WHERE status IS DISTINCT FROM {derived};
+    SET challenges_changed = @@row_count;
+
+    UPDATE `{USER_CHALLENGES_TABLE}` uc
+    SET status = '{EXPIRED}'
+    FROM `{CHALLENGES_TABLE}` c
+    WHERE uc.challenge_id = c.challenge_id
+        AND uc.status = 'active'
+        AND {status_filter_sql("closed", alias="c")};
+    SET user_challenges_expired = @@row_count;
+
+    COMMIT TRANSACTION;
+
+    SELECT challenges_changed, user_challenges_expired;
+    """
+
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("today", "DATE", today or utc_today())]
+    )
+
+    try:
+        rows = list(client.query(script, job_config=job_config).result())
+    except Exception as e:
+        print(f"Error updating challenge statuses: {e}")
+        return None
+
+    # Cached membership lists are tagged "challenges" too
+    invalidate("challenges")
+
+    changed = {"challenges": 0, "user_challenges": 0}
+    for row in rows:
+        changed = {
+            "challenges": row.challenges_changed or 0,
+            "user_challenges": row.user_challenges_expired or 0,
+        }
+    return changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move challenges to the status their dates give them.")
+    parser.add_argument("--date", type=date.fromisoformat, help="Day to apply (YYYY-MM-DD), today in UTC by default")
+    args = parser.parse_args()
+
+    result = transition_statuses(today=args.date)
+    if result is None:
+        print("Status transition failed.")
+    else:
+        print(f"{result['challenges']} challenges and {result['user_challenges']} memberships updated.")
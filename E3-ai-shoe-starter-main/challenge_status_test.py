@@ -0,0 +1,64 @@
+import unittest
+from datetime import date
+
+from bigquery_pool import LocalBigQueryBackend, use_local_backend, reset_bigquery_client
+from challenge_status import derive_status, status_filter_sql, status_sql, transition_statuses
+from query_cache import cached_value, clear_cache
+
+
+class TestChallengeStatus(unittest.TestCase):
+    def setUp(self):
+        self.backend = LocalBigQueryBackend()
+        use_local_backend(self.backend)
+        self.addCleanup(use_local_backend, None)
+        self.addCleanup(reset_bigquery_client)
+        clear_cache()
+        self.addCleanup(clear_cache)
+
+    def test_derive_status_from_dates(self):
+        today = date(2024, 3, 15)
+        self.assertEqual(derive_status("2024-03-16", "2024-04-01", today), "upcoming")
+        self.assertEqual(derive_status("2024-03-15", "2024-04-01", today), "active")
+        self.assertEqual(derive_status(date(2024, 3, 1), date(2024, 3, 15), today), "active")
+        self.assertEqual(derive_status("2024-03-01", "2024-03-14", today), "closed")
+
+    def test_sql_uses_dates_not_stored_status(self):
+        self.assertIn("@today < c.start_date THEN 'upcoming'", status_sql("c"))
+        self.assertEqual(status_filter_sql("closed"), "end_date < @today")
+        self.assertEqual(status_filter_sql("active", alias="c", today="CURRENT_DATE()"),
+                         "c.end_date >= CURRENT_DATE() AND c.start_date <= CURRENT_DATE()")
+        with self.assertRaises(ValueError):
+            status_filter_sql("done")
+
+    def test_transition_updates_both_tables_in_one_script(self):
+        self.backend.add_result("SELECT challenges_changed", [
+            {"challenges_changed": 3, "user_challenges_expired": 12},
+        ])
+        cached_value(("challenge_catalog",), lambda: {}, tags=["challenges"])
+
+        result = transition_statuses(today=date(2024, 3, 15))
+
+        self.assertEqual(result, {"challenges": 3, "user_challenges": 12})
+        self.assertEqual(len(self.backend.queries), 1)
+        script, params = self.backend.queries[0]
+        self.assertEqual(params, {"today": date(2024, 3, 15)})
+        self.assertIn("BEGIN TRANSACTION", script)
+        self.assertIn("WHERE status IS DISTINCT FROM CASE", script)
+        self.assertIn("SET status = 'expired'", script)
+        self.assertIn("AND c.end_date < @today", script)
+
+        # The cached catalog is dropped
+        computed = []
+        cached_value(("challenge_catalog",), lambda: computed.append(1), tags=["challenges"])
+        self.assertEqual(computed, [1])
+
+    def test_transition_failure(self):
+        def fail(params):
+            raise Exception("BigQuery error")
+        self.backend.add_result("SELECT challenges_changed", fail)
+
+        self.assertIsNone(transition_statuses())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,208 @@
+#############################################################################
+# concurrent_fetch.py
+#
+# This file contains a small fan-out helper for running independent fetches
+# (BigQuery queries, Gemini calls) at the same time.
+#
+# A page built from several independent calls then costs roughly its slowest
+# call instead of the sum of all of them. Calls that fail or miss their
+# deadline are reported instead of raised, so pages can render partial data.
+#
+# A timed-out call cannot be stopped: it keeps its worker until it returns,
+# so every call handed to run_in_parallel must bound its own run time.
+# Gemini generations therefore run on StreamFlight's own threads, capped by
+# ConcurrencyLimiter, and the pool worker only waits for them up to the
+# deadline. StreamFlight also lets identical concurrent calls whose results
+# arrive piece by piece share one execution.
+#############################################################################
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+
+# Shared by every Streamlit session in this process. Fetches are I/O bound, so
+# threads spend nearly all their time waiting on the network.
+MAX_WORKERS = 16
+
+# Seconds a call may take before the caller stops waiting for it
+DEFAULT_DEADLINE = 15
+
+# Gemini generations allowed at once across all sessions, and how long a
+# caller waits for a free slot before giving up
+LLM_MAX_CONCURRENCY = 4
+LLM_SLOT_TIMEOUT = 30
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="fetch")
+
+
+def run_in_parallel(calls, deadlines=None, default_deadline=DEFAULT_DEADLINE):
+    """
+    Runs independent calls concurrently and waits for each up to its deadline.
+
+    A call that misses its deadline keeps running and holds a worker until
+    it returns, so calls should not run much longer than their deadline.
+
+    Args:
+        calls (dict): Name -> zero-argument callable
+        deadlines (dict, optional): Name -> seconds allowed for that call,
+            measured from when the fan-out started
+        default_deadline (float): Deadline for calls missing from `deadlines`
+
+    Returns:
+        tuple: (results, errors). `results` maps every name to the call's
+            return value, or None if it failed or timed out. `errors` maps
+            the names of failed calls to the exception (or timeout) message.
+    """
+    deadlines = deadlines or {}
+    started = time.monotonic()
+    futures = {name: _executor.submit(call) for name, call in calls.items()}
+
+    results = {}
+    errors = {}
+    for name, future in futures.items():
+        deadline = deadlines.get(name, default_deadline)
+        remaining = max(deadline - (time.monotonic() - started), 0)
+        try:
+            results[name] = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            # Only drops the call if it has not started yet; a running call
+            # keeps its worker until it returns
+            future.cancel()
+            results[name] = None
+            errors[name] = f"timed out after {deadline}s"
+            print(f"[WARN] {name} did not finish within {deadline}s")
+        except Exception as e:
+            results[name] = None
+            errors[name] = str(e)
+            print(f"[WARN] {name} failed: {e}")
+
+    return results, errors
+
+
+class _Stream:
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.result = None
+        self.error = None
+        self.changed = threading.Condition()
+
+    def emit(self, item):
+        with self.changed:
+            self.items.append(item)
+            self.changed.notify_all()
+
+    def finish(self, result=None, error=None):
+        with self.changed:
+            self.result, self.error, self.done = result, error, True
+            self.changed.notify_all()
+
+    def follow(self):
+        """Yields every item produced so far, then each new one, then the final result."""
+        position = 0
+        while True:
+            with self.changed:
+                self.changed.wait_for(lambda: self.done or len(self.items) > position)
+                items, done = self.items[position:], self.done
+            position += len(items)
+            yield from items
+            if done and position == len(self.items):
+                if self.error is not None:
+                    raise self.error
+                yield self.result
+                return
+
+    def wait(self, timeout=None):
+        """Returns the final result, raising the producer's exception if it failed."""
+        with self.changed:
+            if not self.changed.wait_for(lambda: self.done, timeout=timeout):
+                raise TimeoutError(f"stream did not finish within {timeout}s")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class StreamFlight:
+    """
+    Coalesces concurrent streaming calls that share a key into one producer.
+
+    The producer runs on its own thread, so it finishes (and releases
+    whatever it holds, such as a limiter slot) however slowly its callers
+    read. Every caller gets the same stream: follow() yields each item as it
+    is produced and then the final result, wait() returns only the result.
+    """
+
+    def __init__(self):
+        self._streams = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.shared = 0
+
+    def start(self, key, produce):
+        """
+        Starts `produce` for `key`, or joins the run already in progress.
+
+        Args:
+            key: Hashable key identifying identical calls
+            produce (callable): Takes an emit(item) function and returns the final result
+
+        Returns:
+            The shared stream, with follow() and wait()
+        """
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is not None:
+                self.shared += 1
+                return stream
+            stream = self._streams[key] = _Stream()
+            self.executions += 1
+
+        def run():
+            try:
+                result, error = produce(stream.emit), None
+            except Exception as e:
+                result, error = None, e
+            with self._lock:
+                del self._streams[key]
+            stream.finish(result, error)
+
+        threading.Thread(target=run, name="stream-flight", daemon=True).start()
+        return stream
+
+
+class ConcurrencyLimiter:
+    """
+    Caps how many calls run at once.
+
+    Args:
+        max_concurrency (int): Calls allowed at the same time
+        timeout (float): Seconds to wait for a free slot before raising TimeoutError
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, timeout=LLM_SLOT_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def __enter__(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.rejected += 1
+            raise TimeoutError(f"no free slot within {self.timeout}s")
+        with self._lock:
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+        return False
+
+
+# Shared by every Gemini call in this process
+llm_limiter = ConcurrencyLimiter()
@@ -0,0 +1,197 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from advice_cache import AdviceCache
+from concurrent_fetch import run_in_parallel, StreamFlight, ConcurrencyLimiter, llm_limiter
+from data_fetcher import get_data_for_community_page, get_genai_advice, stream_genai_advice
+from gemini_model import LocalGenerativeModel, use_local_model
+
+
+class TestRunInParallel(unittest.TestCase):
+    def test_calls_run_concurrently(self):
+        def slow(value):
+            time.sleep(0.2)
+            return value
+
+        started = time.monotonic()
+        results, errors = run_in_parallel({
+            "a": lambda: slow(1),
+            "b": lambda: slow(2),
+            "c": lambda: slow(3),
+        })
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(results, {"a": 1, "b": 2, "c": 3})
+        self.assertEqual(errors, {})
+        self.assertLess(elapsed, 0.5)
+
+    def test_slow_call_misses_deadline(self):
+        results, errors = run_in_parallel(
+            {"fast": lambda: "done", "slow": lambda: time.sleep(1)},
+            deadlines={"slow": 0.1},
+        )
+
+        self.assertEqual(results["fast"], "done")
+        self.assertIsNone(results["slow"])
+        self.assertIn("slow", errors)
+        self.assertNotIn("fast", errors)
+
+    def test_failing_call_is_reported(self):
+        def boom():
+            raise ValueError("BigQuery error")
+
+        results, errors = run_in_parallel({"ok": lambda: 1, "boom": boom})
+
+        self.assertEqual(results, {"ok": 1, "boom": None})
+        self.assertEqual(errors, {"boom": "BigQuery error"})
+
+
+
+def _run_threads(count, target):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(target())) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestStreamFlight(unittest.TestCase):
+    def test_followers_share_one_producer(self):
+        flights = StreamFlight()
+        release = threading.Event()
+        calls = []
+
+        def produce(emit):
+            calls.append(1)
+            emit("a")
+            release.wait(5)
+            emit("b")
+            return "done"
+
+        first = flights.start("user1", produce)
+        second = flights.start("user1", produce)
+        release.set()
+
+        self.assertIs(first, second)
+        self.assertEqual(list(first.follow()), ["a", "b", "done"])
+        self.assertEqual(second.wait(timeout=5), "done")
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flights.shared, 1)
+
+    def test_error_reaches_followers(self):
+        def boom(emit):
+            raise ValueError("Gemini error")
+
+        stream = StreamFlight().start("user1", boom)
+        with self.assertRaises(ValueError):
+            list(stream.follow())
+        with self.assertRaises(ValueError):
+            stream.wait(timeout=5)
+
+
+class TestConcurrencyLimiter(unittest.TestCase):
+    def test_caps_calls_in_flight(self):
+        limiter = ConcurrencyLimiter(max_concurrency=2, timeout=5)
+        peak = []
+
+        def work():
+            with limiter:
+                peak.append(limiter.in_flight)
+                time.sleep(0.05)
+
+        _run_threads(6, work)
+        self.assertEqual(max(peak), 2)
+
+    def test_times_out_without_free_slot(self):
+        limiter = ConcurrencyLimiter(max_concurrency=1, timeout=0.05)
+        with limiter:
+            with self.assertRaises(TimeoutError):
+                with limiter:
+                    pass
+        self.assertEqual(limiter.rejected, 1)
+
+
+class TestGenAiAdviceCoalescing(unittest.TestCase):
+    def setUp(self):
+        # A local model with artificial latency stands in for Gemini
+        self.model = LocalGenerativeModel('{"content1": "Keep going."}', chunk_size=5, chunk_latency=0.05)
+        use_local_model(self.model)
+        self.addCleanup(use_local_model, None)
+
+    @patch("data_fetcher.get_user_workouts", return_value=[])
+    def test_concurrent_tabs_share_one_generation(self, mock_workouts):
+        with patch("data_fetcher.get_advice_cache", return_value=AdviceCache()):
+            results = _run_threads(5, lambda: get_genai_advice("user1"))
+
+        self.assertEqual(len(self.model.prompts), 1)
+        self.assertEqual(len({advice["advice_id"] for advice in results}), 1)
+        self.assertEqual(results[0]["content1"], "Keep going.")
+
+    @patch("data_fetcher.get_user_workouts", return_value=[])
+    def test_streamed_and_plain_requests_share_one_generation(self, mock_workouts):
+        with patch("data_fetcher.get_advice_cache", return_value=AdviceCache()):
+            stream = stream_genai_advice("user1")
+            next(stream)                            # the Advice page starts streaming
+            advice = get_genai_advice("user1")      # the Home page asks for the same advice
+
+            # The model is done, so its slot is free while the stream is still open
+            self.assertEqual(llm_limiter.in_flight, 0)
+            self.assertEqual(list(stream)[-1], advice)
+
+        self.assertEqual(len(self.model.prompts), 1)
+
+    @patch("data_fetcher.get_user_workouts", return_value=[])
+    def test_waiting_stops_at_timeout_while_generation_finishes(self, mock_workouts):
+        cache = AdviceCache()
+        with patch("data_fetcher.get_advice_cache", return_value=cache):
+            started = time.monotonic()
+            self.assertIsNone(get_genai_advice("user1", timeout=0.05))
+            self.assertLess(time.monotonic() - started, 0.2)
+
+            # The generation carries on in the background and caches its advice
+            advice = get_genai_advice("user1")
+
+        self.assertEqual(advice["content1"], "Keep going.")
+        self.assertEqual(len(self.model.prompts), 1)
+
+
+class TestCommunityPageFanOut(unittest.TestCase):
+    @patch("data_fetcher.get_friends_feed", return_value=([{"post_id": "post1"}], None))
+    @patch("data_fetcher.get_user_profile", return_value={"full_name": "Alice", "friends": ["user2"]})
+    @patch("data_fetcher.get_genai_advice", side_effect=Exception("Gemini unavailable"))
+    def test_posts_render_without_advice(self, mock_advice, mock_profile, mock_feed):
+        advice, posts, user = get_data_for_community_page("user1")
+
+        self.assertIsNone(advice)
+        self.assertEqual(posts, [{"post_id": "post1"}])
+        self.assertEqual(user["full_name"], "Alice")
+
+    @patch("data_fetcher.get_friends_feed", return_value=([{"post_id": "post1"}], None))
+    @patch("data_fetcher.get_user_profile", return_value={"full_name": "Alice", "friends": ["user2"]})
+    @patch("data_fetcher.get_genai_advice")
+    def test_latency_is_slowest_branch(self, mock_advice, mock_profile, mock_feed):
+        def slow_advice(user_id, timeout=None):
+            time.sleep(0.3)
+            return {"content": "Keep going."}
+
+        def slow_profile(user_id):
+            time.sleep(0.3)
+            return {"full_name": "Alice", "friends": ["user2"]}
+
+        mock_advice.side_effect = slow_advice
+        mock_profile.side_effect = slow_profile
+
+        started = time.monotonic()
+        advice, posts, user = get_data_for_community_page("user1")
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(advice, {"content": "Keep going."})
+        self.assertLess(elapsed, 0.55)
+
+
+if __name__ == "__main__":
+    unittest.main()
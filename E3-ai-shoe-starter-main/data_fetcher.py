@@ -10,40 +10,93 @@
 
 import random
 from google.cloud import bigquery, storage
-from datetime import datetime, timezone, timedelta
+from bigquery_pool import get_bigquery_client
+from concurrent_fetch import run_in_parallel, StreamFlight, llm_limiter
+from query_cache import cached_query, invalidate
+from write_pipeline import enqueue_row
+from ids import normalize_id
+from workout_frame import WorkoutFrame
+from sensor_series import SensorBatch, series_from_batches
+from advice_cache import fingerprint, get_advice_cache
+from advice_prompt import build_advice_prompt, parse_advice, parse_partial_advice, summarize_workouts
+from gemini_model import get_model
+from datetime import datetime, timezone, timedelta, date
+import time
 import uuid
 import streamlit as st
-import google.generativeai as genai
-import os
 
 
-def get_user_workouts(user_id):
+# Number of friends' posts shown on the Home page per load
+FEED_PAGE_SIZE = 10
+
+# Seconds the Home page waits for each branch before rendering without it
+ADVICE_DEADLINE = 20
+FEED_DEADLINE = 10
+
+# Posts change more often than profiles or challenges, so cache them briefly
+POSTS_TTL = 60
+
+# New posts are written through the batched write pipeline
+POSTS_TABLE = "e3-ai-shoe-starter.section_e3.Posts"
+
+# Workouts shown per page on the Recent Workouts page
+WORKOUTS_PAGE_SIZE = 10
+
+# Most recent workouts summarized for GenAI advice; the prompt is a fixed-size
+# summary, so this only bounds the query, not the prompt
+ADVICE_WORKOUT_LIMIT = 200
+
+# Concurrent advice requests for the same user and history, streamed or
+# not, share one generation
+_advice_flights = StreamFlight()
+
+# Sensor rows fetched per page when streaming a workout's sensor data
+SENSOR_BATCH_SIZE = 5000
+
+
+def get_user_workouts(user_id, limit=None, start=None, end=None, cursor=None):
 
-    """Returns a list of user's workouts from BigQuery."""
-    client = bigquery.Client(project="e3-ai-shoe-starter")
-    
-    query = """
-    SELECT 
-        WorkoutId,
-        StartTimestamp,
-        EndTimestamp,
-        StartLocationLat,
-        StartLocationLong,
-        EndLocationLat,
-        EndLocationLong,
-        TotalDistance,
-        TotalSteps,
-        CaloriesBurned
-    FROM `e3-ai-shoe-starter.section_e3.Workouts`
-    WHERE UserId = @user_id
     """
-    
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[bigquery.ScalarQueryParameter("user_id", "STRING", user_id)]
-    )
+    Returns a list of user's workouts from BigQuery, newest first.
 
+    Args:
+        user_id (str): Owner of the workouts
+        limit (int, optional): Maximum number of workouts to return
+        start (datetime or date, optional): Only workouts starting at or after this
+        end (datetime or date, optional): Only workouts starting before this
+        cursor (tuple, optional): Continue after this (start_timestamp, workout_id)
+
+    Returns:
+        list: Workout dictionaries
+    """
+    workouts, _ = get_user_workouts_page(user_id, limit=limit, start=start, end=end, cursor=cursor)
+    return workouts
+
+
+def get_user_workouts_page(user_id, limit=WORKOUTS_PAGE_SIZE, start=None, end=None, cursor=None):
+    """
+    Returns one page of a user's workouts, newest first.
+
+    Ordering, the date range and the limit are all applied by BigQuery, so
+    the amount of data transferred does not grow with the user's history.
+
+    Args:
+        user_id (str): Owner of the workouts
+        limit (int, optional): Page size; None returns every matching workout
+        start (datetime or date, optional): Only workouts starting at or after this
+        end (datetime or date, optional): Only workouts starting before this
+        cursor (tuple, optional): (start_timestamp, workout_id) of the last
+            workout on the previous page
+
+    Returns:
+        tuple: (workouts, next_cursor) where next_cursor is None on the last page
+    """
     try:
-        results = client.query(query, job_config=job_config).result()
+        # Ask for one extra row so we know whether another page exists
+        results = _query_workout_rows(
+            user_id, limit=None if limit is None else limit + 1,
+            start=start, end=end, cursor=cursor
+        )
         
         workouts = []
         for row in results:
@@ -57,16 +110,105 @@ def get_user_workouts(user_id):
                 "steps": row.TotalSteps,
                 "calories_burned": row.CaloriesBurned
             })
+
+        next_cursor = None
+        if limit is not None and len(workouts) > limit:
+            workouts = workouts[:limit]
+            next_cursor = (workouts[-1]["start_timestamp"], workouts[-1]["workout_id"])
          
-        return workouts
+        return workouts, next_cursor
     except Exception as e:
         print(f"Error fetching workouts: {e}")
-        return []
+        return [], None
+
+
+def get_user_workout_frame(user_id, limit=None, start=None, end=None):
+    """
+    Returns a user's workouts as a columnar WorkoutFrame, newest first.
+
+    The frame is built directly from the query rows, skipping the per-row
+    dicts and string timestamps used by get_user_workouts.
+
+    Args:
+        user_id (str): Owner of the workouts
+        limit (int, optional): Maximum number of workouts
+        start (datetime or date, optional): Only workouts starting at or after this
+        end (datetime or date, optional): Only workouts starting before this
+
+    Returns:
+        WorkoutFrame: The workouts (empty if the query fails)
+    """
+    try:
+        return WorkoutFrame.from_rows(_query_workout_rows(user_id, limit=limit, start=start, end=end))
+    except Exception as e:
+        print(f"Error fetching workouts: {e}")
+        return WorkoutFrame.from_rows([])
+
+
+def _query_workout_rows(user_id, limit=None, start=None, end=None, cursor=None):
+    """Runs the Workouts query with filters, ordering and limit pushed into SQL."""
+    client = get_bigquery_client()
+    user_id = normalize_id(user_id)
+    
+    query = """
+    SELECT 
+        WorkoutId,
+        StartTimestamp,
+        EndTimestamp,
+        StartLocationLat,
+        StartLocationLong,
+        EndLocationLat,
+        EndLocationLong,
+        TotalDistance,
+        TotalSteps,
+        CaloriesBurned
+    FROM `e3-ai-shoe-starter.section_e3.Workouts`
+    WHERE UserId = @user_id
+    """
+    query_params = [bigquery.ScalarQueryParameter("user_id", "STRING", user_id)]
+
+    if start is not None:
+        query += " AND StartTimestamp >= @start"
+        query_params.append(bigquery.ScalarQueryParameter("start", "DATETIME", _as_datetime(start)))
+    if end is not None:
+        query += " AND StartTimestamp < @end"
+        query_params.append(bigquery.ScalarQueryParameter("end", "DATETIME", _as_datetime(end)))
+
+    # Keyset pagination: continue strictly after the last workout shown
+    if cursor:
+        cursor_timestamp, cursor_workout_id = cursor
+        query += """
+    AND (StartTimestamp < @cursor_timestamp
+         OR (StartTimestamp = @cursor_timestamp AND WorkoutId < @cursor_workout_id))
+    """
+        query_params += [
+            bigquery.ScalarQueryParameter("cursor_timestamp", "DATETIME", _as_datetime(cursor_timestamp)),
+            bigquery.ScalarQueryParameter("cursor_workout_id", "STRING", normalize_id(cursor_workout_id)),
+        ]
+
+    query += "\n    ORDER BY StartTimestamp DESC, WorkoutId DESC"
+    if limit is not None:
+        query += "\n    LIMIT @limit"
+        query_params.append(bigquery.ScalarQueryParameter("limit", "INT64", limit))
+    
+    job_config = bigquery.QueryJobConfig(query_parameters=query_params)
+    return cached_query(client, query, job_config, tags=[f"workouts:{user_id}"])
+
+
+def _as_datetime(value):
+    """Converts a date, datetime or 'YYYY-MM-DD HH:MM:SS' string to a datetime."""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    return datetime.fromisoformat(str(value))
 
 
 def get_user_sensor_data(user_id, workout_id):
     """Returns sensor data for a specific workout owned by the given user."""
-    client = bigquery.Client(project="e3-ai-shoe-starter")
+    client = get_bigquery_client()
+    user_id = normalize_id(user_id)
+    workout_id = normalize_id(workout_id)
 
     query = """
     SELECT 
@@ -108,13 +250,86 @@ def get_user_sensor_data(user_id, workout_id):
         return []
 
 
+def iter_user_sensor_data(user_id, workout_id, batch_size=SENSOR_BATCH_SIZE):
+    """
+    Streams the sensor data of a workout one page at a time.
+
+    Each page of the query result is turned into a SensorBatch of typed
+    arrays and yielded before the next page is fetched, so memory stays
+    bounded by `batch_size` however long the workout is.
+
+    Args:
+        user_id (str): Owner of the workout
+        workout_id (str): Workout to stream
+        batch_size (int): Rows fetched per page
+
+    Yields:
+        SensorBatch: Samples ordered by sensor and time. Query errors are
+            raised to the caller rather than ending the stream early.
+    """
+    client = get_bigquery_client()
+    user_id = normalize_id(user_id)
+    workout_id = normalize_id(workout_id)
+
+    query = """
+    SELECT
+        sd.SensorId AS sensor_type,
+        sd.Timestamp AS timestamp,
+        sd.SensorValue AS data
+    FROM `e3-ai-shoe-starter.section_e3.SensorData` sd
+    JOIN `e3-ai-shoe-starter.section_e3.Workouts` w
+    ON sd.WorkoutID = w.WorkoutID
+    WHERE w.UserId = @user_id AND sd.WorkoutID = @workout_id
+    ORDER BY sd.SensorId, sd.Timestamp
+    """
+
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+            bigquery.ScalarQueryParameter("workout_id", "STRING", workout_id)
+        ]
+    )
+
+    results = client.query(query, job_config=job_config).result(page_size=batch_size)
+    for page in results.pages:
+        sensor_ids, timestamps, values = [], [], []
+        for row in page:
+            sensor_ids.append(row.sensor_type)
+            timestamps.append(row.timestamp)
+            values.append(row.data)
+        if sensor_ids:
+            yield SensorBatch(sensor_ids, timestamps, values)
+
+
+def get_user_sensor_series(user_id, workout_id):
+    """
+    Returns the sensor data of a workout as one columnar series per sensor.
+
+    Unlike get_user_sensor_data, no dict is built per sample: the pages from
+    iter_user_sensor_data are joined into timestamp and value arrays.
+
+    Args:
+        user_id (str): Owner of the workout
+        workout_id (str): Workout to load
+
+    Returns:
+        dict: sensor_id -> SensorSeries (empty on error)
+    """
+    try:
+        return series_from_batches(iter_user_sensor_data(user_id, workout_id))
+    except Exception as e:
+        print(f"Error fetching sensor series: {e}")
+        return {}
+
+
 def get_user_profile(user_id):
     """Returns information about the given user.
     """
     
     try:
         # Initialize BigQuery client
-        client = bigquery.Client(project="e3-ai-shoe-starter")
+        client = get_bigquery_client()
+        user_id = normalize_id(user_id)
         
         # Query to get user information
         user_query = """
@@ -132,7 +347,7 @@ def get_user_profile(user_id):
         user_job_config = bigquery.QueryJobConfig(query_parameters=user_params)
         
         # Execute user query
-        user_results = client.query(user_query, job_config=user_job_config).result()
+        user_results = cached_query(client, user_query, user_job_config, tags=[f"profile:{user_id}"])
         
         # Process user results
         user_data = None
@@ -163,7 +378,7 @@ def get_user_profile(user_id):
         
         # Execute friends query with the same parameters
         friends_job_config = bigquery.QueryJobConfig(query_parameters=user_params)
-        friends_results = client.query(friends_query, job_config=friends_job_config).result()
+        friends_results = cached_query(client, friends_query, friends_job_config, tags=[f"friends:{user_id}"])
         
         # Add friends to user data
         for row in friends_results:
@@ -182,7 +397,8 @@ def get_user_posts(user_id):
     
     try:
         # Initialize BigQuery client
-        client = bigquery.Client(project="e3-ai-shoe-starter")
+        client = get_bigquery_client()
+        user_id = normalize_id(user_id)
         
         # Query to get user's posts
         posts_query = """
@@ -202,8 +418,7 @@ def get_user_posts(user_id):
         query_params = [bigquery.ScalarQueryParameter("user_id", "STRING", user_id)]
         job_config = bigquery.QueryJobConfig(query_parameters=query_params)
         
-        query_job = client.query(posts_query, job_config=job_config)
-        results = query_job.result()
+        results = cached_query(client, posts_query, job_config, tags=[f"posts:{user_id}"], ttl=POSTS_TTL)
        
         # Process posts results
         posts = []
@@ -226,112 +441,260 @@ def get_user_posts(user_id):
         return []
 
 
-def get_genai_advice(user_id):
+def get_genai_advice(user_id, timeout=None):
     """
     Generate personalized advice using Google's Generative AI.
+
+    Advice is cached under a fingerprint of the user's recent workouts, so
+    the model is only called again when that history changes or the cached
+    advice expires.
     
     Args:
         user_id (str): Unique identifier for the user
+        timeout (float, optional): Seconds to wait for a generation. It keeps
+            running on its own thread after that and caches its advice.
+            None waits until it finishes.
     
     Returns:
-        dict: A dictionary containing advice details
+        dict: A dictionary containing advice details, or None if generation
+            failed or did not finish within `timeout`
     """
     try:
-        # Configure Gemini API
-        genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
-        
-        # Initialize the generative model
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # Prepare the prompt with personalized context
-        prompt = f"Generate personalized advice for a user with ID {user_id}. "
-        
-        # Fetch user's workout data
-        workout_data = get_user_workouts(user_id)
-        
-        if workout_data:
-            # If workout data exists, use it to generate more specific advice
-            prompt += f"\n\nWorkout History:\n{workout_data}"
-            
-            prompt += """
-            [Generate advice based on workout history]
-            [Provide insights about fitness progress]
-            [Offer motivational and actionable guidance]
-            
-            Requirements:
-            - Dont include the User
-            - 2-3 sentences of advice
-            - Focus on personal improvement
-            - Motivational tone
-            - Actionable recommendations
-            """
-        else:
-            # Generic advice if no workout data
-            prompt += """
-            [Provide general life motivation]
-            [Encourage personal growth]
-            
-            Requirements:
-            - DOnt include the user 
-            - 2-3 sentences of advice
-            - Inspiring and constructive
-            - Universal application
-            """
-        
-        # Generate the advice
-        response = model.generate_content(prompt)
-        
-        # Prepare the advice dictionary
-        advice = {
-            "advice_id": str(uuid.uuid4()),  # Generate a unique ID
-            "timestamp": datetime.now().isoformat(),
-            "content": response.text
-        }
-        
-        return advice
+        cached_advice, generation = _advice_generation(user_id)
+        if generation is None:
+            return cached_advice
+        return generation.wait(timeout=timeout)
     
     except Exception as e:
         print(f"Error generating advice: {e}")
         return None
 
 
-def get_data_for_community_page(user_id):
+def stream_genai_advice(user_id):
+    """
+    Generates advice like get_genai_advice, but yields it while it streams in.
+
+    Each time a chunk arrives, the cards received so far are yielded so the
+    page can show the first card before the model has finished writing.
+    Cached advice is yielded once, straight away. A generation already
+    running for the same history (another tab, or the Home page) is
+    followed instead of starting a second one.
+
+    Args:
+        user_id (str): Unique identifier for the user
+
+    Yields:
+        dict: content1-content4 so far; the last one yielded is the complete
+            advice (with advice_id, timestamp and content). Nothing more is
+            yielded if generation fails.
+    """
+    try:
+        cached_advice, generation = _advice_generation(user_id)
+        if generation is None:
+            yield cached_advice
+            return
+        yield from generation.follow()
+
+    except Exception as e:
+        print(f"Error streaming advice: {e}")
+
+
+def _advice_generation(user_id):
+    """
+    Returns (cached advice, None), or (None, generation stream) on a cache miss.
+
+    Tabs or reruns asking for the same advice at once share one generation.
+    """
+    # Fetch user's workout data
+    workout_data = get_user_workouts(user_id, limit=ADVICE_WORKOUT_LIMIT)
+
+    # Unchanged workout history gets the advice generated last time
+    advice_cache = get_advice_cache()
+    cache_key = fingerprint(user_id, workout_data)
+    cached_advice = advice_cache.get(cache_key)
+    if cached_advice is not None:
+        return cached_advice, None
+
+    return None, _advice_flights.start(
+        cache_key, lambda emit: _generate_advice(workout_data, cache_key, advice_cache, emit)
+    )
+
+
+def _generate_advice(workout_data, cache_key, advice_cache, emit):
+    """
+    Streams Gemini's advice on `workout_data`, emitting the cards so far after
+    each chunk, and stores the finished advice under `cache_key`.
+    """
+    # Another flight may have stored it between our cache miss and now
+    cached_advice = advice_cache.peek(cache_key)
+    if cached_advice is not None:
+        return cached_advice
+
+    # Summarize the history into a fixed-size prompt
+    prompt = build_advice_prompt(summarize_workouts(workout_data))
+
+    # The slot is held while the model writes, not while pages render it
+    with llm_limiter:
+        started = time.perf_counter()
+        text = ""
+        for chunk in get_model().generate_content(prompt, stream=True):
+            text += chunk.text
+            emit(parse_partial_advice(text))
+        latency = time.perf_counter() - started
+
+    advice = _make_advice(text)
+    advice_cache.set(cache_key, advice, latency=latency)
+    return advice
+
+
+def _make_advice(text):
+    """Builds the advice dictionary from the model's full reply."""
+    return {
+        "advice_id": str(uuid.uuid4()),  # Generate a unique ID
+        "timestamp": datetime.now().isoformat(),
+        **parse_advice(text)
+    }
+
+
+def get_friends_feed(friend_ids, limit=FEED_PAGE_SIZE, cursor=None):
+    """
+    Returns the newest posts written by any of the given friends.
+
+    All friends are fetched in a single query; ordering and the limit are
+    applied by BigQuery so only `limit` rows ever come back.
+
+    Args:
+        friend_ids (list): UserIds whose posts make up the feed
+        limit (int): Maximum number of posts to return
+        cursor (tuple, optional): (timestamp, post_id) of the last post already
+            shown; only older posts are returned
+
+    Returns:
+        tuple: (posts, next_cursor) where next_cursor is None when there are
+            no more posts to load
+    """
+    if not friend_ids:
+        return [], None
+
+    try:
+        client = get_bigquery_client()
+        friend_ids = [normalize_id(friend_id) for friend_id in friend_ids]
+
+        feed_query = """
+        SELECT 
+            AuthorId as user_id,
+            PostId as post_id,
+            FORMAT_DATETIME('%Y-%m-%d %H:%M:%S', Timestamp) as timestamp,
+            Content as content,
+            ImageUrl as image
+        FROM `e3-ai-shoe-starter.section_e3.Posts`
+        WHERE AuthorId IN UNNEST(@friend_ids)
+        """
+
+        query_params = [
+            bigquery.ArrayQueryParameter("friend_ids", "STRING", list(friend_ids)),
+            # Ask for one extra row so we know whether another page exists
+            bigquery.ScalarQueryParameter("limit", "INT64", limit + 1),
+        ]
+
+        # Keyset pagination: continue strictly after the last post shown
+        if cursor:
+            cursor_timestamp, cursor_post_id = cursor
+            cursor_timestamp = datetime.strptime(cursor_timestamp, "%Y-%m-%d %H:%M:%S")
+            feed_query += """
+            AND (Timestamp < @cursor_timestamp
+                 OR (Timestamp = @cursor_timestamp AND PostId < @cursor_post_id))
+            """
+            query_params += [
+                bigquery.ScalarQueryParameter("cursor_timestamp", "DATETIME", cursor_timestamp),
+                bigquery.ScalarQueryParameter("cursor_post_id", "STRING", cursor_post_id),
+            ]
+
+        feed_query += """
+        ORDER BY Timestamp DESC, PostId DESC
+        LIMIT @limit
+        """
+
+        job_config = bigquery.QueryJobConfig(query_parameters=query_params)
+        results = cached_query(
+            client, feed_query, job_config,
+            tags=[f"posts:{friend_id}" for friend_id in friend_ids], ttl=POSTS_TTL
+        )
+
+        posts = []
+        for row in results:
+            posts.append({
+                "user_id": row.user_id,
+                "post_id": row.post_id,
+                "timestamp": row.timestamp,
+                "content": row.content,
+                "image": row.image
+            })
+
+        next_cursor = None
+        if len(posts) > limit:
+            posts = posts[:limit]
+            next_cursor = (posts[-1]["timestamp"], posts[-1]["post_id"])
+
+        return posts, next_cursor
+    except Exception as e:
+        print(f"Error retrieving friends feed: {e}")
+        return [], None
+
+
+def get_data_for_community_page(user_id, profile=None):
     
     """
     Fetches data for displaying a user's community page.
+
+    Pass the already-resolved `profile` to skip looking it up again.
+
+    GenAI advice and the profile + friends feed are fetched concurrently, each
+    with its own deadline. If one of them fails or is too slow its part of the
+    tuple is missing and the rest of the page still renders: advice is None,
+    and posts are [] when the feed fails, times out or has no posts yet.
+    Only a missing profile makes the posts and profile None.
     
     Returns a tuple of (gen_ai_advice, friends_posts, user_profile).
     """
+    # Kept outside the branch, so a feed that misses its deadline still
+    # leaves the profile it was started with
+    resolved = {"user": profile}
+
+    def fetch_profile_and_feed():
+        user = resolved["user"]
+        if user is None:
+            user = resolved["user"] = get_user_profile(user_id)
+        friends = user['friends'] if user else []
+        if not friends:
+            return []
+        friends_posts, _ = get_friends_feed(friends, limit=FEED_PAGE_SIZE)
+        return friends_posts
+
+    results, _ = run_in_parallel(
+        {
+            # Bounded by the deadline, so a slow generation does not keep
+            # holding the fetch worker after the page has stopped waiting
+            "advice": lambda: get_genai_advice(user_id, timeout=ADVICE_DEADLINE),
+            "feed": fetch_profile_and_feed,
+        },
+        deadlines={"advice": ADVICE_DEADLINE, "feed": FEED_DEADLINE},
+    )
 
-    gen_ai_advice = get_genai_advice(user_id)
-    
-    friends = get_user_profile(user_id)['friends']
-    if not friends:
-        return gen_ai_advice, None , None
-
-    friends_posts = []
-    for friend in friends:
-        posts = get_user_posts(friend)
-       
-        for post in posts:
-            
-            friends_posts.append(post)
+    gen_ai_advice = results["advice"]
+    user = resolved["user"]
+    if not user:
+        return gen_ai_advice, None, None
     
-    friends_posts.sort(key=lambda x: x['timestamp'])
-    n_len = len(friends_posts)
-    
-    if n_len >= 9:
-        friends_posts = friends_posts[:10]
-    else:
-        friends_posts = friends_posts[:n_len]
-    user = get_user_profile(user_id)
-    
-    return gen_ai_advice, friends_posts , user
+    return gen_ai_advice, results["feed"] or [], user
 
 
 def create_user_post(user_id, content=None, image_url=None):
     """
     Creates a new post in BigQuery with optional content and image.
+
+    The post is queued on the write pipeline and written in the next batch,
+    so this returns without waiting for BigQuery.
     
     Args:
         user_id (str): ID of the user creating the post
@@ -348,36 +711,22 @@ def create_user_post(user_id, content=None, image_url=None):
         # Get current timestamp in the format specified
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
-        # Initialize BigQuery client with specific project
-        client = bigquery.Client(project="e3-ai-shoe-starter")
-        
-        # Prepare the BigQuery insert query with full table path
-        insert_query = """
-        INSERT INTO `e3-ai-shoe-starter.section_e3.Posts` (PostId, AuthorId, Timestamp, ImageUrl, Content)
-        VALUES (@post_id, @author_id, @timestamp, @image_url, @content)
-        """
-        
-        # Ensure all parameters are converted to strings
-        post_id = str(post_id)
-        user_id = str(user_id)
+        # Ensure all values are converted to strings
+        post_id = normalize_id(post_id)
+        user_id = normalize_id(user_id)
         timestamp = str(timestamp)
         image_url = str(image_url) if image_url is not None else "https://cdn.statcdn.com/Statistic/635000/639015-blank-754.png"
         content = str(content) if content is not None else "My Stats"
         
-        # Set query parameters (all as strings)
-        query_params = [
-            bigquery.ScalarQueryParameter("post_id", "STRING", post_id),
-            bigquery.ScalarQueryParameter("author_id", "STRING", user_id),
-            bigquery.ScalarQueryParameter("timestamp", "STRING", timestamp),
-            bigquery.ScalarQueryParameter("image_url", "STRING", image_url),
-            bigquery.ScalarQueryParameter("content", "STRING", content)
-        ]
-        
-        # Create job config
-        job_config = bigquery.QueryJobConfig(query_parameters=query_params)
-        
-        # Run the query
-        client.query(insert_query, job_config=job_config).result()
+        # Queue the row; it is written to BigQuery in the next batch
+        row = {
+            "PostId": post_id,
+            "AuthorId": user_id,
+            "Timestamp": timestamp,
+            "ImageUrl": image_url,
+            "Content": content,
+        }
+        enqueue_row(POSTS_TABLE, row, row_id=post_id, tags=[f"posts:{user_id}"])
         
         st.success(f"✅ New post created: {post_id}")
         return post_id
@@ -437,7 +786,7 @@ def upload_image_to_gcs(uploaded_file):
 
 def get_user_id_from_auth0_id(auth0_id):
     """Returns internal UserId (e.g., 'user1') from Auth0 user_id."""
-    client = bigquery.Client(project="e3-ai-shoe-starter")
+    client = get_bigquery_client()
 
     query = """
     SELECT UserId
@@ -451,7 +800,7 @@ def get_user_id_from_auth0_id(auth0_id):
     )
 
     try:
-        results = client.query(query, job_config=job_config).result()
+        results = cached_query(client, query, job_config, tags=["users"])
         for row in results:
             return row.UserId
         return None
@@ -465,7 +814,9 @@ def insert_new_user(user_id, name, username, dob, image_url, auth0_id, email=Non
     Insert a new user into the BigQuery database.
     """
     try:
-        client = bigquery.Client(project="e3-ai-shoe-starter")
+        client = get_bigquery_client()
+        user_id = normalize_id(user_id)
+        auth0_id = normalize_id(auth0_id)
         
         # Convert MMDDYYYY → YYYY-MM-DD
         try:
@@ -495,6 +846,7 @@ def insert_new_user(user_id, name, username, dob, image_url, auth0_id, email=Non
         # Execute query
         job_config = bigquery.QueryJobConfig(query_parameters=query_params)
         client.query(insert_query, job_config=job_config).result()
+        invalidate("users", f"profile:{user_id}")
         
         print(f"✅ New user inserted: {user_id} with Auth0 ID: {auth0_id} and Email: {email}")
         return True
@@ -506,7 +858,8 @@ def insert_new_user(user_id, name, username, dob, image_url, auth0_id, email=Non
 
 
 def get_all_other_users(current_user_id):
-    client = bigquery.Client()
+    client = get_bigquery_client()
+    current_user_id = normalize_id(current_user_id)
 
     query = """
     SELECT U.UserId, U.Name
@@ -525,14 +878,16 @@ def get_all_other_users(current_user_id):
         ]
     )
 
-    return list(client.query(query, job_config=job_config).result())
+    return cached_query(client, query, job_config, tags=["users", f"friends:{current_user_id}"])
 
 
 def add_friend(current_user_id, friend_user_id):
     from google.cloud import bigquery
 
-    client = bigquery.Client()
+    client = get_bigquery_client()
     table_id = "e3-ai-shoe-starter.section_e3.Friends"
+    current_user_id = normalize_id(current_user_id)
+    friend_user_id = normalize_id(friend_user_id)
 
     # Step 1: Check if the friendship already exists
     check_query = """
@@ -563,11 +918,13 @@ def add_friend(current_user_id, friend_user_id):
     ]
 
     errors = client.insert_rows_json(table_id, rows_to_insert)
+    invalidate(f"friends:{current_user_id}", f"friends:{friend_user_id}")
     return errors
     
 
 def get_friends(current_user_id):
-    client = bigquery.Client()
+    client = get_bigquery_client()
+    current_user_id = normalize_id(current_user_id)
     query = f"""
     SELECT U.Name AS friend_name
     FROM `e3-ai-shoe-starter.section_e3.Friends` F
@@ -580,4 +937,4 @@ def get_friends(current_user_id):
             bigquery.ScalarQueryParameter("user_id", "STRING", current_user_id)
         ]
     )
-    return list(client.query(query, job_config=job_config).result())
+    return cached_query(client, query, job_config, tags=[f"friends:{current_user_id}"])
@@ -2,7 +2,15 @@ print("Loading test file...")
 
 import unittest
 from data_fetcher import get_user_workouts,get_user_sensor_data, get_user_profile, get_user_posts
+from data_fetcher import get_friends_feed, get_data_for_community_page, get_user_workouts_page
+from data_fetcher import get_user_sensor_series, iter_user_sensor_data, get_genai_advice, stream_genai_advice
+from gemini_model import LocalGenerativeModel, use_local_model
+from advice_cache import AdviceCache
+from datetime import datetime, date, timedelta
 from unittest.mock import patch, MagicMock
+import numpy as np
+from bigquery_pool import reset_bigquery_client, use_local_backend, LocalBigQueryBackend
+from query_cache import clear_cache
 
 
 class TestDataFetcher(unittest.TestCase):
@@ -10,6 +18,10 @@ class TestDataFetcher(unittest.TestCase):
         patcher = patch('google.cloud.bigquery.Client')
         self.addCleanup(patcher.stop)
         self.mock_client_class = patcher.start()
+        reset_bigquery_client()
+        self.addCleanup(reset_bigquery_client)
+        clear_cache()
+        self.addCleanup(clear_cache)
 
         self.mock_row_user1 = MagicMock()
         self.mock_row_user1.user_id = "user1"
@@ -72,6 +84,49 @@ class TestDataFetcher(unittest.TestCase):
             self.assertIsInstance(data_point['data'], (int, float))
             self.assertIsInstance(data_point['units'], str)
 
+    def test_get_user_sensor_series(self):
+        rows = [
+            MagicMock(sensor_type='sensor1', timestamp=datetime(2024, 1, 1, 10, 0, 0), data=100),
+            MagicMock(sensor_type='sensor1', timestamp=datetime(2024, 1, 1, 10, 0, 1), data=104),
+            MagicMock(sensor_type='sensor2', timestamp=datetime(2024, 1, 1, 10, 0, 0), data=12),
+        ]
+        self.mock_client_class.return_value.query.return_value.result.return_value.pages = [rows[:2], rows[2:]]
+        series = get_user_sensor_series('user1', 'workout1')
+        self.assertEqual(sorted(series), ['sensor1', 'sensor2'])
+        self.assertEqual(list(series['sensor1'].values), [100.0, 104.0])
+        self.assertEqual(series['sensor2'].units, 'steps')
+
+    def test_iter_user_sensor_data_streams_pages(self):
+        backend = LocalBigQueryBackend()
+        use_local_backend(backend)
+        self.addCleanup(use_local_backend, None)
+        start = datetime(2024, 1, 1, 10, 0, 0)
+        backend.add_result("FROM `e3-ai-shoe-starter.section_e3.SensorData`", [
+            {'sensor_type': 'sensor1', 'timestamp': start + timedelta(seconds=n), 'data': 100 + n}
+            for n in range(7)
+        ])
+
+        batches = iter_user_sensor_data('user1', 'workout1', batch_size=3)
+        first = next(batches)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(first.values.dtype, np.float64)
+        self.assertEqual([len(batch) for batch in batches], [3, 1])
+        _, params = backend.queries[0]
+        self.assertEqual(params, {'user_id': 'user1', 'workout_id': 'workout1'})
+
+    def test_readers_normalize_ids(self):
+        backend = LocalBigQueryBackend()
+        use_local_backend(backend)
+        self.addCleanup(use_local_backend, None)
+
+        get_user_sensor_data(' user1 ', 'workout1\n')
+        get_user_workouts(' user1')
+        get_user_profile('user1 ')
+
+        for _, params in backend.queries:
+            self.assertEqual(params['user_id'], 'user1')
+        self.assertEqual(backend.queries[0][1]['workout_id'], 'workout1')
+
     def test_get_user_profile(self):
         mock_user = MagicMock()
         mock_user.full_name = "Alice Johnson"
@@ -150,5 +205,145 @@ class TestDataFetcher(unittest.TestCase):
         result = get_user_posts("user1")
         self.assertIn(result[0]["content"], allowed)
 
+    def test_get_friends_feed_single_query(self):
+        mock_client = self.mock_client_class.return_value
+        mock_client.query.return_value.result.return_value = [self.mock_row_user2, self.mock_row_user1]
+        posts, cursor = get_friends_feed(["user1", "user2"], limit=10)
+        self.assertEqual([p["post_id"] for p in posts], ["post2", "post1"])
+        self.assertIsNone(cursor)
+        mock_client.query.assert_called_once()
+        query = mock_client.query.call_args[0][0]
+        self.assertIn("UNNEST(@friend_ids)", query)
+        self.assertIn("ORDER BY Timestamp DESC", query)
+        params = mock_client.query.call_args[1]["job_config"].query_parameters
+        self.assertEqual(params[0].values, ["user1", "user2"])
+
+    def test_get_friends_feed_cursor(self):
+        mock_client = self.mock_client_class.return_value
+        mock_client.query.return_value.result.return_value = [self.mock_row_user2, self.mock_row_user1]
+        posts, cursor = get_friends_feed(["user1", "user2"], limit=1)
+        self.assertEqual(len(posts), 1)
+        self.assertEqual(cursor, ("2024-07-29 13:00:00", "post2"))
+
+        get_friends_feed(["user1", "user2"], limit=1, cursor=cursor)
+        query = mock_client.query.call_args[0][0]
+        self.assertIn("@cursor_timestamp", query)
+
+    def test_get_friends_feed_no_friends(self):
+        self.assertEqual(get_friends_feed([]), ([], None))
+        self.mock_client_class.return_value.query.assert_not_called()
+
+    @patch("data_fetcher.get_genai_advice", return_value={"content": "Keep going."})
+    @patch("data_fetcher.get_friends_feed")
+    @patch("data_fetcher.get_user_profile")
+    def test_community_page_fetches_profile_once(self, mock_profile, mock_feed, mock_advice):
+        mock_profile.return_value = {"full_name": "Alice", "friends": ["user2", "user3"]}
+        mock_feed.return_value = ([{"post_id": "post2"}], None)
+        advice, posts, user = get_data_for_community_page("user1")
+        mock_profile.assert_called_once_with("user1")
+        mock_feed.assert_called_once()
+        self.assertEqual(mock_feed.call_args[0][0], ["user2", "user3"])
+        self.assertEqual(posts, [{"post_id": "post2"}])
+        self.assertEqual(user["full_name"], "Alice")
+
+    @patch("data_fetcher.get_genai_advice", return_value=None)
+    @patch("data_fetcher.get_friends_feed")
+    @patch("data_fetcher.get_user_profile")
+    def test_community_page_keeps_profile_without_posts(self, mock_profile, mock_feed, mock_advice):
+        mock_profile.return_value = {"full_name": "Alice", "friends": ["user2"]}
+
+        # Friends who have not posted yet
+        mock_feed.return_value = ([], None)
+        advice, posts, user = get_data_for_community_page("user1")
+        self.assertEqual((posts, user["full_name"]), ([], "Alice"))
+
+        # A feed that fails
+        mock_feed.side_effect = Exception("BigQuery error")
+        advice, posts, user = get_data_for_community_page("user1")
+        self.assertEqual((posts, user["full_name"]), ([], "Alice"))
+
+        # Only a missing profile leaves nothing to show
+        mock_profile.return_value = None
+        self.assertEqual(get_data_for_community_page("user1"), (None, None, None))
+
+    @patch("data_fetcher.get_user_workouts")
+    def test_genai_advice_is_cached_until_history_changes(self, mock_workouts):
+        cache = AdviceCache()
+        model = LocalGenerativeModel("Keep going.")
+        use_local_model(model)
+        self.addCleanup(use_local_model, None)
+        workout = {
+            "workout_id": "w1", "start_timestamp": "2024-01-01T10:00:00", "end_timestamp": "2024-01-01T10:30:00",
+            "distance": 5.0, "steps": 6000, "calories_burned": 300,
+        }
+        mock_workouts.return_value = [workout]
+
+        with patch("data_fetcher.get_advice_cache", return_value=cache):
+            first = get_genai_advice("user1")
+            second = get_genai_advice("user1")
+            mock_workouts.return_value = [workout, dict(workout, workout_id="w2")]
+            get_genai_advice("user1")
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(model.prompts), 2)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    @patch("data_fetcher.get_user_workouts", return_value=[])
+    def test_stream_genai_advice_yields_cards_as_they_arrive(self, mock_workouts):
+        cache = AdviceCache()
+        reply = '{"content1": "Run an easy 5 km today.", "content2": "Try one hill repeat."}'
+        use_local_model(LocalGenerativeModel(reply, chunk_size=10))
+        self.addCleanup(use_local_model, None)
+
+        with patch("data_fetcher.get_advice_cache", return_value=cache):
+            snapshots = list(stream_genai_advice("user1"))
+            cached = list(stream_genai_advice("user1"))
+
+        self.assertGreater(len(snapshots), 2)
+        first_text = next(s for s in snapshots if s["content1"])
+        self.assertIsNone(first_text["content2"])
+        self.assertEqual(snapshots[-1]["content2"], "Try one hill repeat.")
+        self.assertIn("advice_id", snapshots[-1])
+        self.assertEqual(cached, [snapshots[-1]])
+
+    def _workout_row(self, workout_id, start):
+        row = MagicMock()
+        row.WorkoutId = workout_id
+        row.StartTimestamp = start
+        row.EndTimestamp = start
+        row.TotalDistance = 5.0
+        row.TotalSteps = 6000
+        row.CaloriesBurned = 300
+        return row
+
+    def test_get_user_workouts_newest_first_with_limit(self):
+        mock_client = self.mock_client_class.return_value
+        mock_client.query.return_value.result.return_value = [
+            self._workout_row("w3", datetime(2024, 1, 3, 9, 0, 0)),
+            self._workout_row("w2", datetime(2024, 1, 2, 9, 0, 0)),
+        ]
+        workouts = get_user_workouts("user1", limit=1)
+        self.assertEqual([w["workout_id"] for w in workouts], ["w3"])
+        query = mock_client.query.call_args[0][0]
+        self.assertIn("ORDER BY StartTimestamp DESC", query)
+        self.assertIn("LIMIT @limit", query)
+
+    def test_get_user_workouts_page_cursor_and_range(self):
+        mock_client = self.mock_client_class.return_value
+        mock_client.query.return_value.result.return_value = [
+            self._workout_row("w3", datetime(2024, 1, 3, 9, 0, 0)),
+            self._workout_row("w2", datetime(2024, 1, 2, 9, 0, 0)),
+        ]
+        workouts, cursor = get_user_workouts_page("user1", limit=1)
+        self.assertEqual(cursor, ("2024-01-03 09:00:00", "w3"))
+
+        get_user_workouts_page("user1", limit=1, cursor=cursor, start=date(2024, 1, 1), end=date(2024, 2, 1))
+        query = mock_client.query.call_args[0][0]
+        params = {p.name: p.value for p in mock_client.query.call_args[1]["job_config"].query_parameters}
+        self.assertIn("@cursor_timestamp", query)
+        self.assertEqual(params["cursor_timestamp"], datetime(2024, 1, 3, 9, 0, 0))
+        self.assertEqual(params["start"], datetime(2024, 1, 1))
+        self.assertEqual(params["end"], datetime(2024, 2, 1))
+
 if __name__ == "__main__":
     unittest.main()
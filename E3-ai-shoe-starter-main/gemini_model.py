@@ -0,0 +1,138 @@
+#############################################################################
+# gemini_model.py
+#
+# This file contains the shared Gemini model handle.
+#
+# genai.configure and GenerativeModel used to run on every advice request.
+# The handle is now built once per process and reused. Tests and local
+# development can swap in LocalGenerativeModel, which returns canned text
+# (optionally streamed in chunks with artificial latency) without any API key.
+#############################################################################
+
+import os
+import threading
+import time
+
+import google.generativeai as genai
+
+
+GEMINI_MODEL_NAME = "gemini-1.5-flash"
+
+# Advice is requested as JSON so it can be split into cards reliably
+ADVICE_GENERATION_CONFIG = {"response_mime_type": "application/json"}
+
+
+class GeminiModelProvider:
+    """
+    Builds the Gemini model once and hands the same handle to every caller.
+
+    Args:
+        model_name (str): Gemini model to use
+    """
+
+    def __init__(self, model_name=GEMINI_MODEL_NAME):
+        self.model_name = model_name
+        self._model = None
+        self._override = None
+        self._lock = threading.Lock()
+
+    def get_model(self):
+        """Returns the shared model, configuring the API on first use."""
+        if self._override is not None:
+            return self._override
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+                    self._model = genai.GenerativeModel(
+                        self.model_name,
+                        generation_config=ADVICE_GENERATION_CONFIG,
+                    )
+        return self._model
+
+    def set_model(self, model):
+        """Serves `model` instead of Gemini (None switches back)."""
+        self._override = model
+
+    def reset(self):
+        """Drops the cached handle so the next call configures a new one."""
+        with self._lock:
+            self._model = None
+
+
+_provider = GeminiModelProvider()
+
+
+def get_model():
+    """Returns the shared Gemini model (or the local stand-in if one is set)."""
+    return _provider.get_model()
+
+
+def use_local_model(model):
+    """Routes all generation to `model`, e.g. a LocalGenerativeModel (None to undo)."""
+    _provider.set_model(model)
+
+
+def reset_model():
+    """Forgets the shared model handle."""
+    _provider.reset()
+
+
+class LocalChunk:
+    """One piece of a response, shaped like a Gemini response chunk."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class LocalResponse:
+    """
+    Response from LocalGenerativeModel.
+
+    Iterating yields the chunks (sleeping `chunk_latency` before each one);
+    .text is the whole reply.
+    """
+
+    def __init__(self, chunks, chunk_latency=0.0):
+        self._chunks = chunks
+        self.chunk_latency = chunk_latency
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            if self.chunk_latency:
+                time.sleep(self.chunk_latency)
+            yield LocalChunk(chunk)
+
+    @property
+    def text(self):
+        return "".join(self._chunks)
+
+
+class LocalGenerativeModel:
+    """
+    In-memory stand-in for genai.GenerativeModel.
+
+    Args:
+        reply (str): Text returned for every prompt
+        chunk_size (int): Characters per streamed chunk
+        latency (float): Seconds a non-streamed call takes
+        chunk_latency (float): Seconds before each streamed chunk
+    """
+
+    def __init__(self, reply, chunk_size=20, latency=0.0, chunk_latency=0.0):
+        self.reply = reply
+        self.chunk_size = chunk_size
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        with self._lock:
+            self.prompts.append(prompt)
+        chunks = [self.reply[i:i + self.chunk_size] for i in range(0, len(self.reply), self.chunk_size)]
+        if stream:
+            return LocalResponse(chunks, chunk_latency=self.chunk_latency)
+        if self.latency:
+            time.sleep(self.latency)
+        return LocalResponse(chunks)
@@ -0,0 +1,65 @@
+#############################################################################
+# identity.py
+#
+# This file contains the per-session identity context for the logged-in user.
+#
+# The Auth0 ID is resolved to our internal UserId (and that user's profile)
+# once per session and kept in st.session_state. Pages and modules read the
+# context instead of querying BigQuery again on every rerun.
+#############################################################################
+
+import streamlit as st
+from data_fetcher import get_user_id_from_auth0_id, get_user_profile
+
+
+IDENTITY_KEY = "identity"
+
+
+def get_identity(refresh=False):
+    """
+    Returns the identity context for the current session.
+
+    The Auth0 ID stored at login is resolved the first time this is called
+    and again only when the Auth0 ID changes or `refresh` is True.
+
+    Args:
+        refresh (bool): Re-resolve the UserId and profile from BigQuery
+
+    Returns:
+        dict: {"auth0_id", "user_id", "profile"}; user_id/profile are None
+            for users who have not completed their profile yet
+    """
+    auth0_id = st.session_state.get("user_id")
+    identity = st.session_state.get(IDENTITY_KEY)
+
+    if refresh or identity is None or identity["auth0_id"] != auth0_id:
+        user_id = get_user_id_from_auth0_id(auth0_id) if auth0_id else None
+        profile = get_user_profile(user_id) if user_id else None
+        identity = {
+            "auth0_id": auth0_id,
+            "user_id": user_id,
+            "profile": profile,
+        }
+        st.session_state[IDENTITY_KEY] = identity
+
+    return identity
+
+
+def current_user_id():
+    """Returns the internal UserId of the logged-in user."""
+    return get_identity()["user_id"]
+
+
+def current_profile():
+    """Returns the profile of the logged-in user."""
+    return get_identity()["profile"]
+
+
+def refresh_identity():
+    """Re-resolves the identity after the user's profile or friends change."""
+    return get_identity(refresh=True)
+
+
+def clear_identity():
+    """Forgets the identity context, e.g. on logout."""
+    st.session_state.pop(IDENTITY_KEY, None)
@@ -0,0 +1,51 @@
+import unittest
+from unittest.mock import patch
+
+from identity import get_identity, current_user_id, current_profile, refresh_identity, clear_identity
+
+
+@patch("identity.get_user_profile", return_value={"full_name": "Alice", "friends": []})
+@patch("identity.get_user_id_from_auth0_id", return_value="user1")
+class TestIdentity(unittest.TestCase):
+    def setUp(self):
+        patcher = patch("identity.st")
+        self.addCleanup(patcher.stop)
+        self.mock_st = patcher.start()
+        self.mock_st.session_state = {"user_id": "auth0|abc"}
+
+    def test_resolved_once_per_session(self, mock_lookup, mock_profile):
+        for _ in range(3):
+            self.assertEqual(current_user_id(), "user1")
+            self.assertEqual(current_profile()["full_name"], "Alice")
+
+        mock_lookup.assert_called_once_with("auth0|abc")
+        mock_profile.assert_called_once_with("user1")
+
+    def test_refresh_resolves_again(self, mock_lookup, mock_profile):
+        get_identity()
+        refresh_identity()
+        self.assertEqual(mock_lookup.call_count, 2)
+        self.assertEqual(mock_profile.call_count, 2)
+
+    def test_new_auth0_id_resolves_again(self, mock_lookup, mock_profile):
+        get_identity()
+        self.mock_st.session_state["user_id"] = "auth0|xyz"
+        identity = get_identity()
+        self.assertEqual(identity["auth0_id"], "auth0|xyz")
+        self.assertEqual(mock_lookup.call_count, 2)
+
+    def test_unknown_user_has_no_profile(self, mock_lookup, mock_profile):
+        mock_lookup.return_value = None
+        identity = get_identity()
+        self.assertIsNone(identity["user_id"])
+        self.assertIsNone(identity["profile"])
+        mock_profile.assert_not_called()
+
+    def test_clear_identity(self, mock_lookup, mock_profile):
+        get_identity()
+        clear_identity()
+        self.assertNotIn("identity", self.mock_st.session_state)
+
+
+if __name__ == "__main__":
+    unittest.main()
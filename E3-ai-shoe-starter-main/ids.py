@@ -0,0 +1,27 @@
+#############################################################################
+# ids.py
+#
+# This file contains the single rule for how IDs are stored and compared.
+#
+# Some older rows carry user and challenge IDs with stray whitespace, which
+# is why queries used to compare TRIM(user_id) = TRIM(@user_id). Wrapping a
+# column in TRIM() stops BigQuery from pruning on it. Every write path now
+# normalizes IDs before they are stored, every read path normalizes its
+# parameters, and migrate_ids.py cleans the rows written before this, so
+# queries can use plain equality on the key columns.
+#############################################################################
+
+
+def normalize_id(value):
+    """
+    Returns the canonical form of an ID: a string with no surrounding whitespace.
+
+    Args:
+        value: ID as given by the caller (str, int, ...), or None
+
+    Returns:
+        str or None: The normalized ID, None if `value` is None
+    """
+    if value is None:
+        return None
+    return str(value).strip()
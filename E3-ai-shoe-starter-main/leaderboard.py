@@ -0,0 +1,411 @@
+#############################################################################
+# leaderboard.py
+#
+# This file contains the in-process leaderboard.
+#
+# The Leaderboard page used to join UserPoints with Users and sort the whole
+# table on every view, and only the top 20 could see where they stood. The
+# standings are now loaded from BigQuery once (and reloaded every
+# LEADERBOARD_REFRESH seconds, to pick up points written by other server
+# processes) into a RankIndex: a list of (-points, user_id) kept sorted
+# with bisect. Top-K, "my rank" and "who is around me" are then list
+# lookups, and a user's rank is the count of users with more points, found
+# by binary search.
+#
+# Points awarded by log_user_activity are applied to the index straight
+# away, so the page is up to date without another query. Totals are read
+# with points_totals_sql(), the same way get_user_points reads them, so a
+# reload agrees with the awards already applied.
+#
+# Per-challenge boards (by miles or runs) and friends-only boards pick their
+# top entries with a bounded heap (heapq.nlargest), which keeps only K
+# entries while scanning, instead of sorting every participant. Boards are
+# cached and dropped when activity is logged or a user joins.
+#############################################################################
+
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+
+from google.cloud import bigquery
+
+from bigquery_pool import get_bigquery_client
+from data_fetcher import get_user_profile
+from query_cache import cached_query, cached_value
+
+
+# Seconds before the standings are reloaded from BigQuery
+LEADERBOARD_REFRESH = 600
+
+# Entries shown in the top list, and on each side of the current user
+LEADERBOARD_SIZE = 20
+NEIGHBOR_RADIUS = 2
+
+# Challenge boards can rank by either UserChallenges progress column
+CHALLENGE_METRICS = {"miles": "miles_completed", "runs": "runs_completed"}
+
+# Seconds a challenge or friends board is cached (writes drop it sooner)
+BOARD_TTL = 120
+
+# Ledger awards from this time on count towards totals until a rollup
+# refresh has added them to UserPoints (opening balances are dated before it)
+LEDGER_START = "2000-01-04"
+
+
+def points_totals_sql(user_filter="TRUE"):
+    """
+    Returns SQL giving (user_id, points) totals for the users matching `user_filter`.
+
+    A total is the user's UserPoints row, which points_ledger.refresh_rollups
+    keeps up to its last run (recorded in PointsRollupState), plus the ledger
+    awards made since. Awards therefore count as soon as they are logged,
+    whether or not the rollup job has caught up.
+    """
+    return f"""
+    SELECT user_id, SUM(points) AS points
+    FROM (
+        SELECT user_id, total_points AS points
+        FROM `e3-ai-shoe-starter.section_e3.UserPoints`
+        WHERE {user_filter}
+        UNION ALL
+        SELECT user_id, points
+        FROM `e3-ai-shoe-starter.section_e3.PointsLedger`
+        WHERE {user_filter}
+            AND awarded_at >= (
+                SELECT IFNULL(MAX(rolled_up_to), TIMESTAMP '{LEDGER_START}')
+                FROM `e3-ai-shoe-starter.section_e3.PointsRollupState`
+            )
+    )
+    GROUP BY user_id
+    """
+
+
+class RankIndex:
+    """
+    Users ordered by points, supporting rank queries and point updates.
+
+    Users with the same points share a rank (1, 2, 2, 4, ...). Ties are
+    listed by user_id so the order is stable.
+    """
+
+    def __init__(self):
+        self._points = {}       # user_id -> points
+        self._order = []        # (-points, user_id), sorted
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, user_id):
+        return user_id in self._points
+
+    def load(self, standings):
+        """
+        Replaces the index contents.
+
+        Args:
+            standings (iterable): (user_id, points) pairs
+        """
+        points = {user_id: points or 0 for user_id, points in standings}
+        order = sorted((-value, user_id) for user_id, value in points.items())
+        with self._lock:
+            self._points, self._order = points, order
+
+    def set_points(self, user_id, points):
+        """Sets a user's total, adding the user if needed."""
+        with self._lock:
+            self._set(user_id, points)
+
+    def add_points(self, user_id, delta):
+        """Adds `delta` to a user's total (starting from 0) and returns the new total."""
+        with self._lock:
+            points = self._points.get(user_id, 0) + delta
+            self._set(user_id, points)
+            return points
+
+    def _set(self, user_id, points):
+        old = self._points.get(user_id)
+        if old is not None:
+            del self._order[bisect_left(self._order, (-old, user_id))]
+        self._points[user_id] = points
+        insort(self._order, (-points, user_id))
+
+    def _entry(self, position):
+        negative_points, user_id = self._order[position]
+        # Rank = users with strictly more points, plus one
+        rank = bisect_left(self._order, (negative_points, "")) + 1
+        return {"rank": rank, "user_id": user_id, "points": -negative_points}
+
+    def top(self, k=LEADERBOARD_SIZE):
+        """Returns the first `k` entries as dicts with rank, user_id and points."""
+        with self._lock:
+            return [self._entry(position) for position in range(min(k, len(self._order)))]
+
+    def rank(self, user_id):
+        """Returns the user's entry (rank, user_id, points), or None if the user has no points row."""
+        with self._lock:
+            points = self._points.get(user_id)
+            if points is None:
+                return None
+            return self._entry(bisect_left(self._order, (-points, user_id)))
+
+    def around(self, user_id, radius=NEIGHBOR_RADIUS):
+        """Returns the entries from `radius` places above the user to `radius` below."""
+        with self._lock:
+            points = self._points.get(user_id)
+            if points is None:
+                return []
+            position = bisect_left(self._order, (-points, user_id))
+            start = max(0, position - radius)
+            end = min(len(self._order), position + radius + 1)
+            return [self._entry(n) for n in range(start, end)]
+
+
+class Leaderboard:
+    """
+    Shared RankIndex plus each ranked user's name and username.
+
+    Args:
+        refresh (float): Seconds before the standings are reloaded
+    """
+
+    def __init__(self, refresh=LEADERBOARD_REFRESH):
+        self.refresh = refresh
+        self.index = RankIndex()
+        self.profiles = {}          # user_id -> {"full_name", "username"}
+        self.loads = 0
+        self._loaded_at = None
+        self._load_lock = threading.Lock()
+
+    def _stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh
+
+    def ensure_loaded(self):
+        """Loads the standings if they were never loaded or are older than `refresh`."""
+        if not self._stale():
+            return
+        with self._load_lock:
+            if self._stale():
+                self.reload()
+
+    def reload(self):
+        """Reads every user's points (and name) from BigQuery into the index."""
+        client = get_bigquery_client()
+
+        query = f"""
+        SELECT
+            t.user_id,
+            t.points,
+            u.Name AS full_name,
+            u.Username AS username
+        FROM ({points_totals_sql()}) t
+        LEFT JOIN `e3-ai-shoe-starter.section_e3.Users` u ON t.user_id = u.UserId
+        """
+
+        rows = list(client.query(query).result())
+        self.profiles = {
+            row.user_id: {"full_name": row.full_name, "username": row.username} for row in rows
+        }
+        self.index.load((row.user_id, row.points) for row in rows)
+        self._loaded_at = time.monotonic()
+        self.loads += 1
+
+    def invalidate(self):
+        """Makes the next read reload the standings."""
+        self._loaded_at = None
+
+    def award(self, user_id, points):
+        """Adds awarded points to a user's standing without querying BigQuery."""
+        if self._loaded_at is None:
+            # Not loaded yet; the first load will read the new total
+            return
+        self.index.add_points(user_id, points)
+
+    def _with_profile(self, entry):
+        profile = self.profiles.get(entry["user_id"]) or {}
+        return dict(entry,
+                    full_name=profile.get("full_name") or entry["user_id"],
+                    username=profile.get("username") or entry["user_id"])
+
+    def top(self, k=LEADERBOARD_SIZE):
+        """Returns the top `k` entries with rank, user_id, points, full_name and username."""
+        self.ensure_loaded()
+        return [self._with_profile(entry) for entry in self.index.top(k)]
+
+    def rank(self, user_id):
+        """Returns the user's entry (see top), or None if the user has no points."""
+        self.ensure_loaded()
+        entry = self.index.rank(user_id)
+        return self._with_profile(entry) if entry else None
+
+    def around(self, user_id, radius=NEIGHBOR_RADIUS):
+        """Returns the entries around the user (see top)."""
+        self.ensure_loaded()
+        return [self._with_profile(entry) for entry in self.index.around(user_id, radius)]
+
+
+# One leaderboard per server process, shared by every Streamlit session
+_leaderboard = Leaderboard()
+
+
+def get_leaderboard():
+    """Returns the shared Leaderboard."""
+    return _leaderboard
+
+
+def award_points(user_id, points):
+    """Applies points awarded to `user_id` to the shared leaderboard."""
+    _leaderboard.award(user_id, points)
+
+
+def reset_leaderboard():
+    """Forgets the loaded standings so the next read reloads them."""
+    _leaderboard.invalidate()
+
+
+# CHALLENGE AND FRIENDS BOARDS
+
+def top_k(items, k, key):
+    """
+    Returns the `k` items with the largest key, best first.
+
+    Uses a heap of size k, so n items cost O(n log k) rather than a full sort.
+    Items with equal keys keep their input order.
+    """
+    return heapq.nlargest(k, items, key=key)
+
+
+def rank_entries(entries, value_key="value"):
+    """
+    Adds a "rank" to entries already ordered best first (ties share a rank).
+
+    Only valid for a prefix of the full ordering, like the output of top_k.
+    """
+    ranked = []
+    for position, entry in enumerate(entries):
+        if ranked and ranked[-1][value_key] == entry[value_key]:
+            rank = ranked[-1]["rank"]
+        else:
+            rank = position + 1
+        ranked.append(dict(entry, rank=rank))
+    return ranked
+
+
+def build_board(entries, k, user_id):
+    """Top `k` of `entries` plus the entry for `user_id` with its rank."""
+    top = rank_entries(top_k(entries, k, key=lambda entry: entry["value"]))
+
+    me = None
+    for entry in entries:
+        if entry["user_id"] == user_id:
+            better = sum(1 for other in entries if other["value"] > entry["value"])
+            me = dict(entry, rank=better + 1)
+            break
+
+    return {"top": top, "me": me, "participants": len(entries)}
+
+
+def _challenge_standings(challenge_id):
+    client = get_bigquery_client()
+
+    query = """
+    SELECT
+        uc.user_id,
+        uc.miles_completed,
+        uc.runs_completed,
+        u.Name AS full_name,
+        u.Username AS username
+    FROM `e3-ai-shoe-starter.section_e3.UserChallenges` uc
+    LEFT JOIN `e3-ai-shoe-starter.section_e3.Users` u ON uc.user_id = u.UserId
+    WHERE uc.challenge_id = @challenge_id
+    """
+
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("challenge_id", "STRING", challenge_id)]
+    )
+
+    return cached_query(client, query, job_config, tags=[f"challenge_board:{challenge_id}"], ttl=BOARD_TTL)
+
+
+def get_challenge_leaderboard(challenge_id, metric="miles", k=LEADERBOARD_SIZE, user_id=None):
+    """
+    Ranks a challenge's participants by miles or runs completed.
+
+    Args:
+        challenge_id (str): Challenge to rank
+        metric (str): "miles" or "runs"
+        k (int): Entries in the top list
+        user_id (str, optional): User whose own rank is returned as "me"
+
+    Returns:
+        dict: "top" (entries with rank, user_id, full_name, username, value),
+            "me" (the user's entry or None) and "participants"
+    """
+    column = CHALLENGE_METRICS[metric]
+
+    def compute():
+        entries = [{
+            "user_id": row.user_id,
+            "full_name": row.full_name or row.user_id,
+            "username": row.username or row.user_id,
+            "value": getattr(row, column) or 0,
+        } for row in _challenge_standings(challenge_id)]
+        return build_board(entries, k, user_id)
+
+    return cached_value(("challenge_board", challenge_id, metric, k, user_id), compute,
+                        tags=[f"challenge_board:{challenge_id}"], ttl=BOARD_TTL)
+
+
+def _user_names(user_ids):
+    client = get_bigquery_client()
+
+    query = """
+    SELECT UserId AS user_id, Name AS full_name, Username AS username
+    FROM `e3-ai-shoe-starter.section_e3.Users`
+    WHERE UserId IN UNNEST(@user_ids)
+    """
+
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ArrayQueryParameter("user_ids", "STRING", sorted(user_ids))]
+    )
+
+    rows = cached_query(client, query, job_config, tags=["users"])
+    return {row.user_id: row for row in rows}
+
+
+def get_friends_leaderboard(user_id, k=LEADERBOARD_SIZE):
+    """
+    Ranks a user and their friends by total points.
+
+    Friends come from get_user_profile and points from the shared rank
+    index, so the only query is for the friends' names (cached).
+
+    Args:
+        user_id (str): User whose friends are ranked
+        k (int): Entries in the top list
+
+    Returns:
+        dict: Same shape as get_challenge_leaderboard, "value" being points
+    """
+    def compute():
+        profile = get_user_profile(user_id) or {}
+        members = set(profile.get("friends", [])) | {user_id}
+        names = _user_names(members)
+        leaderboard = get_leaderboard()
+        leaderboard.ensure_loaded()
+
+        entries = []
+        for member in sorted(members):
+            standing = leaderboard.index.rank(member)
+            row = names.get(member)
+            entries.append({
+                "user_id": member,
+                "full_name": (row.full_name if row else None) or member,
+                "username": (row.username if row else None) or member,
+                "value": standing["points"] if standing else 0,
+            })
+        return build_board(entries, k, user_id)
+
+    return cached_value(("friends_board", user_id, k), compute,
+                        tags=["friends_board", f"friends:{user_id}"], ttl=BOARD_TTL)
@@ -0,0 +1,166 @@
+import unittest
+
+from unittest.mock import patch
+
+from bigquery_pool import LocalBigQueryBackend, use_local_backend, reset_bigquery_client
+from leaderboard import (
+    Leaderboard,
+    RankIndex,
+    get_challenge_leaderboard,
+    get_friends_leaderboard,
+    rank_entries,
+    reset_leaderboard,
+    top_k,
+)
+from query_cache import clear_cache, invalidate
+
+
+STANDINGS = [("u1", 50), ("u2", 80), ("u3", 50), ("u4", 10), ("u5", 0)]
+
+
+class TestRankIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = RankIndex()
+        self.index.load(STANDINGS)
+
+    def test_top_is_sorted_with_shared_ranks(self):
+        top = self.index.top(4)
+
+        self.assertEqual([e["user_id"] for e in top], ["u2", "u1", "u3", "u4"])
+        self.assertEqual([e["rank"] for e in top], [1, 2, 2, 4])
+
+    def test_rank_of_user(self):
+        self.assertEqual(self.index.rank("u4"), {"rank": 4, "user_id": "u4", "points": 10})
+        self.assertIsNone(self.index.rank("nobody"))
+
+    def test_around_user(self):
+        around = self.index.around("u4", radius=1)
+
+        self.assertEqual([e["user_id"] for e in around], ["u3", "u4", "u5"])
+        self.assertEqual([e["user_id"] for e in self.index.around("u2", radius=1)], ["u2", "u1"])
+
+    def test_add_points_moves_user(self):
+        self.assertEqual(self.index.add_points("u4", 100), 110)
+        self.index.add_points("new", 60)
+
+        self.assertEqual(self.index.rank("u4")["rank"], 1)
+        self.assertEqual(self.index.rank("new")["rank"], 3)
+        self.assertEqual(len(self.index), 6)
+        # Every user is listed exactly once after updates
+        self.assertEqual(len(self.index.top(100)), 6)
+
+
+class TestLeaderboard(unittest.TestCase):
+    def setUp(self):
+        self.backend = LocalBigQueryBackend()
+        self.backend.add_result("FROM `e3-ai-shoe-starter.section_e3.UserPoints`", [
+            {"user_id": user_id, "points": points, "full_name": f"Name {user_id}", "username": user_id}
+            for user_id, points in STANDINGS if user_id != "u5"
+        ])
+        use_local_backend(self.backend)
+        self.addCleanup(use_local_backend, None)
+        self.addCleanup(reset_bigquery_client)
+
+    def test_views_share_one_load(self):
+        leaderboard = Leaderboard()
+
+        for _ in range(5):
+            top = leaderboard.top(2)
+            leaderboard.rank("u4")
+
+        self.assertEqual(len(self.backend.queries), 1)
+        self.assertEqual(top[0]["full_name"], "Name u2")
+
+    def test_reload_counts_awards_not_yet_rolled_up(self):
+        Leaderboard().top()
+
+        query, _ = self.backend.queries[0]
+        self.assertIn("FROM `e3-ai-shoe-starter.section_e3.PointsLedger`", query)
+        self.assertIn("FROM `e3-ai-shoe-starter.section_e3.PointsRollupState`", query)
+
+    def test_award_updates_without_query(self):
+        leaderboard = Leaderboard()
+        leaderboard.top()
+
+        leaderboard.award("u4", 45)
+        leaderboard.award("u9", 5)
+
+        self.assertEqual(leaderboard.rank("u4")["rank"], 2)
+        self.assertEqual(leaderboard.rank("u9")["full_name"], "u9")
+        self.assertEqual(len(self.backend.queries), 1)
+
+    def test_reload_after_refresh_interval(self):
+        leaderboard = Leaderboard(refresh=0)
+
+        leaderboard.top()
+        leaderboard.top()
+
+        self.assertEqual(leaderboard.loads, 2)
+
+
+class TestBoards(unittest.TestCase):
+    def setUp(self):
+        self.backend = LocalBigQueryBackend()
+        self.backend.add_result("section_e3.UserChallenges", [
+            {"user_id": f"u{n}", "miles_completed": float(n % 7), "runs_completed": n % 3,
+             "full_name": None, "username": None}
+            for n in range(100)
+        ])
+        self.backend.add_result("FROM `e3-ai-shoe-starter.section_e3.UserPoints`", [
+            {"user_id": user_id, "points": points, "full_name": None, "username": None}
+            for user_id, points in STANDINGS
+        ])
+        self.backend.add_result("WHERE UserId IN UNNEST(@user_ids)", lambda params: [
+            {"user_id": user_id, "full_name": f"Name {user_id}", "username": user_id}
+            for user_id in params["user_ids"]
+        ])
+        use_local_backend(self.backend)
+        self.addCleanup(use_local_backend, None)
+        self.addCleanup(reset_bigquery_client)
+        clear_cache()
+        self.addCleanup(clear_cache)
+        reset_leaderboard()
+        self.addCleanup(reset_leaderboard)
+
+    def test_top_k_and_ranks(self):
+        entries = [{"user_id": u, "value": v} for u, v in [("a", 3), ("b", 9), ("c", 3), ("d", 1)]]
+
+        ranked = rank_entries(top_k(entries, 3, key=lambda e: e["value"]))
+
+        self.assertEqual([(e["user_id"], e["rank"]) for e in ranked], [("b", 1), ("a", 2), ("c", 2)])
+
+    def test_challenge_board_by_metric(self):
+        board = get_challenge_leaderboard("c1", metric="miles", k=5, user_id="u0")
+
+        self.assertEqual(board["participants"], 100)
+        self.assertEqual(len(board["top"]), 5)
+        self.assertTrue(all(entry["value"] == 6.0 for entry in board["top"]))
+        self.assertEqual(board["me"]["value"], 0.0)
+        # 85 participants have more than 0 miles
+        self.assertEqual(board["me"]["rank"], 86)
+        self.assertEqual(board["top"][0]["full_name"], board["top"][0]["user_id"])
+
+        runs = get_challenge_leaderboard("c1", metric="runs", k=5)
+        self.assertEqual(runs["top"][0]["value"], 2)
+
+    def test_challenge_board_is_cached_until_activity(self):
+        get_challenge_leaderboard("c1")
+        get_challenge_leaderboard("c1")
+        self.assertEqual(len(self.backend.queries), 1)
+
+        invalidate("challenge_board:c1")
+        get_challenge_leaderboard("c1")
+        self.assertEqual(len(self.backend.queries), 2)
+
+    def test_friends_board_uses_points_index(self):
+        with patch("leaderboard.get_user_profile", return_value={"friends": ["u2", "u4", "u7"]}):
+            board = get_friends_leaderboard("u1")
+
+        self.assertEqual([e["user_id"] for e in board["top"]], ["u2", "u1", "u4", "u7"])
+        self.assertEqual([e["value"] for e in board["top"]], [80, 50, 10, 0])
+        self.assertEqual(board["me"]["rank"], 2)
+        self.assertEqual(board["top"][0]["full_name"], "Name u2")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,213 @@
+#############################################################################
+# migrate_ids.py
+#
+# This file contains the one-off migration that trims stray whitespace from
+# stored IDs, so queries can compare key columns with plain equality instead
+# of TRIM().
+#
+# Run it without arguments to see how many rows are affected, then with
+# --apply to fix them:
+#
+#     python migrate_ids.py
+#     python migrate_ids.py --apply
+#
+# New rows are already normalized on write (see ids.normalize_id).
+#############################################################################
+
+import argparse
+
+from bigquery_pool import get_bigquery_client, PROJECT_ID
+from query_cache import clear_cache
+
+
+DATASET = f"{PROJECT_ID}.section_e3"
+
+# Table -> ID columns that are compared or joined on
+ID_COLUMNS = {
+    "Challenges": ["challenge_id"],
+    "UserChallenges": ["user_id", "challenge_id"],
+    "UserPoints": ["user_id"],
+    "Workouts": ["WorkoutId", "UserId"],
+    "SensorData": ["WorkoutID"],
+    "Posts": ["PostId", "AuthorId"],
+    "Users": ["UserId", "auth0_user_id"],
+    "Friends": ["Userid1", "Userid2"],
+}
+
+
+def _dirty_condition(columns):
+    return " OR ".join(f"{column} != TRIM({column})" for column in columns)
+
+
+def count_unnormalized(client, table, columns):
+    """
+    Counts the rows of `table` whose ID columns have surrounding whitespace.
+
+    Args:
+        client: BigQuery client
+        table (str): Table name in the section_e3 dataset
+        columns (list): ID columns to check
+
+    Returns:
+        dict: column -> number of rows that need cleaning
+    """
+    counts = ",\n        ".join(f"COUNTIF({column} != TRIM({column})) AS {column}" for column in columns)
+    query = f"""
+    SELECT
+        {counts}
+    FROM `{DATASET}.{table}`
+    """
+    for row in client.query(query).result():
+        return {column: getattr(row, column) or 0 for column in columns}
+    return {column: 0 for column in columns}
+
+
+def normalize_table(client, table, columns):
+    """
+    Trims the ID columns of every row that needs it.
+
+    Args:
+        client: BigQuery client
+        table (str): Table name in the section_e3 dataset
+        columns (list): ID columns to clean
+
+    Returns:
+        int: Number of rows updated (0 if BigQuery did not report it)
+    """
+    assignments = ", ".join(f"{column} = TRIM({column})" for column in columns)
+    query = f"""
+    UPDATE `{DATASET}.{table}`
+    SET {assignments}
+    WHERE {_dirty_condition(columns)}
+    """
+    job = client.query(query)
+    job.result()
+    return getattr(job, "num_dml_affected_rows", None) or 0
+
+
+def normalize_user_points(client):
+    """
+    Cleans UserPoints, merging rows that only differed by whitespace.
+
+    A user whose points were stored under both "user1" and " user1" ends up
+    with one row holding the sum, so the table stays one row per user.
+
+    Returns:
+        int: Number of rows updated (0 if BigQuery did not report it)
+    """
+    script = f"""
+    BEGIN TRANSACTION;
+
+    CREATE TEMP TABLE merged AS
+    SELECT TRIM(user_id) AS user_id, SUM(total_points) AS total_points
+    FROM `{DATASET}.UserPoints`
+    GROUP BY TRIM(user_id)
+    HAVING COUNTIF({_dirty_condition(["user_id"])}) > 0;
+
+    DELETE FROM `{DATASET}.UserPoints`
+    WHERE TRIM(user_id) IN (SELECT user_id FROM merged);
+
+    INSERT INTO `{DATASET}.UserPoints` (user_id, total_points)
+    SELECT user_id, total_points FROM merged;
+
+    COMMIT TRANSACTION;
+    """
+    job = client.query(script)
+    job.result()
+    return getattr(job, "num_dml_affected_rows", None) or 0
+
+
+def normalize_user_challenges(client):
+    """
+    Cleans UserChallenges, merging memberships that only differed by whitespace.
+
+    A user who joined both "c1" and " c1" ends up with one row per
+    (user_id, challenge_id): progress is summed, the earliest join is kept
+    and the status is the furthest along ('done', then 'expired', then
+    'active').
+
+    Returns:
+        int: Number of rows updated (0 if BigQuery did not report it)
+    """
+    script = f"""
+    BEGIN TRANSACTION;
+
+    CREATE TEMP TABLE merged AS
+    SELECT
+        TRIM(user_id) AS user_id,
+        TRIM(challenge_id) AS challenge_id,
+        SUM(miles_completed) AS miles_completed,
+        SUM(runs_completed) AS runs_completed,
+        MIN(join_timestamp) AS join_timestamp,
+        CASE
+            WHEN COUNTIF(status = 'done') > 0 THEN 'done'
+            WHEN COUNTIF(status = 'expired') > 0 THEN 'expired'
+            ELSE 'active'
+        END AS status
+    FROM `{DATASET}.UserChallenges`
+    GROUP BY TRIM(user_id), TRIM(challenge_id)
+    HAVING COUNTIF({_dirty_condition(["user_id", "challenge_id"])}) > 0;
+
+    DELETE FROM `{DATASET}.UserChallenges` uc
+    WHERE EXISTS (
+        SELECT 1 FROM merged m
+        WHERE m.user_id = TRIM(uc.user_id) AND m.challenge_id = TRIM(uc.challenge_id)
+    );
+
+    INSERT INTO `{DATASET}.UserChallenges`
+        (user_id, challenge_id, miles_completed, runs_completed, join_timestamp, status)
+    SELECT user_id, challenge_id, miles_completed, runs_completed, join_timestamp, status
+    FROM merged;
+
+    COMMIT TRANSACTION;
+    """
+    job = client.query(script)
+    job.result()
+    return getattr(job, "num_dml_affected_rows", None) or 0
+
+
+def migrate_ids(apply=False, tables=None):
+    """
+    Reports (and with apply=True, fixes) unnormalized IDs in every table.
+
+    Args:
+        apply (bool): Update the rows; otherwise only count them
+        tables (list, optional): Table names to process; all of ID_COLUMNS if None
+
+    Returns:
+        dict: table -> {"unnormalized": {column: count}, "updated": rows}
+    """
+    client = get_bigquery_client()
+    report = {}
+
+    for table in tables or ID_COLUMNS:
+        columns = ID_COLUMNS[table]
+        counts = count_unnormalized(client, table, columns)
+        updated = 0
+
+        if apply and any(counts.values()):
+            if table == "UserPoints":
+                updated = normalize_user_points(client)
+            elif table == "UserChallenges":
+                updated = normalize_user_challenges(client)
+            else:
+                updated = normalize_table(client, table, columns)
+
+        report[table] = {"unnormalized": counts, "updated": updated}
+        print(f"{table}: {counts}" + (f", updated {updated} rows" if apply else ""))
+
+    if apply:
+        # Cached results may still hold the old IDs
+        clear_cache()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trim whitespace from stored IDs.")
+    parser.add_argument("--apply", action="store_true", help="Update rows instead of only counting them")
+    parser.add_argument("--table", action="append", choices=sorted(ID_COLUMNS), help="Only this table (repeatable)")
+    args = parser.parse_args()
+
+    migrate_ids(apply=args.apply, tables=args.table)
+    if not args.apply:
+        print("\nDry run only. Re-run with --apply to update the rows.")
@@ -0,0 +1,84 @@
+import unittest
+
+from bigquery_pool import LocalBigQueryBackend, use_local_backend, reset_bigquery_client
+from ids import normalize_id
+from migrate_ids import ID_COLUMNS, migrate_ids
+from query_cache import clear_cache
+
+
+class TestNormalizeId(unittest.TestCase):
+    def test_strips_whitespace(self):
+        self.assertEqual(normalize_id("  user1 \n"), "user1")
+
+    def test_converts_to_string(self):
+        self.assertEqual(normalize_id(42), "42")
+
+    def test_none_stays_none(self):
+        self.assertIsNone(normalize_id(None))
+
+
+class TestMigrateIds(unittest.TestCase):
+    def setUp(self):
+        self.backend = LocalBigQueryBackend()
+        use_local_backend(self.backend)
+        self.addCleanup(use_local_backend, None)
+        self.addCleanup(reset_bigquery_client)
+        clear_cache()
+        self.addCleanup(clear_cache)
+
+    def _updates(self):
+        return [q for q, _ in self.backend.queries if "UPDATE" in q or "TRANSACTION" in q]
+
+    def test_dry_run_only_counts(self):
+        self.backend.add_result("section_e3.Workouts", [{"WorkoutId": 0, "UserId": 3}])
+
+        report = migrate_ids()
+
+        self.assertEqual(set(report), set(ID_COLUMNS))
+        self.assertEqual(report["Workouts"]["unnormalized"], {"WorkoutId": 0, "UserId": 3})
+        self.assertEqual(self._updates(), [])
+        self.assertTrue(all("COUNTIF" in q for q, _ in self.backend.queries))
+
+    def test_apply_updates_only_dirty_tables(self):
+        self.backend.add_result("section_e3.Workouts", [{"WorkoutId": 0, "UserId": 3}])
+
+        migrate_ids(apply=True)
+
+        updates = self._updates()
+        self.assertEqual(len(updates), 1)
+        self.assertIn("SET WorkoutId = TRIM(WorkoutId), UserId = TRIM(UserId)", updates[0])
+        self.assertIn("WHERE WorkoutId != TRIM(WorkoutId) OR UserId != TRIM(UserId)", updates[0])
+
+    def test_user_points_are_merged(self):
+        self.backend.add_result("section_e3.UserPoints", [{"user_id": 2}])
+
+        migrate_ids(apply=True, tables=["UserPoints"])
+
+        script = self._updates()[0]
+        self.assertIn("SUM(total_points)", script)
+        self.assertIn("GROUP BY TRIM(user_id)", script)
+        self.assertIn("COMMIT TRANSACTION", script)
+
+    def test_user_challenges_are_merged(self):
+        self.backend.add_result("section_e3.UserChallenges", [{"user_id": 1, "challenge_id": 1}])
+
+        migrate_ids(apply=True, tables=["UserChallenges"])
+
+        updates = self._updates()
+        self.assertEqual(len(updates), 1)
+        self.assertIn("GROUP BY TRIM(user_id), TRIM(challenge_id)", updates[0])
+        self.assertIn("SUM(miles_completed)", updates[0])
+        self.assertIn("MIN(join_timestamp)", updates[0])
+        self.assertNotIn("SET user_id = TRIM(user_id)", updates[0])
+
+    def test_sensor_data_workout_ids_are_checked(self):
+        self.backend.add_result("section_e3.SensorData", [{"WorkoutID": 4}])
+
+        report = migrate_ids(apply=True, tables=["SensorData"])
+
+        self.assertEqual(report["SensorData"]["unnormalized"], {"WorkoutID": 4})
+        self.assertIn("SET WorkoutID = TRIM(WorkoutID)", self._updates()[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -16,23 +16,33 @@ import uuid
 import random
 from config import config
 import urllib.parse
-from google.cloud import bigquery  , storage 
+from query_cache import cache_stats
+from advice_cache import advice_cache_stats
+from advice_prompt import split_sentences
+from identity import current_user_id, refresh_identity, clear_identity
+from leaderboard import LEADERBOARD_SIZE, get_leaderboard, get_challenge_leaderboard, get_friends_leaderboard
+from points_ledger import WINDOWS, get_window_leaderboard
+from workout_frame import WorkoutFrame, to_datetime
 from data_fetcher import (
     get_user_workouts, 
+    get_user_workouts_page,
+    get_user_workout_frame,
     create_user_post , 
-    get_user_id_from_auth0_id, 
     insert_new_user, 
     upload_image_to_gcs,
     get_all_other_users,
     get_friends,
     add_friend,
     get_genai_advice,
+    stream_genai_advice,
     
     )
 
 
 from challenge_fetcher import (
+    get_challenge_catalog,
     get_user_points,
+    get_single_user_challenges,
     log_user_activity,
     create_challenge,
     join_challenge,
@@ -91,6 +101,10 @@ def display_post(full_name, username, user_image, timestamp, content, post_image
 def display_activity_summary(workouts_list):
     """
     Displays the activity summary and returns summary stats for use elsewhere.
+
+    Args:
+        workouts_list (WorkoutFrame or list): Workouts to total, as a frame
+            from get_user_workout_frame or workout dicts
     """
     
     workout_summary = {
@@ -108,30 +122,31 @@ def display_activity_summary(workouts_list):
     
     recap = {'crafted_message': ""}
 
-    if not workouts_list:
+    if workouts_list is None or len(workouts_list) == 0:
         
         recap['crafted_message'] = 'No Available Data To Display'
         create_component(recap, "Activity_Summary", height=500)
         return workout_summary  # <- Still return something
 
-    for workout in workouts_list:
-        workout_summary["workout_id"] = workout["workout_id"]
-        workout_summary["total_distance"] += workout["distance"]
-        workout_summary["total_steps"] += workout["steps"]
-        workout_summary["total_calories"] += workout["calories_burned"]
-        workout_summary["start_time"] = datetime.strptime(workout["start_timestamp"], "%Y-%m-%d %H:%M:%S")
-        workout_summary["end_time"] = datetime.strptime(workout["end_timestamp"], "%Y-%m-%d %H:%M:%S")
-        workout_summary["start_coordinate"] = workout["start_lat_lng"]
-        workout_summary["end_coordinate"] = workout["end_lat_lng"]
+    # Aggregate with array operations instead of looping over every workout
+    frame = workouts_list if isinstance(workouts_list, WorkoutFrame) else WorkoutFrame.from_workouts(workouts_list)
+    last = frame.latest_index()
 
-        workout_duration = (workout_summary["end_time"] - workout_summary["start_time"]).total_seconds() / 60
-        workout_summary["total_workout_time"] += workout_duration
+    workout_summary["workout_id"] = frame.workout_ids[last]
+    workout_summary["total_distance"] = frame.total_distance()
+    workout_summary["total_steps"] = frame.total_steps()
+    workout_summary["total_calories"] = frame.total_calories()
+    workout_summary["start_time"] = to_datetime(frame.start[last])
+    workout_summary["end_time"] = to_datetime(frame.end[last])
+    workout_summary["start_coordinate"] = frame.start_lat_lng[last]
+    workout_summary["end_coordinate"] = frame.end_lat_lng[last]
+    workout_summary["total_workout_time"] = frame.total_minutes()
 
     recap['crafted_message'] = f"""
         Great job! 🎉 <br><br>
-        Total Workout Distances : {workout_summary['total_distance']} km <br>
+        Total Workout Distances : {round(workout_summary['total_distance'], 2)} km <br>
         Total Workout Steps : {workout_summary['total_steps']} steps <br>
-        Total Calories Burnt : {workout_summary['total_calories']} calories 🏃‍♂️🔥 <br>
+        Total Calories Burnt : {round(workout_summary['total_calories'], 1)} calories 🏃‍♂️🔥 <br>
         Total workout Durations : {round(workout_summary['total_workout_time'], 1)} minutes <br>
         Keep up the momentum! 🚀💪
         """
@@ -202,25 +217,68 @@ def display_recent_workouts(workouts_list):
     create_component({"WORKOUTS_CONTENT": html_for_workouts}, html_file_name, height=400)
 
 
-def display_genai_advice(user_id):
+def display_workout_history(user_id):
     """
-    Displays GenAI-generated advice in a stylized format using Streamlit.
+    Displays the user's workouts one page at a time, newest first.
+
+    Each page is fetched with a keyset cursor, so older pages cost the same
+    as the first one no matter how long the user's history is.
     """
+    # Cursor of every page visited so far; None is the first (newest) page
+    cursors = st.session_state.setdefault("workout_page_cursors", [None])
 
-    # Fetch advice
-    advice = get_genai_advice(user_id)
-    if not advice:
-        st.warning("⚠️ Unable to generate advice at the moment.")
-        return
+    workouts, next_cursor = get_user_workouts_page(user_id, cursor=cursors[-1])
+    display_recent_workouts(workouts)
 
-    # Define headers
-    headers = [
-        "Stay Motivated 💪",
-        "Embrace Challenges 🚀",
-        "Believe in Yourself ⭐",
-        "Keep Moving Forward ➡️"
-    ]
+    newer_col, page_col, older_col = st.columns([1, 2, 1])
+    with newer_col:
+        if len(cursors) > 1 and st.button("← Newer", key="newer_workouts"):
+            cursors.pop()
+            st.rerun()
+    with page_col:
+        st.caption(f"Page {len(cursors)}")
+    with older_col:
+        if next_cursor and st.button("Older →", key="older_workouts"):
+            cursors.append(next_cursor)
+            st.rerun()
 
+
+# Headers of the four GenAI advice cards, in content1-content4 order
+ADVICE_HEADERS = [
+    "Stay Motivated 💪",
+    "Embrace Challenges 🚀",
+    "Believe in Yourself ⭐",
+    "Keep Moving Forward ➡️"
+]
+
+ADVICE_CSS = """
+<style>
+    .motivation-container {
+        margin-top: 25px;
+    }
+    .motivation-header {
+        font-size: 22px;
+        font-weight: 700;
+        color: #222;
+        margin-bottom: 5px;
+    }
+    .motivation-card {
+        background-color: #f9fdf9;
+        border-left: 4px solid #48bb78;
+        padding: 12px 18px;
+        margin-bottom: 30px;
+        border-radius: 6px;
+        box-shadow: 0px 4px 10px rgba(72, 187, 120, 0.15);
+        font-size: 16px;
+        color: #276749;
+        font-weight: 500;
+    }
+</style>
+"""
+
+
+def advice_cards(advice):
+    """Returns the advice card texts (content1–content4), skipping missing ones."""
     # Try to use content1–content4 keys first
     advice_list = [
         advice.get("content1"),
@@ -229,49 +287,69 @@ def display_genai_advice(user_id):
         advice.get("content4")
     ]
 
-    # Fallback: Split a long single string if content1–4 are missing
+    # Fallback: advice stored before the JSON format only has "content"
     if not any(advice_list) and advice.get("content"):
-        parts = advice["content"].split(". ")
-        advice_list = [part.strip() + "." for part in parts[:4]]
+        advice_list = split_sentences(advice["content"])[:4]
+
+    return advice_list
+
+
+def display_genai_advice(user_id, stream=False):
+    """
+    Displays GenAI-generated advice in a stylized format using Streamlit.
+
+    Args:
+        user_id (str): User to show advice for
+        stream (bool): Render each card as its text streams in from the model
+            instead of waiting for the whole reply
+    """
+    if stream:
+        display_streaming_genai_advice(user_id)
+        return
+
+    # Fetch advice
+    advice = get_genai_advice(user_id)
+    if not advice:
+        st.warning("⚠️ Unable to generate advice at the moment.")
+        return
 
     # Clean up: remove any None values
-    advice_list = [a for a in advice_list if a]
+    advice_list = [a for a in advice_cards(advice) if a]
 
     # Add custom CSS styling
-    st.markdown("""
-    <style>
-        .motivation-container {
-            margin-top: 25px;
-        }
-        .motivation-header {
-            font-size: 22px;
-            font-weight: 700;
-            color: #222;
-            margin-bottom: 5px;
-        }
-        .motivation-card {
-            background-color: #f9fdf9;
-            border-left: 4px solid #48bb78;
-            padding: 12px 18px;
-            margin-bottom: 30px;
-            border-radius: 6px;
-            box-shadow: 0px 4px 10px rgba(72, 187, 120, 0.15);
-            font-size: 16px;
-            color: #276749;
-            font-weight: 500;
-        }
-    </style>
-    """, unsafe_allow_html=True)
+    st.markdown(ADVICE_CSS, unsafe_allow_html=True)
 
     # Render advice blocks
     st.markdown('<div class="motivation-container">', unsafe_allow_html=True)
-    for header, text in zip(headers, advice_list):
+    for header, text in zip(ADVICE_HEADERS, advice_list):
         st.markdown(f"""
         <div class="motivation-header">{header}</div>
         <div class="motivation-card">{text}</div>
         """, unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
+
+def display_streaming_genai_advice(user_id):
+    """
+    Displays GenAI advice card by card while the model is still writing it.
+    """
+    st.markdown(ADVICE_CSS, unsafe_allow_html=True)
+
+    # One slot per card, filled in and updated as text arrives
+    placeholders = [st.empty() for _ in ADVICE_HEADERS]
+    received = False
+    for advice in stream_genai_advice(user_id):
+        received = True
+        for placeholder, header, text in zip(placeholders, ADVICE_HEADERS, advice_cards(advice)):
+            if text:
+                placeholder.markdown(f"""
+                <div class="motivation-header">{header}</div>
+                <div class="motivation-card">{text}</div>
+                """, unsafe_allow_html=True)
+
+    if not received:
+        st.warning("⚠️ Unable to generate advice at the moment.")
+
         
     
 
@@ -285,7 +363,7 @@ def display_my_community_page(valuee):
     Args:
         value: A list containing [genaiadvice, friends_posts, user]
             - genaiadvice: Dictionary with GenAI advice information
-            - friends_posts: List of dictionaries with friends' post information
+            - friends_posts: List of dictionaries with friends' post information (may be empty)
             - user: Dictionary with user information
     """
 
@@ -294,7 +372,8 @@ def display_my_community_page(valuee):
     user = valuee[2]
     
     image_url = "https://media.istockphoto.com/id/2153823097/photo/cheerful-athletic-couple-jogging-through-the-park.jpg?s=1024x1024&w=is&k=20&c=UF2qKPawKinDKsVYhPHSDCdmUjAtJ6SJOjAL6kBkb0Y="
-    if not user or not friends_posts:
+    # Friends who have not posted yet (or a slow feed) still get the page
+    if not user or not user.get("friends"):
         data = {
             "message": f"""
             Welcome! 🎉 <br><br>
@@ -307,6 +386,13 @@ def display_my_community_page(valuee):
         create_component(data, html_file_name,1900)
         return
 
+    # Advice is fetched alongside the posts and may be missing if it was slow
+    if not genaiadvice:
+        genaiadvice = {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "content": "Your personalized advice is on its way. Check back in a moment!",
+        }
+
     data = {
     "USERNAME": user["full_name"],
     "GENAIADVICETIMESTAMP": genaiadvice["timestamp"],
@@ -361,6 +447,8 @@ def logout():
         st.session_state["logged_in"] = False
         st.session_state["user_id"] = None
         st.session_state["page"] = "login"
+        st.session_state.pop("workout_page_cursors", None)
+        clear_identity()
 
         # # Use localhost URL to match our callback approach
         return_url = AUTH0_CALLBACK_URL.replace('/callback', '')
@@ -389,6 +477,27 @@ def display_sidebar():
         # Add some featured benefits
         st.sidebar.markdown("### App Features")
         st.sidebar.markdown("Please Login to explore Features 😊")
+    else:
+        display_cache_stats()
+
+
+def display_cache_stats():
+    """Shows the query and advice caches' hit/miss counters in the sidebar."""
+    stats = cache_stats()
+    with st.sidebar.expander("⚙️ Cache stats"):
+        st.caption(
+            f"Hits: {stats['hits']} · Misses: {stats['misses']} · "
+            f"Hit rate: {stats['hit_rate']:.0%}"
+        )
+        st.caption(
+            f"Entries: {stats['size']} · Evictions: {stats['evictions']} · "
+            f"Invalidations: {stats['invalidations']}"
+        )
+        advice_stats = advice_cache_stats()
+        st.caption(
+            f"Advice hits: {advice_stats['hits']} · Misses: {advice_stats['misses']} · "
+            f"LLM time saved: {advice_stats['saved_seconds']:.1f}s"
+        )
 
 
 def handle_new_user(auth0_id, user_id=None):
@@ -443,23 +552,52 @@ def handle_new_user(auth0_id, user_id=None):
 def show_activity_page(user):
     
     
-    # Get workout data
-    workout_data = get_user_workouts(user)
+    # Get the 3 most recent workouts (ordered and limited by BigQuery)
+    workout_data = get_user_workouts(user, limit=3)
     if len(workout_data) > 0:
-        # Limit to 3 most recent workouts
-        recent_workouts = workout_data[:3] if len(workout_data) >= 3 else workout_data
+        recent_workouts = workout_data
         
         # Display recent workouts
         display_recent_workouts(recent_workouts)
         
-        # Display activity summary (total of those workouts)
-        display_activity_summary(recent_workouts)
+        # Display activity summary (total of those workouts), built from the
+        # rows already fetched; only the period charts run a second query
+        display_activity_summary(WorkoutFrame.from_workouts(workout_data))
+        display_period_totals(user)
         display_share_stats(workout_data[0], user)
     else:    
         mock_data = [{'workout_id': 'workout1', 'start_timestamp': '2024-07-29 07:00:00', 'end_timestamp': '2024-07-29 08:00:00', 'start_lat_lng': (37.7749, -122.4194), 'end_lat_lng': (37.8049, -122.421), 'distance': 0, 'steps': 0, 'calories_burned': 0.0}]
         display_share_stats(mock_data[0], user)
 
 
+# Weeks of history charted on the Activity Summary page
+PERIOD_TOTALS_WEEKS = 8
+
+
+def display_period_totals(user_id, weeks=PERIOD_TOTALS_WEEKS):
+    """
+    Charts the user's distance per day and per week over the last `weeks` weeks.
+
+    Args:
+        user_id (str): Owner of the workouts
+        weeks (int): Weeks of history to chart
+    """
+    start = date.today() - timedelta(weeks=weeks)
+    frame = get_user_workout_frame(user_id, start=start)
+    if len(frame) == 0:
+        return
+
+    st.subheader("Distance Over Time")
+    daily_tab, weekly_tab = st.tabs(["Daily", "Weekly"])
+    for tab, totals in [(daily_tab, frame.daily_totals()), (weekly_tab, frame.weekly_totals())]:
+        with tab:
+            st.bar_chart(
+                {"period": [str(period) for period in totals["period"]], "distance": totals["distance"]},
+                x="period",
+                y="distance",
+            )
+
+
 def display_share_post(UserId):
     """Display a share stats section with image upload using Streamlit"""
     
@@ -542,11 +680,8 @@ def display_share_stats(summary, user_id="user1"):
         
         # Create default stat message
         
-        start_time = datetime.strptime(summary['start_timestamp'], '%Y-%m-%d %H:%M:%S')
-        end_time = datetime.strptime(summary['end_timestamp'], '%Y-%m-%d %H:%M:%S')
-
         # Calculate total workout time in minutes
-        total_workout_time = (end_time - start_time).total_seconds() / 60
+        total_workout_time = round(WorkoutFrame.from_workouts([summary]).total_minutes(), 1)
         default_stat = (
             f"I worked out for {total_workout_time} minutes, "
             f"took {summary['steps']} steps, and burned {summary['calories_burned']} calories this week! 🔥💪"
@@ -660,8 +795,8 @@ def display_log_workout_ui():
                 st.rerun()
                 
             if submitted:
-                # Get user ID from session state
-                user_id = get_user_id_from_auth0_id(st.session_state.get("user_id"))
+                # Get user ID from the session's identity context
+                user_id = current_user_id()
                 
                 # Call the log_workout function
                 result = log_workout(
@@ -745,7 +880,7 @@ def display_challenge(challenge):
                 )
                 
                 if st.button("Join Challenge", key=button_key):
-                    user_id = get_user_id_from_auth0_id(st.session_state.get("user_id"))
+                    user_id = current_user_id()
                     msg = join_challenge(user_id, challenge["challenge_id"])
                     
                     # Set a flag so we know this challenge was joined
@@ -782,6 +917,35 @@ def display_challenges(challenges_list):
         display_challenge(challenge)
 
 
+CHALLENGE_TABS = {
+    "active": "Active Challenges",
+    "upcoming": "Upcoming Challenges",
+    "closed": "Past Challenges",
+}
+
+
+def display_challenge_catalog():
+    """
+    Displays the challenges of the selected status.
+
+    All challenges come from one cached catalog query, and only the selected
+    status is rendered, instead of querying and drawing every tab.
+    """
+    catalog = get_challenge_catalog()
+    status = st.radio(
+        "Challenges",
+        list(CHALLENGE_TABS),
+        format_func=lambda value: f"{CHALLENGE_TABS[value]} ({len(catalog.get(value, []))})",
+        horizontal=True,
+        label_visibility="collapsed",
+        key="challenge_tab",
+    )
+
+    st.header(CHALLENGE_TABS[status])
+    st.markdown("----------------")
+    display_challenges(catalog.get(status, []))
+
+
 def display_user_challenges(user_challenges_list):
     """
     Displays a user's active challenges with progress bars.
@@ -953,53 +1117,120 @@ def display_create_challenge_ui():
 
 
 # LEADERBOARD
+def _leaderboard_line(entry, leaderboard_user_id, value_key="points", unit="⭐"):
+    is_current_user = (entry["user_id"] == leaderboard_user_id)
+    name_display = f"**{entry['full_name']}**" if is_current_user else entry["full_name"]
+    username_display = f"`{entry['username']}`"
+    value = entry[value_key]
+    if isinstance(value, float):
+        value = f"{value:.1f}"
+    points_display = f"**{value} {unit}**" if is_current_user else f"{value} {unit}"
+    return f"**#{entry['rank']}** — {name_display} ({username_display}) — {points_display}"
+
+
 def display_leaderboard():
     """
-    Displays a simple overall leaderboard using the UserPoints table,
-    sorted by total points (descending), using clean Streamlit formatting.
+    Displays the overall, friends and per-challenge leaderboards in tabs,
+    using clean Streamlit formatting.
     """
+    leaderboard_user_id = current_user_id()
+    overall_tab, friends_tab, challenges_tab = st.tabs(["🌍 Overall", "👫 Friends", "🏁 My Challenges"])
 
-    try:
-        client = bigquery.Client(project="e3-ai-shoe-starter")
-
-        # Query top 20 users with most points
-        query = """
-        SELECT 
-            up.user_id,
-            u.Name AS full_name,
-            u.Username AS username,
-            up.total_points AS points
-        FROM `e3-ai-shoe-starter.section_e3.UserPoints` up
-        JOIN `e3-ai-shoe-starter.section_e3.Users` u ON up.user_id = u.UserId
-        ORDER BY up.total_points DESC
-        LIMIT 20
-        """
+    with overall_tab:
+        display_overall_leaderboard(leaderboard_user_id)
+    with friends_tab:
+        display_friends_leaderboard(leaderboard_user_id)
+    with challenges_tab:
+        display_challenge_leaderboards(leaderboard_user_id)
 
-        results = client.query(query).result()
 
-        # Render header
-        current_user_id = get_user_id_from_auth0_id(st.session_state.get("user_id", ""))
-        
+def display_overall_leaderboard(leaderboard_user_id):
+    """
+    Displays the overall leaderboard, sorted by points (descending), for all
+    time or for this week or month.
+
+    All-time standings come from the in-process leaderboard, so a view does
+    not run a query. A user outside the top list also sees their own rank and
+    the users just above and below them. Weekly and monthly standings come
+    from the points rollups.
+    """
+
+    try:
+        window = st.radio("Period", ["all"] + list(WINDOWS), horizontal=True, key="leaderboard_window",
+                          format_func=lambda value: WINDOWS.get(value, "All time"))
+        if window != "all":
+            board = get_window_leaderboard(window, user_id=leaderboard_user_id)
+            st.markdown("---")
+            if not board["top"]:
+                st.caption("No points earned in this period yet.")
+            _display_board(board, leaderboard_user_id, "⭐")
+            st.markdown("---")
+            return
+
+        leaderboard = get_leaderboard()
+        top_entries = leaderboard.top(LEADERBOARD_SIZE)
 
         # Display table manually
         st.markdown("---")
-        for i, row in enumerate(results, start=1):
-            is_current_user = (row.user_id == current_user_id)
-            name_display = f"**{row.full_name}**" if is_current_user else row.full_name
-            username_display = f"`{row.username}`"
-            points_display = f"**{row.points} ⭐**" if is_current_user else f"{row.points} ⭐"
+        for entry in top_entries:
+            st.markdown(_leaderboard_line(entry, leaderboard_user_id))
+
+        shown = {entry["user_id"] for entry in top_entries}
+        if leaderboard_user_id and leaderboard_user_id not in shown:
+            neighbors = leaderboard.around(leaderboard_user_id)
+            if neighbors:
+                st.markdown("#### 📍 Your position")
+                for entry in neighbors:
+                    st.markdown(_leaderboard_line(entry, leaderboard_user_id))
+            else:
+                st.caption("Complete a challenge to join the leaderboard!")
+
+        st.markdown("---")
+
+    except Exception as e:
+        st.error(f"Error loading leaderboard: {e}")
 
-            st.markdown(f"**#{i}** — {name_display} ({username_display}) — {points_display}")
 
-            if is_current_user:
-                found_current_user = True
+def _display_board(board, leaderboard_user_id, unit):
+    for entry in board["top"]:
+        st.markdown(_leaderboard_line(entry, leaderboard_user_id, value_key="value", unit=unit))
 
-        
+    me = board["me"]
+    if me and me["rank"] > len(board["top"]):
+        st.markdown("#### 📍 Your position")
+        st.markdown(_leaderboard_line(me, leaderboard_user_id, value_key="value", unit=unit))
 
-        st.markdown("---")
 
+def display_friends_leaderboard(leaderboard_user_id):
+    """Displays the user and their friends ranked by total points."""
+    try:
+        board = get_friends_leaderboard(leaderboard_user_id)
+        if board["participants"] <= 1:
+            st.info("Add friends to compare your points with theirs!")
+            return
+        _display_board(board, leaderboard_user_id, "⭐")
     except Exception as e:
-        st.error(f"Error loading leaderboard: {e}")
+        st.error(f"Error loading friends leaderboard: {e}")
+
+
+def display_challenge_leaderboards(leaderboard_user_id):
+    """Displays the leaderboard of one of the user's challenges, by miles or runs."""
+    try:
+        challenges = get_single_user_challenges(leaderboard_user_id)
+        if not challenges:
+            st.info("Join a challenge to see how you rank against other participants!")
+            return
+
+        titles = {challenge["challenge_id"]: challenge["title"] for challenge in challenges}
+        challenge_id = st.selectbox("Challenge", list(titles), format_func=titles.get,
+                                    key="leaderboard_challenge")
+        metric = st.radio("Rank by", ["miles", "runs"], horizontal=True, key="leaderboard_metric")
+
+        board = get_challenge_leaderboard(challenge_id, metric=metric, user_id=leaderboard_user_id)
+        st.caption(f"{board['participants']} participants")
+        _display_board(board, leaderboard_user_id, "mi" if metric == "miles" else "runs")
+    except Exception as e:
+        st.error(f"Error loading challenge leaderboard: {e}")
 
 # FRIENDS
 def show_friend_section(current_user_id):
@@ -1026,6 +1257,8 @@ def show_friend_section(current_user_id):
                 if st.button(f"➕ Add {user.Name}", key=user.UserId):
                     errors = add_friend(current_user_id, user.UserId)
                     if not errors:
+                        # The friend list is part of the cached profile
+                        refresh_identity()
                         st.success(f"🎉 {user.Name} added as a friend!")
                         st.rerun()
                     else:
@@ -1108,7 +1341,7 @@ def display_single_user_challenges(challenges_list, points):
 
             
 
-            if not challenge['user_status'] == 'done':
+            if challenge['user_status'] == 'active' and challenge['challenge_status'] == 'active':
                 
                 # Show "Log Activity" button
                 if st.button(f"Log Activity", key=f"log_btn_{challenge['challenge_id']}"):
@@ -1122,8 +1355,7 @@ def display_single_user_challenges(challenges_list, points):
                         submitted = st.form_submit_button("Submit Log")
 
                         if submitted:
-                            user_id = st.session_state.get("user_id", challenge["user_id"])
-                            user = get_user_id_from_auth0_id(user_id)
+                            user_id = current_user_id() or challenge["user_id"]
                             
                             message = log_user_activity(user_id, challenge["challenge_id"], miles_input, runs_input)
                             st.success(message)
@@ -9,6 +9,7 @@
 import unittest
 from unittest.mock import patch, MagicMock
 import modules
+from workout_frame import WorkoutFrame
 from modules import (
     display_my_custom_component,
     display_post,
@@ -110,6 +111,33 @@ class TestDisplayActivitySummary(unittest.TestCase):
         self.assertEqual(summary['total_calories'], 300)
         self.assertAlmostEqual(summary['total_workout_time'], 75.0)
 
+    @patch('modules.create_component')
+    def test_latest_workout_is_newest_first_frame_head(self, mock_create_component):
+        # Frames from get_user_workout_frame are newest first
+        frame = WorkoutFrame.from_workouts(list(reversed(self.mock_data)))
+        summary = display_activity_summary(frame)
+        self.assertEqual(summary['workout_id'], 'w2')
+        self.assertEqual(summary['start_coordinate'], (2.0, 2.0))
+
+        # Order does not matter for plain lists either
+        self.assertEqual(display_activity_summary(self.mock_data)['workout_id'], 'w2')
+
+    @patch('modules.st')
+    @patch('modules.display_share_stats')
+    @patch('modules.display_recent_workouts')
+    @patch('modules.create_component')
+    @patch('modules.get_user_workout_frame', return_value=WorkoutFrame.from_workouts([]))
+    @patch('modules.get_user_workouts')
+    def test_activity_page_reuses_fetched_workouts(self, mock_workouts, mock_frame, mock_create_component,
+                                                   mock_recent, mock_share, mock_st):
+        mock_workouts.return_value = self.mock_data
+        modules.show_activity_page('user1')
+        mock_workouts.assert_called_once_with('user1', limit=3)
+        # Only the date-bounded period charts query again
+        mock_frame.assert_called_once()
+        self.assertIn('start', mock_frame.call_args[1])
+        self.assertIn('Total Workout Distances : 6.0 km', mock_create_component.call_args[0][0]['crafted_message'])
+
     @patch('modules.create_component')
     def test_empty(self, mock_create_component):
         summary = display_activity_summary([])
@@ -168,6 +196,32 @@ class TestDisplayGenAiAdvice(unittest.TestCase):
         # Verify markdown was called multiple times
         self.assertGreaterEqual(mock_markdown.call_count, 5)
     
+    @patch('streamlit.empty')
+    @patch('streamlit.markdown')
+    @patch('modules.stream_genai_advice')
+    def test_streaming_updates_cards_as_text_arrives(self, mock_stream, mock_markdown, mock_empty):
+        mock_stream.return_value = iter([
+            {"content1": "Keep", "content2": None, "content3": None, "content4": None},
+            {"content1": "Keep going.", "content2": "Add a hill.", "content3": None, "content4": None},
+        ])
+        placeholders = [MagicMock() for _ in range(4)]
+        mock_empty.side_effect = placeholders
+
+        display_genai_advice("user123", stream=True)
+
+        self.assertEqual(placeholders[0].markdown.call_count, 2)
+        self.assertIn("Keep going.", placeholders[0].markdown.call_args[0][0])
+        self.assertEqual(placeholders[1].markdown.call_count, 1)
+        placeholders[2].markdown.assert_not_called()
+
+    @patch('streamlit.warning')
+    @patch('streamlit.empty')
+    @patch('streamlit.markdown')
+    @patch('modules.stream_genai_advice', return_value=iter([]))
+    def test_streaming_failure_warns(self, mock_stream, mock_markdown, mock_empty, mock_warning):
+        display_genai_advice("user123", stream=True)
+        mock_warning.assert_called_once()
+
     @patch('streamlit.warning')
     @patch('modules.get_genai_advice')
     def test_no_advice_available(self, mock_get_genai_advice, mock_warning):
@@ -230,5 +284,20 @@ class TestLoadGlobalCSS(unittest.TestCase):
         self.assertTrue(kwargs.get('unsafe_allow_html', False))
 
 
+
+class TestLogout(unittest.TestCase):
+    """Tests for logout clearing the per-user session state."""
+
+    @patch('modules.clear_identity')
+    @patch('modules.st')
+    def test_logout_clears_workout_pages(self, mock_st, mock_clear_identity):
+        mock_st.sidebar.button.return_value = True
+        mock_st.session_state = {"logged_in": True, "user_id": "user1", "workout_page_cursors": [None, "c1"]}
+        modules.logout()
+        self.assertNotIn("workout_page_cursors", mock_st.session_state)
+        self.assertFalse(mock_st.session_state["logged_in"])
+        mock_clear_identity.assert_called_once()
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,233 @@
+#############################################################################
+# points_ledger.py
+#
+# This file contains the points ledger rollups and the time-windowed
+# leaderboards built on them.
+#
+# log_user_activity used to MERGE each award into the user's single
+# UserPoints row, so awards for the same user contended on that row and
+# only all-time totals existed. Awards are now appended to PointsLedger,
+# one timestamped row each, and nothing is ever updated in place.
+#
+# refresh_rollups() (python points_ledger.py, run every five minutes by the
+# points-rollup Cloud Run job that .github/workflows/cloud-run.yml deploys)
+# recomputes the recent days of PointsDaily and weeks of PointsWeekly from
+# the ledger, then adds the awards made since its last run to UserPoints
+# and moves the watermark in PointsRollupState past them. The rollups only
+# hold awards from before the watermark. Every board is its rollup plus the
+# ledger awards after the watermark: the weekly and monthly boards add them
+# to PointsWeekly and PointsDaily (a month is at most 31 daily rows per
+# user), all-time totals to UserPoints (leaderboard.points_totals_sql). The
+# boards are therefore right even while the job is behind, and no
+# leaderboard scans the whole ledger.
+#
+# The first refresh carries the existing UserPoints totals over into the
+# ledger as one opening-balance award per user, in the same transaction
+# that sets the first watermark, so the ledger holds every point before
+# anything is rebuilt from it.
+#############################################################################
+
+import argparse
+
+from google.cloud import bigquery
+
+from bigquery_pool import get_bigquery_client
+from leaderboard import LEADERBOARD_SIZE, BOARD_TTL, LEDGER_START, build_board
+from query_cache import cached_query, cached_value, invalidate
+
+
+LEDGER_TABLE = "e3-ai-shoe-starter.section_e3.PointsLedger"
+DAILY_TABLE = "e3-ai-shoe-starter.section_e3.PointsDaily"
+WEEKLY_TABLE = "e3-ai-shoe-starter.section_e3.PointsWeekly"
+TOTALS_TABLE = "e3-ai-shoe-starter.section_e3.UserPoints"
+STATE_TABLE = "e3-ai-shoe-starter.section_e3.PointsRollupState"
+
+# Days of rollups recomputed on each refresh; late or retried awards older
+# than this are picked up by a --full refresh
+ROLLUP_DAYS = 2
+
+# awarded_at of opening-balance awards carried over from UserPoints
+OPENING_BALANCE_DATE = "2000-01-03"
+
+# Seconds the watermark stays behind now, so an award whose transaction
+# commits a little after its awarded_at is not skipped
+ROLLUP_LAG = 300
+
+# Windows shown on the Leaderboard page
+WINDOWS = {"week": "This week", "month": "This month"}
+
+
+def _backfill_sql():
+    # Opening balances are the UserPoints totals from before the first
+    # refresh, which hold none of the ledger's awards
+    return f"""
+    INSERT INTO `{LEDGER_TABLE}` (award_id, user_id, challenge_id, points, awarded_at)
+    SELECT GENERATE_UUID(), user_id, NULL, total_points, TIMESTAMP '{OPENING_BALANCE_DATE}'
+    FROM `{TOTALS_TABLE}`
+    WHERE total_points != 0
+        AND user_id NOT IN (
+            SELECT user_id FROM `{LEDGER_TABLE}`
+            WHERE awarded_at < TIMESTAMP '{LEDGER_START}'
+        );
+
+    INSERT INTO `{STATE_TABLE}` (rolled_up_to) VALUES (TIMESTAMP '{LEDGER_START}');
+    """
+
+
+def refresh_rollups(days=ROLLUP_DAYS, full=False):
+    """
+    Recomputes the daily and weekly rollups and brings UserPoints up to date.
+
+    Only the last `days` days (and the weeks they fall in) are rebuilt, so a
+    refresh reads just those ledger partitions, and UserPoints only gets the
+    awards made since the previous refresh. Everything is replaced in one
+    transaction, so readers never see half-built rollups or an award counted
+    twice.
+
+    Args:
+        days (int): Days of rollups to rebuild
+        full (bool): Rebuild every rollup and UserPoints from the whole ledger
+
+    Returns:
+        bool: True if the refresh succeeded
+    """
+    client = get_bigquery_client()
+
+    script = f"""
+    DECLARE start_day DATE DEFAULT IF(@full, DATE '{OPENING_BALANCE_DATE}',
+                                      DATE_SUB(CURRENT_DATE(), INTERVAL @days DAY));
+    DECLARE start_week DATE DEFAULT DATE_TRUNC(start_day, WEEK(MONDAY));
+    DECLARE previous_watermark TIMESTAMP;
+    DECLARE watermark TIMESTAMP DEFAULT TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL @lag SECOND);
+
+    BEGIN TRANSACTION;
+
+    SET previous_watermark = (SELECT MAX(rolled_up_to) FROM `{STATE_TABLE}`);
+    IF previous_watermark IS NULL THEN
+        -- First refresh: carry the existing totals over into the ledger
+        {_backfill_sql()}
+        SET previous_watermark = TIMESTAMP '{LEDGER_START}';
+    END IF;
+
+    DELETE FROM `{DAILY_TABLE}` WHERE day >= start_day;
+    INSERT INTO `{DAILY_TABLE}` (day, user_id, points)
+    SELECT DATE(awarded_at), user_id, SUM(points)
+    FROM `{LEDGER_TABLE}`
+    WHERE awarded_at >= TIMESTAMP(start_day) AND awarded_at < watermark
+    GROUP BY 1, 2;
+
+    DELETE FROM `{WEEKLY_TABLE}` WHERE week >= start_week;
+    INSERT INTO `{WEEKLY_TABLE}` (week, user_id, points)
+    SELECT DATE_TRUNC(DATE(awarded_at), WEEK(MONDAY)), user_id, SUM(points)
+    FROM `{LEDGER_TABLE}`
+    WHERE awarded_at >= TIMESTAMP(start_week) AND awarded_at < watermark
+    GROUP BY 1, 2;
+
+    IF @full THEN
+        DELETE FROM `{TOTALS_TABLE}` WHERE TRUE;
+        INSERT INTO `{TOTALS_TABLE}` (user_id, total_points)
+        SELECT user_id, SUM(points)
+        FROM `{LEDGER_TABLE}`
+        WHERE awarded_at < watermark
+        GROUP BY user_id;
+    ELSE
+        MERGE `{TOTALS_TABLE}` t
+        USING (
+            SELECT user_id, SUM(points) AS points
+            FROM `{LEDGER_TABLE}`
+            WHERE awarded_at >= previous_watermark AND awarded_at < watermark
+            GROUP BY user_id
+        ) s
+        ON t.user_id = s.user_id
+        WHEN MATCHED THEN UPDATE SET total_points = t.total_points + s.points
+        WHEN NOT MATCHED THEN INSERT (user_id, total_points) VALUES (s.user_id, s.points);
+    END IF;
+
+    DELETE FROM `{STATE_TABLE}` WHERE TRUE;
+    INSERT INTO `{STATE_TABLE}` (rolled_up_to) VALUES (watermark);
+
+    COMMIT TRANSACTION;
+    """
+
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("days", "INT64", days),
+            bigquery.ScalarQueryParameter("full", "BOOL", full),
+            bigquery.ScalarQueryParameter("lag", "INT64", ROLLUP_LAG),
+        ]
+    )
+
+    try:
+        client.query(script, job_config=job_config).result()
+        invalidate("points_window")
+        return True
+    except Exception as e:
+        print(f"Error refreshing points rollups: {e}")
+        return False
+
+
+def _window_standings(window):
+    client = get_bigquery_client()
+
+    if window == "week":
+        start = "DATE_TRUNC(CURRENT_DATE(), WEEK(MONDAY))"
+        rollup = f"SELECT user_id, points FROM `{WEEKLY_TABLE}` WHERE week = {start}"
+    elif window == "month":
+        start = "DATE_TRUNC(CURRENT_DATE(), MONTH)"
+        rollup = f"SELECT user_id, points FROM `{DAILY_TABLE}` WHERE day >= {start}"
+    else:
+        raise ValueError(f"Unknown window: {window}")
+
+    # The rollups stop at the watermark; the awards after it come from the ledger
+    query = f"""
+    SELECT s.user_id, SUM(s.points) AS points, ANY_VALUE(u.Name) AS full_name, ANY_VALUE(u.Username) AS username
+    FROM (
+        {rollup}
+        UNION ALL
+        SELECT user_id, points
+        FROM `{LEDGER_TABLE}`
+        WHERE awarded_at >= TIMESTAMP({start})
+            AND awarded_at >= (
+                SELECT IFNULL(MAX(rolled_up_to), TIMESTAMP '{LEDGER_START}')
+                FROM `{STATE_TABLE}`
+            )
+    ) s
+    LEFT JOIN `e3-ai-shoe-starter.section_e3.Users` u ON s.user_id = u.UserId
+    GROUP BY s.user_id
+    """
+
+    return cached_query(client, query, tags=["points_window"], ttl=BOARD_TTL)
+
+
+def get_window_leaderboard(window="week", k=LEADERBOARD_SIZE, user_id=None):
+    """
+    Ranks users by the points they earned this week or this month.
+
+    Args:
+        window (str): "week" or "month"
+        k (int): Entries in the top list
+        user_id (str, optional): User whose own rank is returned as "me"
+
+    Returns:
+        dict: Same shape as get_challenge_leaderboard, "value" being points
+    """
+    def compute():
+        entries = [{
+            "user_id": row.user_id,
+            "full_name": row.full_name or row.user_id,
+            "username": row.username or row.user_id,
+            "value": row.points or 0,
+        } for row in _window_standings(window)]
+        return build_board(entries, k, user_id)
+
+    return cached_value(("points_window", window, k, user_id), compute, tags=["points_window"], ttl=BOARD_TTL)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the points rollups from the ledger.")
+    parser.add_argument("--days", type=int, default=ROLLUP_DAYS, help="Days of rollups to rebuild")
+    parser.add_argument("--full", action="store_true", help="Rebuild every rollup and UserPoints from the whole ledger")
+    args = parser.parse_args()
+
+    ok = refresh_rollups(days=args.days, full=args.full)
+    print("Rollups refreshed." if ok else "Refresh failed.")
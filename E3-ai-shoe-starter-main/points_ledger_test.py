@@ -0,0 +1,90 @@
+import unittest
+
+from bigquery_pool import LocalBigQueryBackend, use_local_backend, reset_bigquery_client
+from points_ledger import get_window_leaderboard, refresh_rollups
+from query_cache import clear_cache
+
+
+class TestPointsLedger(unittest.TestCase):
+    def setUp(self):
+        self.backend = LocalBigQueryBackend()
+        self.backend.add_result("section_e3.PointsWeekly` WHERE week", [
+            {"user_id": "u1", "points": 30, "full_name": "Ann", "username": "ann"},
+            {"user_id": "u2", "points": 70, "full_name": "Bo", "username": "bo"},
+        ])
+        self.backend.add_result("section_e3.PointsDaily` WHERE day", [
+            {"user_id": "u1", "points": 130, "full_name": "Ann", "username": "ann"},
+            {"user_id": "u2", "points": 90, "full_name": "Bo", "username": "bo"},
+            {"user_id": "u3", "points": 10, "full_name": None, "username": None},
+        ])
+        use_local_backend(self.backend)
+        self.addCleanup(use_local_backend, None)
+        self.addCleanup(reset_bigquery_client)
+        clear_cache()
+        self.addCleanup(clear_cache)
+
+    def test_refresh_rebuilds_recent_rollups_in_one_transaction(self):
+        self.assertTrue(refresh_rollups(days=3))
+
+        self.assertEqual(len(self.backend.queries), 1)
+        script, params = self.backend.queries[0]
+        self.assertEqual(params, {"days": 3, "full": False, "lag": 300})
+        self.assertIn("BEGIN TRANSACTION", script)
+        self.assertIn("DELETE FROM `e3-ai-shoe-starter.section_e3.PointsDaily` WHERE day >= start_day", script)
+        self.assertIn("WEEK(MONDAY)", script)
+        # Only awards since the last watermark are added to the totals;
+        # UserPoints is only replaced by an explicit full rebuild
+        self.assertIn("WHERE awarded_at >= previous_watermark AND awarded_at < watermark", script)
+        self.assertIn("WHEN MATCHED THEN UPDATE SET total_points = t.total_points + s.points", script)
+        self.assertLess(script.index("IF @full THEN"),
+                        script.index("DELETE FROM `e3-ai-shoe-starter.section_e3.UserPoints`"))
+
+    def test_first_refresh_carries_totals_into_ledger(self):
+        refresh_rollups()
+
+        script, _ = self.backend.queries[0]
+        backfill = script.index("IF previous_watermark IS NULL THEN")
+        # Opening balances and the first watermark come before any rebuild
+        self.assertLess(backfill, script.index("SELECT GENERATE_UUID(), user_id, NULL, total_points"))
+        self.assertLess(script.index("INSERT INTO `e3-ai-shoe-starter.section_e3.PointsRollupState`"),
+                        script.index("DELETE FROM `e3-ai-shoe-starter.section_e3.PointsDaily`"))
+
+    def test_weekly_and_monthly_boards_read_rollups(self):
+        week = get_window_leaderboard("week", user_id="u1")
+        month = get_window_leaderboard("month", user_id="u1")
+
+        self.assertEqual([e["user_id"] for e in week["top"]], ["u2", "u1"])
+        self.assertEqual(week["me"]["rank"], 2)
+        self.assertEqual([e["value"] for e in month["top"]], [130, 90, 10])
+        self.assertEqual(month["top"][2]["full_name"], "u3")
+
+    def test_boards_add_ledger_awards_after_watermark(self):
+        get_window_leaderboard("week")
+
+        query, _ = self.backend.queries[0]
+        self.assertIn("UNION ALL", query)
+        self.assertIn("FROM `e3-ai-shoe-starter.section_e3.PointsLedger`", query)
+        self.assertIn("awarded_at >= TIMESTAMP(DATE_TRUNC(CURRENT_DATE(), WEEK(MONDAY)))", query)
+        self.assertIn("FROM `e3-ai-shoe-starter.section_e3.PointsRollupState`", query)
+
+        # The rollups stop at the watermark, so no award is counted twice
+        refresh_rollups()
+        script, _ = self.backend.queries[-1]
+        self.assertEqual(script.count("AND awarded_at < watermark"), 3)
+
+    def test_boards_are_cached_until_refresh(self):
+        get_window_leaderboard("week")
+        get_window_leaderboard("week")
+        self.assertEqual(len(self.backend.queries), 1)
+
+        refresh_rollups()
+        get_window_leaderboard("week")
+        self.assertEqual(len(self.backend.queries), 3)
+
+    def test_unknown_window(self):
+        with self.assertRaises(ValueError):
+            get_window_leaderboard("year")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,222 @@
+#############################################################################
+# precompute_advice.py
+#
+# This file contains the batch job that generates GenAI advice ahead of time.
+#
+# Run daily (python precompute_advice.py). For every user who worked out
+# recently it calls get_genai_advice, which stores the advice in the shared
+# AdviceCache table under the user's workout-history fingerprint. The Home
+# and GenAI Advice pages on every instance then find it there instead of
+# waiting on Gemini. Each run also deletes the expired entries.
+#
+# The job runs a bounded number of users at once, stops starting new users
+# once the token budget is spent, and records finished users in a checkpoint
+# file so an interrupted run picks up where it left off.
+#############################################################################
+
+import argparse
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from google.cloud import bigquery
+
+from advice_cache import fingerprint, get_advice_cache
+from advice_prompt import build_advice_prompt, summarize_workouts
+from bigquery_pool import get_bigquery_client
+from data_fetcher import ADVICE_WORKOUT_LIMIT, get_genai_advice, get_user_workouts
+
+
+# Users with a workout in this many days count as active
+ACTIVE_DAYS = 7
+
+# Users processed at the same time (Gemini calls are also capped by llm_limiter)
+PRECOMPUTE_CONCURRENCY = 4
+
+# Estimated tokens a run may spend before it stops starting new users
+TOKEN_BUDGET = 500000
+
+# Rough size of one advice reply, and characters per token, for estimates
+RESPONSE_TOKENS = 300
+CHARS_PER_TOKEN = 4
+
+CHECKPOINT_PATH = os.getenv("ADVICE_CHECKPOINT_PATH", ".advice_checkpoint.json")
+
+
+def get_active_user_ids(days=ACTIVE_DAYS):
+    """
+    Returns the UserIds that logged a workout in the last `days` days.
+
+    Args:
+        days (int): Size of the activity window
+
+    Returns:
+        list: UserIds, most recently active first
+    """
+    client = get_bigquery_client()
+
+    query = """
+    SELECT UserId AS user_id, MAX(StartTimestamp) AS last_workout
+    FROM `e3-ai-shoe-starter.section_e3.Workouts`
+    WHERE StartTimestamp >= DATETIME_SUB(CURRENT_DATETIME(), INTERVAL @days DAY)
+    GROUP BY UserId
+    ORDER BY last_workout DESC
+    """
+
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("days", "INT64", days),
+        ]
+    )
+
+    results = client.query(query, job_config=job_config).result()
+    return [row.user_id for row in results]
+
+
+def estimate_tokens(prompt):
+    """Estimates the tokens one advice generation costs for `prompt`."""
+    return len(prompt) // CHARS_PER_TOKEN + RESPONSE_TOKENS
+
+
+class Checkpoint:
+    """
+    Users already handled in today's run, saved to a JSON file.
+
+    Args:
+        path (str, optional): Checkpoint file; None keeps it in memory
+        run_date (date, optional): Run the checkpoint belongs to; a file from
+            another day is ignored so every day starts fresh
+    """
+
+    def __init__(self, path=CHECKPOINT_PATH, run_date=None):
+        self.path = path
+        self.run_date = (run_date or date.today()).isoformat()
+        self._lock = threading.Lock()
+        self.done = self._load()
+
+    def __contains__(self, user_id):
+        return user_id in self.done
+
+    def mark_done(self, user_id):
+        """Records `user_id` as finished and saves the file."""
+        with self._lock:
+            self.done.add(user_id)
+            self._save()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return set()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("run_date") != self.run_date:
+                return set()
+            return set(data.get("done", []))
+        except Exception as e:
+            print(f"Error loading checkpoint: {e}")
+            return set()
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"run_date": self.run_date, "done": sorted(self.done)}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Error saving checkpoint: {e}")
+
+
+def precompute_advice(user_ids=None, concurrency=PRECOMPUTE_CONCURRENCY,
+                      token_budget=TOKEN_BUDGET, checkpoint=None):
+    """
+    Generates advice for each user whose cached advice is missing or stale.
+
+    Args:
+        user_ids (list, optional): Users to process; active users if None
+        concurrency (int): Users processed at the same time
+        token_budget (int): Estimated tokens the run may spend
+        checkpoint (Checkpoint, optional): Progress file; a new one for today if None
+
+    Returns:
+        dict: Counts of users generated, already fresh, skipped from the
+            checkpoint, skipped for budget and failed, plus tokens used
+    """
+    if user_ids is None:
+        user_ids = get_active_user_ids()
+    if checkpoint is None:
+        checkpoint = Checkpoint()
+
+    advice_cache = get_advice_cache()
+    lock = threading.Lock()
+    stats = {
+        "users": len(user_ids),
+        "generated": 0,
+        "fresh": 0,
+        "checkpointed": 0,
+        "over_budget": 0,
+        "failed": 0,
+        "tokens_used": 0,
+    }
+
+    def process(user_id):
+        if user_id in checkpoint:
+            with lock:
+                stats["checkpointed"] += 1
+            return
+
+        workouts = get_user_workouts(user_id, limit=ADVICE_WORKOUT_LIMIT)
+        if advice_cache.peek(fingerprint(user_id, workouts)) is not None:
+            with lock:
+                stats["fresh"] += 1
+            checkpoint.mark_done(user_id)
+            return
+
+        # Reserve the estimated cost up front so parallel users cannot overspend
+        cost = estimate_tokens(build_advice_prompt(summarize_workouts(workouts)))
+        with lock:
+            if stats["tokens_used"] + cost > token_budget:
+                stats["over_budget"] += 1
+                return
+            stats["tokens_used"] += cost
+
+        if get_genai_advice(user_id) is None:
+            with lock:
+                stats["failed"] += 1
+            return
+
+        with lock:
+            stats["generated"] += 1
+        checkpoint.mark_done(user_id)
+
+    def safe_process(user_id):
+        try:
+            process(user_id)
+        except Exception as e:
+            print(f"Error precomputing advice for {user_id}: {e}")
+            with lock:
+                stats["failed"] += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="advice") as executor:
+        list(executor.map(safe_process, user_ids))
+
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute GenAI advice for active users.")
+    parser.add_argument("--days", type=int, default=ACTIVE_DAYS, help="Activity window in days")
+    parser.add_argument("--concurrency", type=int, default=PRECOMPUTE_CONCURRENCY)
+    parser.add_argument("--token-budget", type=int, default=TOKEN_BUDGET)
+    args = parser.parse_args()
+
+    print("Finding active users...")
+    active_users = get_active_user_ids(args.days)
+    print(f"{len(active_users)} active users.")
+
+    result = precompute_advice(active_users, concurrency=args.concurrency, token_budget=args.token_budget)
+    get_advice_cache().purge_expired()
+    print(f"Done: {result}")
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+from advice_cache import AdviceCache
+from bigquery_pool import LocalBigQueryBackend, use_local_backend, reset_bigquery_client
+from gemini_model import LocalGenerativeModel, use_local_model
+from precompute_advice import Checkpoint, get_active_user_ids, precompute_advice
+from query_cache import clear_cache
+
+
+def _workouts(params):
+    start = datetime(2024, 3, 1, 8, 0)
+    return [{
+        "WorkoutId": f"{params['user_id']}-w1",
+        "StartTimestamp": start,
+        "EndTimestamp": start + timedelta(minutes=30),
+        "StartLocationLat": 1.0,
+        "StartLocationLong": 1.0,
+        "EndLocationLat": 1.1,
+        "EndLocationLong": 1.1,
+        "TotalDistance": 5.0,
+        "TotalSteps": 6000,
+        "CaloriesBurned": 300,
+    }]
+
+
+class TestPrecomputeAdvice(unittest.TestCase):
+    def setUp(self):
+        # Local data backend and stub LLM, no BigQuery or Gemini needed
+        self.backend = LocalBigQueryBackend()
+        self.backend.add_result("FROM `e3-ai-shoe-starter.section_e3.Workouts`", _workouts)
+        self.backend.add_result("GROUP BY UserId", [{"user_id": "user1"}, {"user_id": "user2"}])
+        use_local_backend(self.backend)
+        self.addCleanup(use_local_backend, None)
+        self.addCleanup(reset_bigquery_client)
+        clear_cache()
+        self.addCleanup(clear_cache)
+
+        self.model = LocalGenerativeModel('{"content1": "Keep going."}')
+        use_local_model(self.model)
+        self.addCleanup(use_local_model, None)
+
+        self.cache = AdviceCache()
+        patcher = patch("precompute_advice.get_advice_cache", return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("data_fetcher.get_advice_cache", return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_active_users(self):
+        self.assertEqual(get_active_user_ids(days=3), ["user1", "user2"])
+        _, params = self.backend.queries[-1]
+        self.assertEqual(params, {"days": 3})
+
+    def test_generates_then_skips_fresh_advice(self):
+        stats = precompute_advice(["user1", "user2"], checkpoint=Checkpoint(path=None))
+        self.assertEqual(stats["generated"], 2)
+        self.assertEqual(len(self.model.prompts), 2)
+        self.assertGreater(stats["tokens_used"], 0)
+
+        stats = precompute_advice(["user1", "user2"], checkpoint=Checkpoint(path=None))
+        self.assertEqual(stats["fresh"], 2)
+        self.assertEqual(len(self.model.prompts), 2)
+
+    def test_token_budget_stops_new_users(self):
+        stats = precompute_advice(["user1", "user2", "user3"], concurrency=1, token_budget=700,
+                                  checkpoint=Checkpoint(path=None))
+        self.assertEqual(stats["generated"], 1)
+        self.assertEqual(stats["over_budget"], 2)
+        self.assertLessEqual(stats["tokens_used"], 700)
+
+    def test_checkpoint_resumes_run(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "checkpoint.json")
+            Checkpoint(path=path).mark_done("user1")
+
+            stats = precompute_advice(["user1", "user2"], checkpoint=Checkpoint(path=path))
+
+            self.assertEqual(stats["checkpointed"], 1)
+            self.assertEqual(stats["generated"], 1)
+            self.assertEqual(Checkpoint(path=path).done, {"user1", "user2"})
+            # A checkpoint from another day is ignored
+            self.assertEqual(Checkpoint(path=path, run_date=date(2000, 1, 1)).done, set())
+
+    def test_failed_generation_is_counted(self):
+        with patch("precompute_advice.get_genai_advice", return_value=None):
+            stats = precompute_advice(["user1"], checkpoint=Checkpoint(path=None))
+        self.assertEqual(stats["failed"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
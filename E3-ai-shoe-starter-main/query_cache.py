@@ -0,0 +1,220 @@
+#############################################################################
+# query_cache.py
+#
+# This file contains the in-process cache that sits in front of BigQuery.
+#
+# Every Streamlit interaction reruns the whole script, so without a cache the
+# same challenges, profiles and friend lists are re-queried on every click.
+# Results are keyed by SQL text + parameters, expire after a TTL, are bounded
+# by an LRU size limit and can be dropped early by tag when data is written.
+#
+# Each tag has a generation that invalidate() bumps. A miss records the
+# generations of its tags before querying and its result is only stored if
+# they are unchanged, so rows read before a write finished are not cached
+# past it.
+#############################################################################
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+DEFAULT_TTL = 300       # seconds
+MAX_ENTRIES = 1024
+
+
+class QueryCache:
+    """
+    Thread-safe TTL + LRU cache with tag-based invalidation.
+
+    Args:
+        max_entries (int): Entries kept before the least recently used is evicted
+        default_ttl (float): Seconds an entry stays valid when no ttl is given
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, default_ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()   # key -> (expires_at, value, tags)
+        self._keys_by_tag = {}          # tag -> set of keys
+        self._generations = {}          # tag -> times invalidated
+        self._epoch = 0                 # times cleared
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale = 0
+
+    def get(self, key):
+        """Returns (True, value) on a hit and (False, None) on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def generation(self, tags):
+        """Returns a token that changes whenever any of `tags` is invalidated."""
+        with self._lock:
+            return self._generation(tuple(tags))
+
+    def set(self, key, value, tags=(), ttl=None, generation=None):
+        """
+        Stores `value` under `key`, tagged so it can be invalidated later.
+
+        Args:
+            key: Cache key
+            value: Value to store
+            tags (iterable): Tags to invalidate this entry by
+            ttl (float, optional): Seconds to keep it, default_ttl if None
+            generation (optional): generation(tags) taken before `value` was
+                read; if a tag has been invalidated since, nothing is stored
+
+        Returns:
+            bool: True if the value was stored
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        tags = tuple(tags)
+        with self._lock:
+            if generation is not None and generation != self._generation(tags):
+                self.stale += 1
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, *tags):
+        """Drops every entry carrying any of the given tags."""
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+                for key in list(self._keys_by_tag.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        """Empties the cache and resets its counters."""
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self._epoch += 1
+            self.hits = self.misses = self.evictions = self.invalidations = self.stale = 0
+
+    def stats(self):
+        """Returns the hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale": self.stale,
+            }
+
+    def _generation(self, tags):
+        return (self._epoch,) + tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+# One cache per server process, shared by every Streamlit session
+_cache = QueryCache()
+
+
+def make_key(query, job_config=None):
+    """Builds a cache key from the SQL text and its query parameters."""
+    params = getattr(job_config, "query_parameters", None) or []
+    params_repr = json.dumps([param.to_api_repr() for param in params], sort_keys=True, default=str)
+    return (" ".join(query.split()), params_repr)
+
+
+def cached_query(client, query, job_config=None, tags=(), ttl=None):
+    """
+    Runs a query through the shared cache and returns its rows as a list.
+
+    Args:
+        client: BigQuery client (or stand-in backend) used on a miss
+        query (str): SQL text
+        job_config (bigquery.QueryJobConfig, optional): Carries the parameters
+        tags (iterable): Tags to invalidate this result by, e.g. "posts:user1"
+        ttl (float, optional): Seconds to keep the result, DEFAULT_TTL if None
+
+    Returns:
+        list: The result rows. Errors are raised, never cached.
+    """
+    key = make_key(query, job_config)
+    found, rows = _cache.get(key)
+    if found:
+        return list(rows)
+
+    tags = tuple(tags)
+    generation = _cache.generation(tags)
+    rows = list(client.query(query, job_config=job_config).result())
+    _cache.set(key, rows, tags=tags, ttl=ttl, generation=generation)
+    return list(rows)
+
+
+def cached_value(key, compute, tags=(), ttl=None):
+    """
+    Returns compute() through the shared cache, for results derived from queries.
+
+    Args:
+        key (tuple): Identifies the result, e.g. ("challenge_board", challenge_id)
+        compute (callable): Builds the value on a miss
+        tags (iterable): Tags to invalidate this result by
+        ttl (float, optional): Seconds to keep the result, DEFAULT_TTL if None
+
+    Returns:
+        The cached or freshly computed value. Errors are raised, never cached.
+    """
+    key = ("value",) + tuple(key)
+    found, value = _cache.get(key)
+    if found:
+        return value
+
+    tags = tuple(tags)
+    generation = _cache.generation(tags)
+    value = compute()
+    _cache.set(key, value, tags=tags, ttl=ttl, generation=generation)
+    return value
+
+
+def invalidate(*tags):
+    """Drops cached results carrying any of the given tags."""
+    _cache.invalidate(*tags)
+
+
+def clear_cache():
+    """Empties the shared cache (used by tests and after bulk loads)."""
+    _cache.clear()
+
+
+def cache_stats():
+    """Returns the shared cache's hit/miss counters."""
+    return _cache.stats()
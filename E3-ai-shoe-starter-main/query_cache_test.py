@@ -0,0 +1,150 @@
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+from google.cloud import bigquery
+from bigquery_pool import LocalBigQueryBackend, use_local_backend, reset_bigquery_client
+from query_cache import QueryCache, cached_query, clear_cache, cache_stats, invalidate, make_key
+from write_pipeline import flush_writes
+
+
+class TestQueryCache(unittest.TestCase):
+    def test_hit_and_miss_counters(self):
+        cache = QueryCache()
+        self.assertEqual(cache.get("k"), (False, None))
+        cache.set("k", [1, 2])
+        self.assertEqual(cache.get("k"), (True, [1, 2]))
+
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_entries_expire(self):
+        cache = QueryCache()
+        cache.set("k", "v", ttl=0.05)
+        time.sleep(0.1)
+        self.assertEqual(cache.get("k"), (False, None))
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = QueryCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), (True, 1))
+        self.assertEqual(cache.get("b"), (False, None))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_invalidate_by_tag(self):
+        cache = QueryCache()
+        cache.set("posts_user1", 1, tags=["posts:user1"])
+        cache.set("posts_user2", 2, tags=["posts:user2"])
+        cache.set("feed", 3, tags=["posts:user1", "posts:user2"])
+
+        cache.invalidate("posts:user1")
+
+        self.assertEqual(cache.get("posts_user1"), (False, None))
+        self.assertEqual(cache.get("feed"), (False, None))
+        self.assertEqual(cache.get("posts_user2"), (True, 2))
+
+    def test_set_skipped_after_invalidation(self):
+        cache = QueryCache()
+        generation = cache.generation(["posts:user1"])
+        cache.invalidate("posts:user1")
+
+        self.assertFalse(cache.set("posts_user1", 1, tags=["posts:user1"], generation=generation))
+        self.assertEqual(cache.get("posts_user1"), (False, None))
+        self.assertEqual(cache.stats()["stale"], 1)
+
+        # Other tags' generations are unaffected
+        generation = cache.generation(["posts:user2"])
+        self.assertTrue(cache.set("posts_user2", 2, tags=["posts:user2"], generation=generation))
+
+    def test_key_depends_on_parameters(self):
+        config1 = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("u", "STRING", "user1")])
+        config2 = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("u", "STRING", "user2")])
+        self.assertNotEqual(make_key("SELECT @u", config1), make_key("SELECT @u", config2))
+        self.assertEqual(make_key("SELECT  @u", config1), make_key("SELECT @u\n", config1))
+
+
+class TestCachedFetchers(unittest.TestCase):
+    def setUp(self):
+        self.backend = LocalBigQueryBackend()
+        use_local_backend(self.backend)
+        self.addCleanup(use_local_backend, None)
+        self.addCleanup(reset_bigquery_client)
+        clear_cache()
+        self.addCleanup(clear_cache)
+
+    def test_cached_query_runs_once(self):
+        cached_query(self.backend, "SELECT 1")
+        cached_query(self.backend, "SELECT 1")
+        self.assertEqual(len(self.backend.queries), 1)
+
+    def test_rows_read_before_invalidation_are_not_cached(self):
+        def query_racing_a_write(params):
+            invalidate("posts:user1")       # a write lands while the query runs
+            return [{"post_id": "old"}]
+        self.backend.add_result("SELECT posts", query_racing_a_write)
+
+        rows = cached_query(self.backend, "SELECT posts", tags=["posts:user1"])
+        self.assertEqual(rows[0]["post_id"], "old")
+
+        self.backend.add_result("SELECT posts", [{"post_id": "new"}])
+        rows = cached_query(self.backend, "SELECT posts", tags=["posts:user1"])
+        self.assertEqual(rows[0]["post_id"], "new")
+        self.assertEqual(len(self.backend.queries), 2)
+
+    def test_errors_are_not_cached(self):
+        client = MagicMock()
+        client.query.side_effect = [Exception("BigQuery error"), MagicMock()]
+        with self.assertRaises(Exception):
+            cached_query(client, "SELECT 1")
+        cached_query(client, "SELECT 1")
+        self.assertEqual(client.query.call_count, 2)
+
+    def test_create_user_post_invalidates_author_posts(self):
+        from data_fetcher import get_user_posts, create_user_post
+
+        get_user_posts("user1")
+        get_user_posts("user1")
+        self.assertEqual(len(self.backend.queries), 1)
+
+        with patch("data_fetcher.st"):
+            create_user_post("user1", content="Hello")
+        # The cached posts are dropped once the queued row has been written
+        self.assertTrue(flush_writes(timeout=5))
+        self.assertIn("MERGE `e3-ai-shoe-starter.section_e3.Posts`", self.backend.queries[1][0])
+        get_user_posts("user1")
+        self.assertEqual(len(self.backend.queries), 3)
+
+    def test_add_friend_invalidates_both_friend_lists(self):
+        from data_fetcher import get_friends, add_friend
+
+        get_friends("user1")
+        get_friends("user2")
+        add_friend("user1", "user2")
+        get_friends("user1")
+        get_friends("user2")
+
+        friend_queries = [q for q, _ in self.backend.queries if "friend_name" in q]
+        self.assertEqual(len(friend_queries), 4)
+
+    def test_create_challenge_invalidates_challenges(self):
+        from challenge_fetcher import get_challenges, create_challenge
+
+        get_challenges()
+        get_challenges()
+        create_challenge("New", "Rules", "Beginner", "2024-03-01", "2024-03-31", 10.0, 5, 100)
+        get_challenges()
+
+        stats = cache_stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertGreaterEqual(stats["invalidations"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,432 @@
+#############################################################################
+# schema.py
+#
+# This file contains the managed schema for every table the app uses.
+#
+# The hot tables are time-partitioned and clustered on the column every
+# per-user query filters or joins on:
+#
+#   Workouts    partitioned by day of StartTimestamp, clustered by UserId
+#   SensorData  partitioned by day of Timestamp, clustered by WorkoutID
+#   Posts       partitioned by day of Timestamp, clustered by AuthorId
+#
+# so a query for one user (or one workout) reads only that user's blocks
+# instead of the whole table, and date-bounded queries skip old partitions.
+#
+# diff_schema() compares the live dataset with these definitions and
+# apply_schema() carries out the changes. From the command line:
+#
+#     python schema.py            # show what would change
+#     python schema.py --apply    # create / migrate the tables
+#
+# Missing tables are created and missing columns and clustering are added
+# in place. Partitioning cannot be changed on an existing table, so such a
+# table is rebuilt: copied into a partitioned table, which then takes its
+# name. The original is kept as <table>_unpartitioned until it is dropped
+# by hand. Column type changes are only reported.
+#
+# A rebuild is a copy followed by two renames, not one atomic step, and it
+# takes no lock: a row written in between would only reach the backup. It
+# is therefore skipped (reported as manual) unless writes are paused:
+#
+#     1. Take the app offline and stop the batch jobs that write to the
+#        table (points_ledger.py, challenge_status.py, precompute_advice.py,
+#        bulk_loader.py).
+#     2. Wait until the write pipeline's spill (write_pipeline.py) is empty.
+#     3. python schema.py --apply --writes-paused
+#     4. Bring the app back.
+#
+# A table that still has a streaming buffer cannot be renamed, so its
+# rebuild fails until the buffer has been flushed.
+#############################################################################
+
+import argparse
+
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+from bigquery_pool import get_bigquery_client, PROJECT_ID
+from query_cache import clear_cache
+
+
+DATASET_ID = f"{PROJECT_ID}.section_e3"
+DATASET_LOCATION = "US"
+
+# Suffix of the copy kept when a table is rebuilt with partitioning
+BACKUP_SUFFIX = "_unpartitioned"
+
+
+def _field(name, field_type, mode="NULLABLE"):
+    return bigquery.SchemaField(name, field_type, mode=mode)
+
+
+class TableSpec:
+    """
+    Definition of one managed table.
+
+    Args:
+        name (str): Table name inside the dataset
+        schema (list): bigquery.SchemaField for every column
+        partition_field (str, optional): DATE/DATETIME/TIMESTAMP column to
+            partition by day on
+        clustering_fields (list, optional): Up to four columns to cluster on
+    """
+
+    def __init__(self, name, schema, partition_field=None, clustering_fields=None):
+        self.name = name
+        self.schema = schema
+        self.partition_field = partition_field
+        self.clustering_fields = list(clustering_fields) if clustering_fields else None
+
+    @property
+    def table_id(self):
+        return f"{DATASET_ID}.{self.name}"
+
+    def build_table(self):
+        """Returns a bigquery.Table ready to pass to client.create_table."""
+        table = bigquery.Table(self.table_id, schema=self.schema)
+        if self.partition_field:
+            table.time_partitioning = bigquery.TimePartitioning(
+                type_=bigquery.TimePartitioningType.DAY,
+                field=self.partition_field,
+            )
+        if self.clustering_fields:
+            table.clustering_fields = self.clustering_fields
+        return table
+
+
+TABLES = [
+    TableSpec("Users", [
+        _field("UserId", "STRING", "REQUIRED"),
+        _field("Name", "STRING"),
+        _field("Username", "STRING"),
+        _field("DateOfBirth", "DATE"),
+        _field("ImageUrl", "STRING"),
+        _field("auth0_user_id", "STRING"),
+        _field("Email", "STRING"),
+    ], clustering_fields=["UserId"]),
+    TableSpec("Friends", [
+        _field("Userid1", "STRING", "REQUIRED"),
+        _field("Userid2", "STRING", "REQUIRED"),
+    ], clustering_fields=["Userid1"]),
+    TableSpec("Workouts", [
+        _field("WorkoutId", "STRING", "REQUIRED"),
+        _field("UserId", "STRING", "REQUIRED"),
+        _field("StartTimestamp", "DATETIME"),
+        _field("EndTimestamp", "DATETIME"),
+        _field("StartLocationLat", "FLOAT"),
+        _field("StartLocationLong", "FLOAT"),
+        _field("EndLocationLat", "FLOAT"),
+        _field("EndLocationLong", "FLOAT"),
+        _field("TotalDistance", "FLOAT"),
+        _field("TotalSteps", "INTEGER"),
+        _field("CaloriesBurned", "FLOAT"),
+    ], partition_field="StartTimestamp", clustering_fields=["UserId", "WorkoutId"]),
+    TableSpec("SensorData", [
+        _field("SensorId", "STRING", "REQUIRED"),
+        _field("WorkoutID", "STRING", "REQUIRED"),
+        _field("Timestamp", "DATETIME"),
+        _field("SensorValue", "FLOAT"),
+    ], partition_field="Timestamp", clustering_fields=["WorkoutID", "SensorId"]),
+    TableSpec("Posts", [
+        _field("PostId", "STRING", "REQUIRED"),
+        _field("AuthorId", "STRING", "REQUIRED"),
+        _field("Timestamp", "DATETIME"),
+        _field("ImageUrl", "STRING"),
+        _field("Content", "STRING"),
+    ], partition_field="Timestamp", clustering_fields=["AuthorId"]),
+    # Clustered on the dates: status is derived from them, so status filters prune
+    TableSpec("Challenges", [
+        _field("challenge_id", "STRING", "REQUIRED"),
+        _field("title", "STRING", "REQUIRED"),
+        _field("goal_type", "STRING"),
+        _field("goal_value", "FLOAT"),
+        _field("rules", "STRING"),
+        _field("difficulty", "STRING"),
+        _field("start_date", "DATE", "REQUIRED"),
+        _field("end_date", "DATE", "REQUIRED"),
+        _field("goal_miles", "FLOAT"),
+        _field("goal_runs", "INTEGER"),
+        _field("points", "INTEGER"),
+        _field("status", "STRING", "REQUIRED"),
+        _field("max_participants", "INTEGER"),
+    ], clustering_fields=["end_date", "start_date"]),
+    TableSpec("UserChallenges", [
+        _field("user_id", "STRING", "REQUIRED"),
+        _field("challenge_id", "STRING", "REQUIRED"),
+        _field("miles_completed", "FLOAT", "REQUIRED"),
+        _field("runs_completed", "INTEGER", "REQUIRED"),
+        _field("join_timestamp", "TIMESTAMP", "REQUIRED"),
+        _field("status", "STRING", "REQUIRED"),
+    ], clustering_fields=["user_id", "challenge_id"]),
+    TableSpec("UserPoints", [
+        _field("user_id", "STRING", "REQUIRED"),
+        _field("total_points", "INTEGER", "REQUIRED"),
+    ], clustering_fields=["user_id"]),
+    TableSpec("PointsLedger", [
+        _field("award_id", "STRING", "REQUIRED"),
+        _field("user_id", "STRING", "REQUIRED"),
+        _field("challenge_id", "STRING"),
+        _field("points", "INTEGER", "REQUIRED"),
+        _field("awarded_at", "TIMESTAMP", "REQUIRED"),
+    ], partition_field="awarded_at", clustering_fields=["user_id"]),
+    TableSpec("PointsDaily", [
+        _field("day", "DATE", "REQUIRED"),
+        _field("user_id", "STRING", "REQUIRED"),
+        _field("points", "INTEGER", "REQUIRED"),
+    ], partition_field="day", clustering_fields=["user_id"]),
+    TableSpec("PointsWeekly", [
+        _field("week", "DATE", "REQUIRED"),
+        _field("user_id", "STRING", "REQUIRED"),
+        _field("points", "INTEGER", "REQUIRED"),
+    ], partition_field="week", clustering_fields=["user_id"]),
+    TableSpec("PointsRollupState", [
+        _field("rolled_up_to", "TIMESTAMP", "REQUIRED"),
+    ]),
+    TableSpec("ChallengeMilestones", [
+        _field("milestone_id", "STRING", "REQUIRED"),
+        _field("challenge_id", "STRING", "REQUIRED"),
+        _field("milestone_percentage", "INTEGER", "REQUIRED"),
+        _field("description", "STRING", "REQUIRED"),
+    ]),
+    TableSpec("AdviceCache", [
+        _field("fingerprint", "STRING", "REQUIRED"),
+        _field("advice", "STRING", "REQUIRED"),
+        _field("stored_at", "TIMESTAMP", "REQUIRED"),
+        _field("latency", "FLOAT"),
+    ], partition_field="stored_at", clustering_fields=["fingerprint"]),
+    TableSpec("UserMilestones", [
+        _field("user_id", "STRING", "REQUIRED"),
+        _field("milestone_id", "STRING", "REQUIRED"),
+        _field("achieved_timestamp", "TIMESTAMP", "REQUIRED"),
+    ]),
+]
+
+TABLES_BY_NAME = {spec.name: spec for spec in TABLES}
+
+
+def _partition_field(table):
+    partitioning = table.time_partitioning
+    if partitioning is None:
+        return None
+    # Ingestion-time partitioning has no field
+    return partitioning.field or "_PARTITIONTIME"
+
+
+def diff_table(client, spec):
+    """
+    Lists the changes needed to bring one table in line with its spec.
+
+    Args:
+        client: BigQuery client
+        spec (TableSpec): Desired definition
+
+    Returns:
+        list: Change dicts with "table", "action" and "detail" keys. Actions
+            are "create", "add_columns", "set_clustering", "repartition" and
+            "manual" (reported only, never applied).
+    """
+    try:
+        table = client.get_table(spec.table_id)
+    except NotFound:
+        return [{"table": spec.name, "action": "create", "detail": "table does not exist"}]
+
+    changes = []
+    existing = {field.name.lower(): field for field in table.schema}
+
+    missing = [field for field in spec.schema if field.name.lower() not in existing]
+    if missing:
+        changes.append({
+            "table": spec.name,
+            "action": "add_columns",
+            "detail": ", ".join(field.name for field in missing),
+            "fields": missing,
+        })
+
+    for field in spec.schema:
+        current = existing.get(field.name.lower())
+        if current is not None and current.field_type != field.field_type:
+            changes.append({
+                "table": spec.name,
+                "action": "manual",
+                "detail": f"{field.name} is {current.field_type}, expected {field.field_type}",
+            })
+
+    if _partition_field(table) != spec.partition_field:
+        changes.append({
+            "table": spec.name,
+            "action": "repartition",
+            "detail": f"partitioned by {_partition_field(table)}, expected {spec.partition_field}",
+        })
+    elif (table.clustering_fields or None) != spec.clustering_fields:
+        # A rebuild sets clustering too, so this is only needed on its own
+        changes.append({
+            "table": spec.name,
+            "action": "set_clustering",
+            "detail": f"clustered by {table.clustering_fields}, expected {spec.clustering_fields}",
+        })
+
+    return changes
+
+
+def diff_schema(client=None, tables=None):
+    """
+    Lists the changes needed to bring the dataset in line with TABLES.
+
+    Args:
+        client (optional): BigQuery client; the shared one if None
+        tables (list, optional): Table names to check; all of TABLES if None
+
+    Returns:
+        list: Change dicts (see diff_table), plus a "create_dataset" change
+            when the dataset itself is missing
+    """
+    client = client or get_bigquery_client()
+    specs = [TABLES_BY_NAME[name] for name in tables] if tables else TABLES
+
+    try:
+        client.get_dataset(DATASET_ID)
+    except NotFound:
+        changes = [{"table": None, "action": "create_dataset", "detail": DATASET_ID}]
+        changes += [{"table": spec.name, "action": "create", "detail": "table does not exist"} for spec in specs]
+        return changes
+
+    changes = []
+    for spec in specs:
+        changes += diff_table(client, spec)
+    return changes
+
+
+def _rebuild_script(spec):
+    """DDL that copies a table into a partitioned, clustered one under the same name."""
+    new_name = f"{spec.name}_partitioned"
+    partition_by = ""
+    if spec.partition_field:
+        field_type = next(field.field_type for field in spec.schema if field.name == spec.partition_field)
+        column = spec.partition_field if field_type == "DATE" else f"DATE({spec.partition_field})"
+        partition_by = f"PARTITION BY {column}"
+    cluster_by = f"CLUSTER BY {', '.join(spec.clustering_fields)}" if spec.clustering_fields else ""
+    return f"""
+    CREATE TABLE `{DATASET_ID}.{new_name}`
+    {partition_by}
+    {cluster_by}
+    AS SELECT * FROM `{spec.table_id}`;
+
+    ALTER TABLE `{spec.table_id}` RENAME TO `{spec.name}{BACKUP_SUFFIX}`;
+    ALTER TABLE `{DATASET_ID}.{new_name}` RENAME TO `{spec.name}`;
+    """
+
+
+def apply_change(client, change, writes_paused=False):
+    """
+    Carries out one change from diff_schema.
+
+    Args:
+        client: BigQuery client
+        change (dict): Change to apply
+        writes_paused (bool): Nothing is writing to the tables, so a table
+            may be rebuilt (see the header)
+
+    Returns:
+        bool: True if the change was applied, False if it needs manual work
+
+    Raises:
+        RuntimeError: If a table to rebuild still has a streaming buffer
+    """
+    action = change["action"]
+    spec = TABLES_BY_NAME.get(change["table"])
+
+    if action == "create_dataset":
+        dataset = bigquery.Dataset(DATASET_ID)
+        dataset.location = DATASET_LOCATION
+        client.create_dataset(dataset, exists_ok=True)
+    elif action == "create":
+        client.create_table(spec.build_table(), exists_ok=True)
+    elif action == "add_columns":
+        table = client.get_table(spec.table_id)
+        table.schema = list(table.schema) + list(change["fields"])
+        client.update_table(table, ["schema"])
+    elif action == "set_clustering":
+        table = client.get_table(spec.table_id)
+        table.clustering_fields = spec.clustering_fields
+        client.update_table(table, ["clustering_fields"])
+    elif action == "repartition":
+        if not writes_paused:
+            return False
+        if client.get_table(spec.table_id).streaming_buffer is not None:
+            raise RuntimeError("table has a streaming buffer; retry once it has been flushed")
+        client.query(_rebuild_script(spec)).result()
+    else:
+        return False
+    return True
+
+
+def apply_schema(changes=None, client=None, writes_paused=False):
+    """
+    Applies schema changes, in order.
+
+    Args:
+        changes (list, optional): Output of diff_schema; computed if None
+        client (optional): BigQuery client; the shared one if None
+        writes_paused (bool): Allow table rebuilds; only pass True once
+            every writer has been stopped (see the header)
+
+    Returns:
+        dict: Counts of "applied", "manual" and "failed" changes
+    """
+    client = client or get_bigquery_client()
+    if changes is None:
+        changes = diff_schema(client)
+
+    result = {"applied": 0, "manual": 0, "failed": 0}
+    for change in changes:
+        try:
+            if apply_change(client, change, writes_paused=writes_paused):
+                result["applied"] += 1
+                print(f"Applied {change['action']} on {change['table']}: {change['detail']}")
+            elif change["action"] == "repartition":
+                result["manual"] += 1
+                print(f"Skipped rebuild of {change['table']} ({change['detail']}): "
+                      f"pause all writes and re-run with --writes-paused")
+            else:
+                result["manual"] += 1
+                print(f"Needs manual change on {change['table']}: {change['detail']}")
+        except Exception as e:
+            result["failed"] += 1
+            print(f"Error applying {change['action']} on {change['table']}: {e}")
+
+    if result["applied"]:
+        # Rebuilt tables may have been read into the cache just before
+        clear_cache()
+    return result
+
+
+def ensure_tables(client=None, tables=None):
+    """Creates any of `tables` (all if None) that do not exist yet, leaving existing ones alone."""
+    client = client or get_bigquery_client()
+    changes = diff_schema(client, tables)
+    creates = [change for change in changes if change["action"] in ("create_dataset", "create")]
+    return apply_schema(creates, client)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create and migrate the app's BigQuery tables.")
+    parser.add_argument("--apply", action="store_true",
+                        help="Apply the changes instead of only listing them. Tables that need a rebuild "
+                             "(repartition) are skipped unless --writes-paused is also given")
+    parser.add_argument("--writes-paused", action="store_true",
+                        help="Confirm the app and batch jobs are stopped, so tables may be rebuilt; "
+                             "rows written during a rebuild would be lost")
+    parser.add_argument("--table", action="append", choices=sorted(TABLES_BY_NAME), help="Only this table (repeatable)")
+    args = parser.parse_args()
+
+    pending = diff_schema(tables=args.table)
+    if not pending:
+        print("Schema is up to date.")
+    for change in pending:
+        print(f"{change['action']:>15}  {change['table'] or ''}  {change['detail']}")
+
+    if args.apply and pending:
+        print(f"\nDone: {apply_schema(pending, writes_paused=args.writes_paused)}")
+    elif pending:
+        print("\nDry run only. Re-run with --apply to make these changes.")
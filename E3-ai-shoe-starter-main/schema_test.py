@@ -0,0 +1,109 @@
+import unittest
+from unittest.mock import MagicMock
+
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+from schema import TABLES_BY_NAME, apply_schema, diff_schema, diff_table
+
+
+def _live_table(name, fields=None, partition_field=None, clustering_fields=None):
+    spec = TABLES_BY_NAME[name]
+    table = bigquery.Table(spec.table_id, schema=fields if fields is not None else spec.schema)
+    if partition_field:
+        table.time_partitioning = bigquery.TimePartitioning(field=partition_field)
+    if clustering_fields:
+        table.clustering_fields = clustering_fields
+    return table
+
+
+class TestSchema(unittest.TestCase):
+    def test_spec_builds_partitioned_clustered_table(self):
+        table = TABLES_BY_NAME["Workouts"].build_table()
+
+        self.assertEqual(table.time_partitioning.field, "StartTimestamp")
+        self.assertEqual(table.time_partitioning.type_, "DAY")
+        self.assertEqual(table.clustering_fields, ["UserId", "WorkoutId"])
+
+    def test_hot_tables_are_partitioned_and_clustered(self):
+        self.assertEqual(TABLES_BY_NAME["SensorData"].partition_field, "Timestamp")
+        self.assertEqual(TABLES_BY_NAME["SensorData"].clustering_fields[0], "WorkoutID")
+        self.assertEqual(TABLES_BY_NAME["Posts"].partition_field, "Timestamp")
+        self.assertEqual(TABLES_BY_NAME["Posts"].clustering_fields, ["AuthorId"])
+
+    def test_up_to_date_table_has_no_changes(self):
+        client = MagicMock()
+        client.get_table.return_value = _live_table("Posts", partition_field="Timestamp", clustering_fields=["AuthorId"])
+
+        self.assertEqual(diff_table(client, TABLES_BY_NAME["Posts"]), [])
+
+    def test_missing_table_is_created(self):
+        client = MagicMock()
+        client.get_table.side_effect = NotFound("missing")
+
+        changes = diff_schema(client, tables=["Workouts"])
+
+        self.assertEqual([c["action"] for c in changes], ["create"])
+        apply_schema(changes, client)
+        created = client.create_table.call_args[0][0]
+        self.assertEqual(created.time_partitioning.field, "StartTimestamp")
+
+    def test_unpartitioned_table_is_rebuilt(self):
+        client = MagicMock()
+        client.get_table.return_value = _live_table("SensorData")
+
+        changes = diff_table(client, TABLES_BY_NAME["SensorData"])
+
+        self.assertEqual([c["action"] for c in changes], ["repartition"])
+        result = apply_schema(changes, client, writes_paused=True)
+        script = client.query.call_args[0][0]
+        self.assertIn("PARTITION BY DATE(Timestamp)", script)
+        self.assertIn("CLUSTER BY WorkoutID, SensorId", script)
+        self.assertIn("RENAME TO `SensorData_unpartitioned`", script)
+        self.assertEqual(result["applied"], 1)
+
+    def test_rebuild_needs_writes_paused(self):
+        client = MagicMock()
+        client.get_table.return_value = _live_table("SensorData")
+        changes = diff_table(client, TABLES_BY_NAME["SensorData"])
+
+        self.assertEqual(apply_schema(changes, client), {"applied": 0, "manual": 1, "failed": 0})
+        client.query.assert_not_called()
+
+    def test_rebuild_refused_while_streaming_buffer_exists(self):
+        table = _live_table("SensorData")
+        table._properties["streamingBuffer"] = {"estimatedRows": "10"}
+        client = MagicMock()
+        client.get_table.return_value = table
+        changes = diff_table(client, TABLES_BY_NAME["SensorData"])
+
+        self.assertEqual(apply_schema(changes, client, writes_paused=True), {"applied": 0, "manual": 0, "failed": 1})
+        client.query.assert_not_called()
+
+    def test_missing_columns_and_clustering_are_added_in_place(self):
+        spec = TABLES_BY_NAME["Posts"]
+        client = MagicMock()
+        client.get_table.return_value = _live_table("Posts", fields=spec.schema[:3], partition_field="Timestamp")
+
+        changes = diff_table(client, spec)
+
+        self.assertEqual([c["action"] for c in changes], ["add_columns", "set_clustering"])
+        self.assertEqual(changes[0]["detail"], "ImageUrl, Content")
+        apply_schema(changes, client)
+        self.assertEqual(client.update_table.call_count, 2)
+        client.query.assert_not_called()
+
+    def test_type_mismatch_is_only_reported(self):
+        fields = [bigquery.SchemaField("user_id", "STRING"), bigquery.SchemaField("total_points", "FLOAT")]
+        client = MagicMock()
+        client.get_table.return_value = _live_table("UserPoints", fields=fields, clustering_fields=["user_id"])
+
+        changes = diff_table(client, TABLES_BY_NAME["UserPoints"])
+        result = apply_schema(changes, client)
+
+        self.assertEqual(result, {"applied": 0, "manual": 1, "failed": 0})
+        client.update_table.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
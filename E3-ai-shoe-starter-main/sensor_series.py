@@ -0,0 +1,204 @@
+#############################################################################
+# sensor_series.py
+#
+# This file contains SensorSeries, a columnar store for one sensor's samples.
+#
+# The shoe sensors report at a high rate, so a long run can have hundreds of
+# thousands of samples. Each sensor keeps its timestamps and values as two
+# contiguous NumPy arrays instead of one dict per sample, and can be reduced
+# to a few hundred points with LTTB (Largest-Triangle-Three-Buckets) before
+# it is charted, which keeps the visual shape of the series.
+#############################################################################
+
+import numpy as np
+
+from workout_frame import to_datetime64
+
+
+SENSOR_UNITS = {
+    "sensor1": "bpm",
+    "sensor2": "steps",
+    "sensor3": "°C",
+}
+
+# Points drawn per sensor chart
+CHART_POINTS = 500
+
+
+class SensorSeries:
+    """
+    Timestamps and values of one sensor, sorted by time.
+
+    Args:
+        sensor_id (str): Sensor ID, e.g. "sensor1"
+        timestamps (array-like): Sample times (datetime, ISO string or datetime64)
+        values (array-like): Sample values
+        units (str, optional): Units of the values, looked up from the ID if None
+    """
+
+    def __init__(self, sensor_id, timestamps, values, units=None):
+        self.sensor_id = sensor_id
+        self.units = units or SENSOR_UNITS.get(sensor_id, "unit")
+        self.timestamps = to_datetime64(timestamps)
+        self.values = np.asarray(values, dtype=np.float64)
+
+        if len(self.timestamps) != len(self.values):
+            raise ValueError("timestamps and values must have the same length")
+
+        order = np.argsort(self.timestamps, kind="stable")
+        if not np.array_equal(order, np.arange(len(order))):
+            self.timestamps = self.timestamps[order]
+            self.values = self.values[order]
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def nbytes(self):
+        """Memory held by the timestamp and value arrays."""
+        return self.timestamps.nbytes + self.values.nbytes
+
+    def downsample(self, max_points=CHART_POINTS):
+        """
+        Returns a series of at most `max_points` samples chosen with LTTB.
+
+        Args:
+            max_points (int): Target number of points (at least 3)
+
+        Returns:
+            SensorSeries: This series if it is already small enough
+        """
+        if len(self) <= max_points:
+            return self
+        x = self.timestamps.astype(np.int64).astype(np.float64)
+        keep = lttb_indices(x, self.values, max_points)
+        return SensorSeries(self.sensor_id, self.timestamps[keep], self.values[keep], units=self.units)
+
+    def to_chart_data(self, max_points=CHART_POINTS):
+        """Returns {"timestamp": ..., <units>: ...} arrays ready for st.line_chart."""
+        series = self.downsample(max_points)
+        return {
+            "timestamp": series.timestamps,
+            series.units: series.values,
+        }
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Picks `threshold` indices of (x, y) with Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. The points in between are
+    split into threshold - 2 buckets and, from each bucket, the point that
+    forms the largest triangle with the previously kept point and the average
+    of the next bucket is kept.
+
+    Args:
+        x (np.ndarray): Increasing x values
+        y (np.ndarray): y values
+        threshold (int): Number of points to keep (at least 3)
+
+    Returns:
+        np.ndarray: Sorted indices of the kept points
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bucket edges over the interior points 1 .. n-2
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_lo, next_hi = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_lo, next_hi = n - 1, n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+
+        # Twice the triangle area; the constant factor does not change argmax
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi]) * (avg_y - y[previous])
+        )
+        previous = lo + int(np.argmax(areas))
+        indices[bucket + 1] = previous
+
+    return indices
+
+
+def series_from_columns(sensor_ids, timestamps, values):
+    """
+    Splits flat sensor columns into one SensorSeries per sensor.
+
+    Args:
+        sensor_ids (array-like): Sensor ID of each sample
+        timestamps (array-like): Time of each sample
+        values (array-like): Value of each sample
+
+    Returns:
+        dict: sensor_id -> SensorSeries
+    """
+    sensor_ids = np.asarray(sensor_ids, dtype=object)
+    timestamps = to_datetime64(timestamps)
+    values = np.asarray(values, dtype=np.float64)
+
+    series = {}
+    for sensor_id in sorted(set(sensor_ids)):
+        mask = sensor_ids == sensor_id
+        series[sensor_id] = SensorSeries(sensor_id, timestamps[mask], values[mask])
+    return series
+
+
+class SensorBatch:
+    """
+    One page of sensor samples, as typed columns.
+
+    Args:
+        sensor_ids (array-like): Sensor ID of each sample
+        timestamps (array-like): Time of each sample
+        values (array-like): Value of each sample
+    """
+
+    def __init__(self, sensor_ids, timestamps, values):
+        self.sensor_ids = np.asarray(sensor_ids, dtype=object)
+        self.timestamps = to_datetime64(timestamps)
+        self.values = np.asarray(values, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.values)
+
+    def by_sensor(self):
+        """Returns this batch split into one SensorSeries per sensor."""
+        return series_from_columns(self.sensor_ids, self.timestamps, self.values)
+
+
+def series_from_batches(batches):
+    """
+    Joins a stream of SensorBatch pages into one SensorSeries per sensor.
+
+    Only the typed arrays of each page are kept while the stream is read.
+
+    Args:
+        batches (iterable): SensorBatch objects
+
+    Returns:
+        dict: sensor_id -> SensorSeries
+    """
+    parts = {}
+    for batch in batches:
+        for sensor_id, series in batch.by_sensor().items():
+            parts.setdefault(sensor_id, []).append(series)
+
+    return {
+        sensor_id: SensorSeries(
+            sensor_id,
+            np.concatenate([part.timestamps for part in pieces]),
+            np.concatenate([part.values for part in pieces]),
+        )
+        for sensor_id, pieces in sorted(parts.items())
+    }
@@ -0,0 +1,72 @@
+import time
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+from sensor_series import SensorSeries, SensorBatch, lttb_indices, series_from_columns, series_from_batches
+
+
+class TestSensorSeries(unittest.TestCase):
+    def test_units_and_sorting(self):
+        series = SensorSeries(
+            "sensor1",
+            ["2024-01-01T10:00:02", "2024-01-01T10:00:00", "2024-01-01T10:00:01"],
+            [120, 100, 110],
+        )
+        self.assertEqual(series.units, "bpm")
+        self.assertEqual(list(series.values), [100.0, 110.0, 120.0])
+        self.assertEqual(series.timestamps.dtype, np.dtype("datetime64[us]"))
+
+    def test_series_from_columns(self):
+        start = datetime(2024, 1, 1, 10)
+        series = series_from_columns(
+            ["sensor1", "sensor2", "sensor1", "sensor3"],
+            [start, start, start + timedelta(seconds=1), start],
+            [100, 5, 101, 36.5],
+        )
+        self.assertEqual(sorted(series), ["sensor1", "sensor2", "sensor3"])
+        self.assertEqual(len(series["sensor1"]), 2)
+        self.assertEqual(series["sensor3"].units, "°C")
+
+    def test_lttb_keeps_endpoints_and_peaks(self):
+        x = np.arange(1000, dtype=np.float64)
+        y = np.zeros(1000)
+        y[500] = 50.0
+        keep = lttb_indices(x, y, 20)
+        self.assertEqual(len(keep), 20)
+        self.assertEqual(keep[0], 0)
+        self.assertEqual(keep[-1], 999)
+        self.assertIn(500, keep)
+        self.assertTrue(np.all(np.diff(keep) > 0))
+
+    def test_small_series_is_not_downsampled(self):
+        series = SensorSeries("sensor2", ["2024-01-01T10:00:00"], [1])
+        self.assertIs(series.downsample(10), series)
+
+    def test_long_series_downsamples_quickly(self):
+        n = 300_000
+        timestamps = np.datetime64("2024-01-01T10:00:00", "us") + np.arange(n).astype("timedelta64[s]")
+        values = 120 + 20 * np.sin(np.arange(n) / 1000.0)
+        series = SensorSeries("sensor1", timestamps, values)
+
+        began = time.perf_counter()
+        chart = series.to_chart_data(500)
+        elapsed = time.perf_counter() - began
+
+        self.assertEqual(len(chart["bpm"]), 500)
+        self.assertEqual(series.nbytes, n * 16)
+        self.assertLess(elapsed, 1.0)
+
+
+    def test_series_from_batches(self):
+        start = datetime(2024, 1, 1, 10)
+        batches = [
+            SensorBatch(["sensor1", "sensor1"], [start, start + timedelta(seconds=1)], [100, 101]),
+            SensorBatch(["sensor1", "sensor2"], [start + timedelta(seconds=2), start], [102, 7]),
+        ]
+        series = series_from_batches(batches)
+        self.assertEqual(list(series["sensor1"].values), [100.0, 101.0, 102.0])
+        self.assertEqual(len(series["sensor2"]), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+import unittest
+from collections import Counter
+from datetime import date
+
+from synthetic_data import TABLE_ORDER, SyntheticDataset, write_dataset
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+AS_OF = date(2025, 6, 1)
+
+
+def _dataset(**kwargs):
+    settings = dict(users=30, workouts_per_user=4, posts_per_user=2, friends_per_user=6,
+                    challenges=8, sensor_ratio=0.2, seed=7, as_of=AS_OF)
+    settings.update(kwargs)
+    return SyntheticDataset(**settings)
+
+
+class TestSyntheticDataset(unittest.TestCase):
+    def test_same_seed_gives_same_rows(self):
+        for table in TABLE_ORDER:
+            self.assertEqual(list(_dataset().rows(table)), list(_dataset().rows(table)), table)
+
+    def test_different_seed_gives_different_rows(self):
+        self.assertNotEqual(list(_dataset().rows("Workouts")), list(_dataset(seed=8).rows("Workouts")))
+
+    def test_friendships_are_symmetric_and_unique(self):
+        pairs = [(row["Userid1"], row["Userid2"]) for row in _dataset().rows("Friends")]
+
+        self.assertTrue(pairs)
+        self.assertEqual(len(pairs), len(set(pairs)))
+        self.assertEqual(set(pairs), {(b, a) for a, b in pairs})
+        self.assertFalse(any(a == b for a, b in pairs))
+
+    def test_sensor_rows_belong_to_workouts(self):
+        dataset = _dataset()
+        workouts = {row["WorkoutId"]: row for row in dataset.rows("Workouts")}
+
+        sensors = list(dataset.rows("SensorData"))
+
+        self.assertTrue(sensors)
+        for row in sensors[:500]:
+            workout = workouts[row["WorkoutID"]]
+            self.assertTrue(workout["StartTimestamp"] <= row["Timestamp"] <= workout["EndTimestamp"])
+        self.assertEqual(set(Counter(row["SensorId"] for row in sensors)), {"sensor1", "sensor2", "sensor3"})
+
+    def test_user_points_match_completed_challenges(self):
+        dataset = _dataset()
+        challenges = {row["challenge_id"]: row for row in dataset.rows("Challenges")}
+        expected = Counter()
+        for row in dataset.rows("UserChallenges"):
+            if row["status"] == "done":
+                expected[row["user_id"]] += challenges[row["challenge_id"]]["points"]
+
+        points = {row["user_id"]: row["total_points"] for row in dataset.rows("UserPoints")}
+        ledger = Counter()
+        for award in dataset.rows("PointsLedger"):
+            ledger[award["user_id"]] += award["points"]
+            self.assertLessEqual(award["awarded_at"].date(), AS_OF)
+
+        self.assertEqual(points, dict(expected))
+        self.assertEqual(points, dict(ledger))
+
+    def test_challenge_status_follows_dates(self):
+        for row in _dataset().rows("Challenges"):
+            if row["status"] == "upcoming":
+                self.assertGreater(row["start_date"], AS_OF)
+            elif row["status"] == "closed":
+                self.assertLess(row["end_date"], AS_OF)
+            else:
+                self.assertTrue(row["start_date"] <= AS_OF <= row["end_date"])
+
+
+class TestWriteDataset(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_ndjson_files(self):
+        written = write_dataset(_dataset(), self.tmp.name, tables=["Users", "Workouts"])
+
+        with open(written["Workouts"]["path"], encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(len(rows), written["Workouts"]["rows"])
+        self.assertRegex(rows[0]["StartTimestamp"], r"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d$")
+        self.assertEqual(set(written), {"Users", "Workouts"})
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, "Users.ndjson")))
+
+    @unittest.skipIf(pq is None, "pyarrow not installed")
+    def test_parquet_files_are_typed(self):
+        written = write_dataset(_dataset(), self.tmp.name, fmt="parquet", tables=["Posts"])
+
+        table = pq.read_table(written["Posts"]["path"])
+        self.assertEqual(table.num_rows, written["Posts"]["rows"])
+        self.assertEqual(str(table.schema.field("Timestamp").type), "timestamp[us]")
+
+
+if __name__ == "__main__":
+    unittest.main()
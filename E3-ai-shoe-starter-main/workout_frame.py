@@ -0,0 +1,189 @@
+#############################################################################
+# workout_frame.py
+#
+# This file contains WorkoutFrame, a columnar container for a user's workouts.
+#
+# Each field is stored as one NumPy array (datetime64 start/end times, float
+# distance and calories, int steps) so totals, durations, pace and per-day or
+# per-week grouping are array operations instead of a Python loop per row.
+#############################################################################
+
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+TIME_UNIT = "datetime64[us]"
+
+
+class WorkoutFrame:
+    """
+    Array-backed collection of workouts.
+
+    Args:
+        workout_ids (array-like): Workout IDs
+        start (array-like): Start times (datetime, ISO string or datetime64)
+        end (array-like): End times (datetime, ISO string or datetime64)
+        distance (array-like): Distance of each workout
+        steps (array-like): Steps of each workout
+        calories (array-like): Calories burned in each workout
+        start_lat_lng (list, optional): (lat, lng) where each workout started
+        end_lat_lng (list, optional): (lat, lng) where each workout ended
+    """
+
+    def __init__(self, workout_ids, start, end, distance, steps, calories,
+                 start_lat_lng=None, end_lat_lng=None):
+        self.workout_ids = np.asarray(workout_ids, dtype=object)
+        self.start = to_datetime64(start)
+        self.end = to_datetime64(end)
+        self.distance = np.asarray(distance, dtype=np.float64)
+        self.steps = np.asarray(steps, dtype=np.int64)
+        self.calories = np.asarray(calories, dtype=np.float64)
+        n = len(self.workout_ids)
+        self.start_lat_lng = list(start_lat_lng) if start_lat_lng is not None else [None] * n
+        self.end_lat_lng = list(end_lat_lng) if end_lat_lng is not None else [None] * n
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Builds a frame straight from Workouts query result rows."""
+        rows = list(rows)
+        return cls(
+            workout_ids=[row.WorkoutId for row in rows],
+            start=[row.StartTimestamp for row in rows],
+            end=[row.EndTimestamp for row in rows],
+            distance=[row.TotalDistance or 0 for row in rows],
+            steps=[row.TotalSteps or 0 for row in rows],
+            calories=[row.CaloriesBurned or 0 for row in rows],
+            start_lat_lng=[(row.StartLocationLat, row.StartLocationLong) for row in rows],
+            end_lat_lng=[(row.EndLocationLat, row.EndLocationLong) for row in rows],
+        )
+
+    @classmethod
+    def from_workouts(cls, workouts):
+        """Builds a frame from the workout dicts returned by get_user_workouts."""
+        workouts = list(workouts)
+        return cls(
+            workout_ids=[w["workout_id"] for w in workouts],
+            start=[w["start_timestamp"] for w in workouts],
+            end=[w["end_timestamp"] for w in workouts],
+            distance=[w["distance"] or 0 for w in workouts],
+            steps=[w["steps"] or 0 for w in workouts],
+            calories=[w["calories_burned"] or 0 for w in workouts],
+            start_lat_lng=[w.get("start_lat_lng") for w in workouts],
+            end_lat_lng=[w.get("end_lat_lng") for w in workouts],
+        )
+
+    def __len__(self):
+        return len(self.workout_ids)
+
+    def select(self, mask):
+        """Returns a new frame with only the workouts where `mask` is True."""
+        mask = np.asarray(mask, dtype=bool)
+        return WorkoutFrame(
+            self.workout_ids[mask], self.start[mask], self.end[mask],
+            self.distance[mask], self.steps[mask], self.calories[mask],
+            start_lat_lng=[v for v, keep in zip(self.start_lat_lng, mask) if keep],
+            end_lat_lng=[v for v, keep in zip(self.end_lat_lng, mask) if keep],
+        )
+
+    def latest_index(self):
+        """Returns the position of the most recently started workout (0 if none has a start time)."""
+        valid = np.flatnonzero(~np.isnat(self.start))
+        if len(valid) == 0:
+            return 0
+        return int(valid[np.argmax(self.start[valid])])
+
+    # Totals
+
+    def total_distance(self):
+        return float(self.distance.sum())
+
+    def total_steps(self):
+        return int(self.steps.sum())
+
+    def total_calories(self):
+        return float(self.calories.sum())
+
+    def durations_minutes(self):
+        """Returns each workout's duration in minutes (NaN if a time is missing)."""
+        return (self.end - self.start) / np.timedelta64(1, "m")
+
+    def total_minutes(self):
+        return float(np.nansum(self.durations_minutes()))
+
+    # Pace
+
+    def pace(self):
+        """Returns minutes per unit of distance for each workout (NaN if no distance)."""
+        durations = self.durations_minutes()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.distance > 0, durations / self.distance, np.nan)
+
+    def average_pace(self):
+        """Returns overall minutes per unit of distance, or None with no distance."""
+        distance = self.total_distance()
+        if distance <= 0:
+            return None
+        return self.total_minutes() / distance
+
+    # Grouping
+
+    def daily_totals(self):
+        """Returns totals grouped by calendar day of the start time."""
+        return self._group_totals(self.start.astype("datetime64[D]"))
+
+    def weekly_totals(self):
+        """Returns totals grouped by week, each week starting on Monday."""
+        days = self.start.astype("datetime64[D]")
+        # 1970-01-01 was a Thursday, so shift by 3 days to land on Mondays
+        weekday = (days.astype(np.int64) + 3) % 7
+        return self._group_totals(days - weekday.astype("timedelta64[D]"))
+
+    def _group_totals(self, keys):
+        valid = ~np.isnat(keys)
+        keys = keys[valid]
+        periods, inverse = np.unique(keys, return_inverse=True)
+        size = len(periods)
+        durations = np.nan_to_num(self.durations_minutes()[valid])
+        return {
+            "period": periods,
+            "workouts": np.bincount(inverse, minlength=size),
+            "distance": np.bincount(inverse, weights=self.distance[valid], minlength=size),
+            "steps": np.bincount(inverse, weights=self.steps[valid], minlength=size).astype(np.int64),
+            "calories": np.bincount(inverse, weights=self.calories[valid], minlength=size),
+            "minutes": np.bincount(inverse, weights=durations, minlength=size),
+        }
+
+    def summary(self):
+        """Returns the headline totals as plain Python numbers."""
+        return {
+            "workouts": len(self),
+            "total_distance": self.total_distance(),
+            "total_steps": self.total_steps(),
+            "total_calories": self.total_calories(),
+            "total_minutes": self.total_minutes(),
+            "average_pace": self.average_pace(),
+        }
+
+
+def to_datetime64(values):
+    """Converts datetimes / ISO strings / datetime64 values to a datetime64 array."""
+    if isinstance(values, np.ndarray) and np.issubdtype(values.dtype, np.datetime64):
+        return values.astype(TIME_UNIT)
+
+    converted = []
+    for value in values:
+        if isinstance(value, datetime) and value.tzinfo is not None:
+            # TIMESTAMP columns come back timezone-aware; store them as naive UTC
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        elif value in ("", "None"):
+            value = None
+        converted.append(value)
+    return np.array(converted, dtype=TIME_UNIT)
+
+
+def to_datetime(value):
+    """Converts a numpy datetime64 back to a Python datetime (None for NaT)."""
+    if np.isnat(value):
+        return None
+    return value.astype("datetime64[us]").item()
@@ -0,0 +1,100 @@
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import numpy as np
+from workout_frame import WorkoutFrame, to_datetime
+
+
+class TestWorkoutFrame(unittest.TestCase):
+    def setUp(self):
+        self.workouts = [
+            {
+                'workout_id': 'w1',
+                'start_timestamp': '2024-01-01 10:00:00',
+                'end_timestamp': '2024-01-01 10:30:00',
+                'start_lat_lng': (1.0, 1.0),
+                'end_lat_lng': (1.5, 1.5),
+                'distance': 2.5,
+                'steps': 3000,
+                'calories_burned': 120,
+            },
+            {
+                'workout_id': 'w2',
+                'start_timestamp': '2024-01-01 18:00:00',
+                'end_timestamp': '2024-01-01 18:45:00',
+                'start_lat_lng': (2.0, 2.0),
+                'end_lat_lng': (2.5, 2.5),
+                'distance': 3.5,
+                'steps': 4500,
+                'calories_burned': 180,
+            },
+            {
+                'workout_id': 'w3',
+                'start_timestamp': '2024-01-08 07:00:00',
+                'end_timestamp': '2024-01-08 08:00:00',
+                'start_lat_lng': (3.0, 3.0),
+                'end_lat_lng': (3.5, 3.5),
+                'distance': 0,
+                'steps': 1000,
+                'calories_burned': 50,
+            },
+        ]
+        self.frame = WorkoutFrame.from_workouts(self.workouts)
+
+    def test_totals(self):
+        self.assertEqual(len(self.frame), 3)
+        self.assertEqual(self.frame.total_distance(), 6.0)
+        self.assertEqual(self.frame.total_steps(), 8500)
+        self.assertEqual(self.frame.total_calories(), 350.0)
+        self.assertAlmostEqual(self.frame.total_minutes(), 135.0)
+        self.assertEqual(self.frame.start.dtype, np.dtype('datetime64[us]'))
+
+    def test_pace(self):
+        pace = self.frame.pace()
+        self.assertAlmostEqual(pace[0], 12.0)
+        self.assertTrue(np.isnan(pace[2]))
+        self.assertAlmostEqual(self.frame.average_pace(), 135.0 / 6.0)
+
+    def test_latest_index_ignores_order(self):
+        self.assertEqual(self.frame.workout_ids[self.frame.latest_index()], 'w3')
+        newest_first = WorkoutFrame.from_workouts(list(reversed(self.workouts)))
+        self.assertEqual(newest_first.latest_index(), 0)
+        self.assertEqual(WorkoutFrame([], [], [], [], [], []).latest_index(), 0)
+
+    def test_daily_totals(self):
+        daily = self.frame.daily_totals()
+        self.assertEqual([str(d) for d in daily['period']], ['2024-01-01', '2024-01-08'])
+        self.assertEqual(list(daily['workouts']), [2, 1])
+        self.assertEqual(list(daily['distance']), [6.0, 0.0])
+        self.assertEqual(list(daily['steps']), [7500, 1000])
+
+    def test_weekly_totals_start_on_monday(self):
+        weekly = self.frame.weekly_totals()
+        # 2024-01-01 and 2024-01-08 are both Mondays
+        self.assertEqual([str(d) for d in weekly['period']], ['2024-01-01', '2024-01-08'])
+        self.assertAlmostEqual(weekly['minutes'][0], 75.0)
+
+    def test_from_rows(self):
+        row = MagicMock(
+            WorkoutId='w1',
+            StartTimestamp=datetime(2024, 1, 1, 10, 0, tzinfo=timezone.utc),
+            EndTimestamp=datetime(2024, 1, 1, 11, 0, tzinfo=timezone.utc),
+            TotalDistance=5.0,
+            TotalSteps=6000,
+            CaloriesBurned=None,
+        )
+        frame = WorkoutFrame.from_rows([row])
+        self.assertEqual(frame.total_minutes(), 60.0)
+        self.assertEqual(frame.total_calories(), 0.0)
+        self.assertEqual(to_datetime(frame.start[0]), datetime(2024, 1, 1, 10, 0))
+
+    def test_empty(self):
+        frame = WorkoutFrame.from_workouts([])
+        self.assertEqual(frame.total_distance(), 0.0)
+        self.assertIsNone(frame.average_pace())
+        self.assertEqual(len(frame.weekly_totals()['period']), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
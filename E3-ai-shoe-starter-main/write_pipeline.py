@@ -0,0 +1,479 @@
+#############################################################################
+# write_pipeline.py
+#
+# This file contains the write-behind pipeline for new workouts and posts.
+#
+# Each DML INSERT used to be its own BigQuery job, which takes seconds and
+# counts against DML quotas. Rows are now put on a bounded in-memory queue
+# and acknowledged straight away; a background thread groups them and writes
+# each table's rows with one MERGE statement, either when a batch is full or
+# when the flush interval passes.
+#
+# Every row carries a unique key (its WorkoutId / PostId, see ROW_KEYS) and
+# the MERGE only inserts keys the table does not have yet, so a batch that
+# is retried or replayed is never written twice. MERGE is a DML job, not a
+# streaming insert, so new rows never sit in a streaming buffer that would
+# block UPDATE/DELETE (migrate_ids.py) or a table rebuild (schema.py). When
+# the queue is full, callers wait briefly and then get WriteQueueFull
+# instead of growing memory without bound. Pending rows are flushed when
+# the process exits.
+#
+# Rows are acknowledged before they are written, so a batch that still
+# fails after every retry is not dropped: it is saved as one object in
+# Cloud Storage (WRITE_SPILL_BUCKET/WRITE_SPILL_PREFIX), which outlives the
+# Cloud Run instance, and replayed every REPLAY_INTERVAL seconds by any
+# instance until it is written. A row is written at least once; the MERGE
+# on its key keeps the table at one copy of it.
+#
+# The background thread is started by start_write_pipeline(), which app.py
+# calls on startup, or by the first write.
+#############################################################################
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+from google.cloud import bigquery, storage
+
+from bigquery_pool import get_bigquery_client
+from query_cache import invalidate
+from schema import TABLES
+
+
+MAX_QUEUE = 10000           # rows waiting to be written
+MAX_BATCH = 500             # rows per MERGE statement
+FLUSH_INTERVAL = 1.0        # seconds a row may wait for its batch to fill
+PUT_TIMEOUT = 2.0           # seconds a caller waits when the queue is full
+MAX_RETRIES = 5
+RETRY_BACKOFF = 0.5         # seconds, doubled after each failed attempt
+REPLAY_INTERVAL = 60.0      # seconds between replays of spilled rows
+
+WRITE_SPILL_BUCKET = os.getenv("WRITE_SPILL_BUCKET", "e3-ai-shoe-starter")
+WRITE_SPILL_PREFIX = os.getenv("WRITE_SPILL_PREFIX", "write-spill/")
+
+# Table name -> column holding the unique key the MERGE deduplicates on
+ROW_KEYS = {
+    "Workouts": "WorkoutId",
+    "Posts": "PostId",
+}
+
+# BigQuery schema types -> types to CAST the JSON values to
+_SQL_TYPES = {
+    "INTEGER": "INT64",
+    "FLOAT": "FLOAT64",
+    "BOOLEAN": "BOOL",
+}
+
+_COLUMN_SEPARATOR = ",\n            "
+
+_COLUMN_TYPES = {spec.table_id: {field.name: field.field_type for field in spec.schema} for spec in TABLES}
+
+
+class WriteQueueFull(Exception):
+    """Raised when the write queue stays full for longer than PUT_TIMEOUT."""
+
+
+def merge_sql(table, columns):
+    """
+    Returns the MERGE that inserts the rows in @rows whose key is not in `table` yet.
+
+    Args:
+        table (str): Full table ID, e.g. "project.dataset.Workouts"
+        columns (list): Columns the rows carry; the key column must be one of them
+
+    Raises:
+        ValueError: If the table has no entry in ROW_KEYS
+    """
+    name = table.rsplit(".", 1)[-1]
+    if name not in ROW_KEYS:
+        raise ValueError(f"No row key known for {table}")
+    key = ROW_KEYS[name]
+    types = _COLUMN_TYPES.get(table, {})
+
+    values = []
+    for column in columns:
+        value = f"JSON_VALUE(r, '$.{column}')"
+        field_type = types.get(column, "STRING")
+        if field_type != "STRING":
+            value = f"CAST({value} AS {_SQL_TYPES.get(field_type, field_type)})"
+        values.append(f"{value} AS {column}")
+
+    return f"""
+    MERGE `{table}` t
+    USING (
+        SELECT
+            {_COLUMN_SEPARATOR.join(values)}
+        FROM UNNEST(@rows) AS r
+    ) s
+    ON t.{key} = s.{key}
+    WHEN NOT MATCHED THEN
+        INSERT ({", ".join(columns)})
+        VALUES ({", ".join(f"s.{column}" for column in columns)})
+    """
+
+
+class GcsSpill:
+    """
+    Failed batches kept as one JSON object each in a Cloud Storage bucket.
+
+    Args:
+        bucket (str): Bucket name
+        prefix (str): Object name prefix of the spilled batches
+    """
+
+    def __init__(self, bucket=WRITE_SPILL_BUCKET, prefix=WRITE_SPILL_PREFIX):
+        self.bucket = bucket
+        self.prefix = prefix
+        self._bucket = None
+
+    def __str__(self):
+        return f"gs://{self.bucket}/{self.prefix}"
+
+    def save(self, table, items):
+        """Stores one batch under a new object name."""
+        name = f"{self.prefix}{uuid.uuid4()}.json"
+        self._get_bucket().blob(name).upload_from_string(_dump_batch(table, items),
+                                                         content_type="application/json")
+
+    def names(self):
+        """Returns the names of every spilled batch."""
+        return [blob.name for blob in self._get_bucket().list_blobs(prefix=self.prefix)]
+
+    def load(self, name):
+        """Returns (table, items) of one spilled batch."""
+        return _load_batch(self._get_bucket().blob(name).download_as_text())
+
+    def delete(self, name):
+        """Removes a batch once it has been written; another instance may have done so already."""
+        try:
+            self._get_bucket().blob(name).delete()
+        except Exception as e:
+            print(f"[WARN] Could not delete spilled batch {name}: {e}")
+
+    def _get_bucket(self):
+        if self._bucket is None:
+            self._bucket = storage.Client().bucket(self.bucket)
+        return self._bucket
+
+
+class DirectorySpill:
+    """
+    Failed batches kept as one JSON file each in a local directory.
+
+    Only for tests and local runs: a container's disk does not outlive it.
+
+    Args:
+        path (str): Directory the batches are written to
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __str__(self):
+        return self.path
+
+    def save(self, table, items):
+        """Stores one batch under a new file name."""
+        os.makedirs(self.path, exist_ok=True)
+        name = f"{uuid.uuid4()}.json"
+        tmp_path = os.path.join(self.path, f"{name}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(_dump_batch(table, items))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, name))
+
+    def names(self):
+        """Returns the names of every spilled batch."""
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name for name in os.listdir(self.path) if name.endswith(".json"))
+
+    def load(self, name):
+        """Returns (table, items) of one spilled batch."""
+        with open(os.path.join(self.path, name), "r", encoding="utf-8") as f:
+            return _load_batch(f.read())
+
+    def delete(self, name):
+        """Removes a batch once it has been written."""
+        try:
+            os.remove(os.path.join(self.path, name))
+        except FileNotFoundError:
+            pass
+
+
+def _dump_batch(table, items):
+    return json.dumps({
+        "table": table,
+        "rows": [{"row_id": row_id, "row": row, "tags": list(tags)} for row_id, row, tags in items],
+    }, default=str)
+
+
+def _load_batch(text):
+    batch = json.loads(text)
+    return batch["table"], [(item["row_id"], item["row"], tuple(item["tags"])) for item in batch["rows"]]
+
+
+class WritePipeline:
+    """
+    Bounded queue of rows, written to BigQuery in batches by a background thread.
+
+    Args:
+        max_queue (int): Rows that may wait before callers are pushed back
+        max_batch (int): Rows written per batch
+        flush_interval (float): Seconds before a partial batch is written
+        put_timeout (float): Seconds submit() waits for room in the queue
+        max_retries (int): Attempts per batch before its rows are spilled
+        retry_backoff (float): Seconds before the first retry
+        spill (optional): GcsSpill or DirectorySpill failed batches are kept
+            in until replayed; None drops them (after logging) into failed_rows
+        replay_interval (float): Seconds between replays of the spilled batches
+    """
+
+    def __init__(self, max_queue=MAX_QUEUE, max_batch=MAX_BATCH, flush_interval=FLUSH_INTERVAL,
+                 put_timeout=PUT_TIMEOUT, max_retries=MAX_RETRIES, retry_backoff=RETRY_BACKOFF,
+                 spill=None, replay_interval=REPLAY_INTERVAL):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.spill = spill
+        self.replay_interval = replay_interval
+        self._next_replay = 0.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = 0                       # queued or being written
+        self._idle = threading.Condition()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.failed_rows = []                   # (table, row_id, row) dropped, never written
+        self.stats = {"submitted": 0, "written": 0, "batches": 0, "retries": 0, "failed": 0,
+                      "spilled": 0, "replayed": 0, "dropped": 0}
+
+    def submit(self, table, row, row_id, tags=()):
+        """
+        Queues one row and returns without waiting for BigQuery.
+
+        Args:
+            table (str): Full table ID, e.g. "project.dataset.Workouts"
+            row (dict): Column name -> JSON-serializable value
+            row_id (str): The row's unique key (its ROW_KEYS column)
+            tags (iterable): Query-cache tags to invalidate once it is written
+
+        Returns:
+            str: The row_id
+
+        Raises:
+            WriteQueueFull: The queue stayed full for `put_timeout` seconds
+        """
+        self._ensure_started()
+        with self._idle:
+            self._pending += 1
+            self.stats["submitted"] += 1
+        try:
+            self._queue.put((table, row_id, row, tuple(tags)), timeout=self.put_timeout)
+        except queue.Full:
+            with self._idle:
+                self.stats["submitted"] -= 1
+            self._done(1)
+            raise WriteQueueFull("too many pending writes, please try again")
+        return row_id
+
+    def start(self):
+        """Starts the background thread, which replays spilled batches straight away."""
+        self._ensure_started(replay_now=True)
+
+    def flush(self, timeout=None):
+        """
+        Waits until every queued row has been written (or given up on).
+
+        Args:
+            timeout (float, optional): Seconds to wait; forever if None
+
+        Returns:
+            bool: True if the queue drained in time
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout=timeout)
+
+    def close(self, timeout=10):
+        """Flushes pending rows and stops the background thread."""
+        if self._thread is None:
+            return
+        self.flush(timeout=timeout)
+        self._stopping.set()
+        self._thread.join(timeout=timeout)
+        self._thread = None
+        self._stopping.clear()
+
+    def pending(self):
+        """Rows queued or being written right now."""
+        with self._idle:
+            return self._pending
+
+    def replay_spilled(self):
+        """
+        Writes the spilled batches; a batch that fails again stays spilled.
+
+        Other instances may replay the same batch at the same time. The MERGE
+        on each row's key means the rows still land only once.
+
+        Returns:
+            int: Rows written
+        """
+        if not self.spill:
+            return 0
+
+        written = 0
+        for name in self.spill.names():
+            try:
+                table, items = self.spill.load(name)
+            except Exception as e:
+                print(f"[ERROR] Could not read spilled batch {name}: {e}")
+                continue
+            if self._merge_with_retries(table, items, attempts=1):
+                written += len(items)
+                invalidate(*{tag for _, _, tags in items for tag in tags})
+                self.spill.delete(name)
+
+        self.stats["replayed"] += written
+        if written:
+            print(f"[INFO] Replayed {written} spilled rows")
+        return written
+
+    def _spill(self, table, items):
+        """Keeps rows that could not be written in the spill store, or drops them if it cannot."""
+        if self.spill:
+            try:
+                self.spill.save(table, items)
+                self.stats["spilled"] += len(items)
+                print(f"[ERROR] Spilled {len(items)} rows for {table} to {self.spill}; they will be replayed")
+                return
+            except Exception as e:
+                print(f"[ERROR] Could not spill rows for {table}: {e}")
+
+        self.stats["dropped"] += len(items)
+        self.failed_rows.extend((table, row_id, row) for row_id, row, _ in items)
+        print(f"[ERROR] Dropped {len(items)} rows for {table}: {[row_id for row_id, _, _ in items]}")
+
+    def _ensure_started(self, replay_now=False):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                # A thread started by a write replays on the normal schedule
+                self._next_replay = 0.0 if replay_now else time.monotonic() + self.replay_interval
+                self._thread = threading.Thread(target=self._run, name="write-pipeline", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            if time.monotonic() >= self._next_replay:
+                self._next_replay = time.monotonic() + self.replay_interval
+                try:
+                    self.replay_spilled()
+                except Exception as e:
+                    print(f"[ERROR] Replaying spilled writes failed: {e}")
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def _next_batch(self):
+        """Collects up to max_batch rows, waiting at most flush_interval after the first."""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        by_table = {}
+        for table, row_id, row, tags in batch:
+            by_table.setdefault(table, []).append((row_id, row, tags))
+
+        for table, items in by_table.items():
+            if self._merge_with_retries(table, items):
+                self.stats["written"] += len(items)
+                invalidate(*{tag for _, _, tags in items for tag in tags})
+            else:
+                self.stats["failed"] += len(items)
+                self._spill(table, items)
+            self.stats["batches"] += 1
+            self._done(len(items))
+
+    def _merge_with_retries(self, table, items, attempts=None):
+        # One row per key; MERGE would insert both copies of a key seen twice in a batch
+        rows = list({row_id: row for row_id, row, _ in items}.values())
+        columns = list(dict.fromkeys(column for row in rows for column in row))
+        attempts = attempts or self.max_retries
+        delay = self.retry_backoff
+
+        for attempt in range(attempts):
+            try:
+                job_config = bigquery.QueryJobConfig(query_parameters=[
+                    bigquery.ArrayQueryParameter("rows", "STRING", [json.dumps(row, default=str) for row in rows]),
+                ])
+                get_bigquery_client().query(merge_sql(table, columns), job_config=job_config).result()
+                return True
+            except Exception as e:
+                print(f"[WARN] Merge into {table} failed: {e}")
+
+            if attempt + 1 < attempts:
+                # Retrying is safe: rows a failed attempt did write are skipped by key
+                self.stats["retries"] += 1
+                time.sleep(delay)
+                delay *= 2
+
+        print(f"Error writing {len(rows)} rows to {table}; giving up after {attempts} attempts")
+        return False
+
+    def _done(self, count):
+        with self._idle:
+            self._pending -= count
+            if self._pending == 0:
+                self._idle.notify_all()
+
+
+# One pipeline per server process, shared by every Streamlit session
+_pipeline = WritePipeline(spill=GcsSpill())
+
+# Write whatever is still queued when the server shuts down
+atexit.register(_pipeline.close)
+
+
+def start_write_pipeline():
+    """
+    Starts the shared pipeline so rows spilled by earlier instances are
+    replayed even before anything new is written. Safe to call on every rerun.
+    """
+    _pipeline.start()
+
+
+def enqueue_row(table, row, row_id, tags=()):
+    """Queues a row on the shared pipeline. See WritePipeline.submit."""
+    return _pipeline.submit(table, row, row_id, tags=tags)
+
+
+def flush_writes(timeout=None):
+    """Waits for the shared pipeline to write everything queued so far."""
+    return _pipeline.flush(timeout=timeout)
+
+
+def write_stats():
+    """Returns the shared pipeline's counters and current backlog."""
+    return dict(_pipeline.stats, pending=_pipeline.pending())
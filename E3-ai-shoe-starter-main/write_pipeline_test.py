@@ -0,0 +1,182 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from bigquery_pool import LocalBigQueryBackend, use_local_backend, reset_bigquery_client
+from write_pipeline import DirectorySpill, WritePipeline, WriteQueueFull, merge_sql
+
+
+TABLE = "e3-ai-shoe-starter.section_e3.Workouts"
+MERGE = f"MERGE `{TABLE}`"
+
+
+class TestWritePipeline(unittest.TestCase):
+    def setUp(self):
+        self.backend = LocalBigQueryBackend()
+        use_local_backend(self.backend)
+        self.addCleanup(use_local_backend, None)
+        self.addCleanup(reset_bigquery_client)
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.spill = DirectorySpill(os.path.join(tmp_dir.name, "spill"))
+
+    def _pipeline(self, **kwargs):
+        kwargs.setdefault("spill", self.spill)
+        pipeline = WritePipeline(**kwargs)
+        self.addCleanup(pipeline.close)
+        return pipeline
+
+    def _merges(self):
+        """Rows of every MERGE sent, one list per statement."""
+        return [[json.loads(row) for row in params["rows"]]
+                for query, params in self.backend.queries if query.strip().startswith("MERGE")]
+
+    def _fail_merges(self, error="quota exceeded"):
+        def fail(params):
+            raise Exception(error)
+        self.backend.add_result(MERGE, fail)
+
+    def test_rows_are_batched_by_size(self):
+        pipeline = self._pipeline(max_batch=3, flush_interval=0.5)
+        for n in range(6):
+            pipeline.submit(TABLE, {"WorkoutId": f"w{n}"}, row_id=f"w{n}")
+        self.assertTrue(pipeline.flush(timeout=5))
+
+        merges = self._merges()
+        self.assertEqual([len(rows) for rows in merges], [3, 3])
+        self.assertEqual([row["WorkoutId"] for row in merges[0]], ["w0", "w1", "w2"])
+        self.assertEqual(pipeline.stats["written"], 6)
+
+    def test_merge_only_inserts_new_keys(self):
+        sql = merge_sql(TABLE, ["WorkoutId", "StartTimestamp", "TotalSteps"])
+        self.assertIn("ON t.WorkoutId = s.WorkoutId", sql)
+        self.assertIn("WHEN NOT MATCHED THEN", sql)
+        self.assertIn("CAST(JSON_VALUE(r, '$.StartTimestamp') AS DATETIME)", sql)
+        self.assertIn("CAST(JSON_VALUE(r, '$.TotalSteps') AS INT64)", sql)
+        with self.assertRaises(ValueError):
+            merge_sql("e3-ai-shoe-starter.section_e3.Friends", ["Userid1"])
+
+    def test_duplicate_keys_in_a_batch_are_sent_once(self):
+        pipeline = self._pipeline(max_batch=10, flush_interval=0.2)
+        pipeline.submit(TABLE, {"WorkoutId": "w1", "TotalSteps": 1}, row_id="w1")
+        pipeline.submit(TABLE, {"WorkoutId": "w1", "TotalSteps": 2}, row_id="w1")
+        self.assertTrue(pipeline.flush(timeout=5))
+        self.assertEqual(self._merges(), [[{"WorkoutId": "w1", "TotalSteps": 2}]])
+
+    def test_partial_batch_is_flushed_after_interval(self):
+        pipeline = self._pipeline(max_batch=100, flush_interval=0.1)
+        started = time.monotonic()
+        pipeline.submit(TABLE, {"WorkoutId": "w1"}, row_id="w1")
+        self.assertTrue(pipeline.flush(timeout=5))
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(len(self._merges()), 1)
+
+    def test_submit_returns_before_write(self):
+        pipeline = self._pipeline(flush_interval=0.2)
+        release = threading.Event()
+        self.backend.add_result(MERGE, lambda params: release.wait(5) and [])
+
+        started = time.monotonic()
+        pipeline.submit(TABLE, {"WorkoutId": "w1"}, row_id="w1")
+        self.assertLess(time.monotonic() - started, 0.1)
+        self.assertEqual(pipeline.pending(), 1)
+        release.set()
+        self.assertTrue(pipeline.flush(timeout=5))
+
+    def test_full_queue_pushes_back(self):
+        pipeline = self._pipeline(max_queue=1, put_timeout=0.05, flush_interval=0.05)
+        release = threading.Event()
+        self.backend.add_result(MERGE, lambda params: release.wait(5) and [])
+
+        pipeline.submit(TABLE, {"WorkoutId": "w1"}, row_id="w1")
+        time.sleep(0.2)     # w1 is now being written, holding up the thread
+        pipeline.submit(TABLE, {"WorkoutId": "w2"}, row_id="w2")
+        with self.assertRaises(WriteQueueFull):
+            pipeline.submit(TABLE, {"WorkoutId": "w3"}, row_id="w3")
+
+        release.set()
+        self.assertTrue(pipeline.flush(timeout=5))
+        self.assertEqual(pipeline.stats["submitted"], 2)
+
+    def test_retries_resend_the_same_rows(self):
+        pipeline = self._pipeline(flush_interval=0.05, retry_backoff=0.01)
+        outcomes = [Exception("503"), Exception("backend"), []]
+
+        def merge(params):
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        self.backend.add_result(MERGE, merge)
+
+        pipeline.submit(TABLE, {"WorkoutId": "w1"}, row_id="w1")
+        self.assertTrue(pipeline.flush(timeout=5))
+
+        self.assertEqual(self._merges(), [[{"WorkoutId": "w1"}]] * 3)
+        self.assertEqual(pipeline.stats["retries"], 2)
+        self.assertEqual(pipeline.stats["written"], 1)
+
+    def test_failed_rows_are_spilled_and_replayed(self):
+        pipeline = self._pipeline(flush_interval=0.05, retry_backoff=0.01, max_retries=2)
+        self._fail_merges()
+
+        pipeline.submit(TABLE, {"WorkoutId": "w1"}, row_id="w1", tags=["workouts:user1"])
+        self.assertTrue(pipeline.flush(timeout=5))
+        pipeline.close()
+
+        self.assertEqual(pipeline.stats["failed"], 1)
+        self.assertEqual(pipeline.stats["spilled"], 1)
+        self.assertEqual(pipeline.failed_rows, [])
+        self.assertEqual(len(self.spill.names()), 1)
+
+        # The next instance replays the spilled batch as soon as it starts
+        self.backend.add_result(MERGE, [])
+        self.backend.queries.clear()
+        restarted = self._pipeline(flush_interval=0.05)
+        restarted.start()
+        deadline = time.monotonic() + 5
+        while restarted.stats["replayed"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(restarted.stats["replayed"], 1)
+        self.assertEqual(self._merges(), [[{"WorkoutId": "w1"}]])
+        self.assertEqual(self.spill.names(), [])
+
+    def test_batch_failing_replay_stays_spilled(self):
+        pipeline = self._pipeline(spill=self.spill)
+        self.spill.save(TABLE, [("w1", {"WorkoutId": "w1"}, ())])
+        self._fail_merges()
+
+        self.assertEqual(pipeline.replay_spilled(), 0)
+        self.assertEqual(len(self.spill.names()), 1)
+
+    def test_rows_dropped_without_spill(self):
+        pipeline = self._pipeline(flush_interval=0.05, retry_backoff=0.01, max_retries=2, spill=None)
+        self._fail_merges()
+
+        pipeline.submit(TABLE, {"WorkoutId": "w1"}, row_id="w1")
+        self.assertTrue(pipeline.flush(timeout=5))
+
+        self.assertEqual(pipeline.stats["dropped"], 1)
+        self.assertEqual(pipeline.failed_rows, [(TABLE, "w1", {"WorkoutId": "w1"})])
+
+    @patch("write_pipeline.invalidate")
+    def test_tags_invalidated_after_write(self, mock_invalidate):
+        pipeline = self._pipeline(flush_interval=0.05)
+        pipeline.submit(TABLE, {"WorkoutId": "w1"}, row_id="w1", tags=["workouts:user1"])
+        self.assertTrue(pipeline.flush(timeout=5))
+        mock_invalidate.assert_called_once_with("workouts:user1")
+
+    def test_close_flushes_pending_rows(self):
+        pipeline = WritePipeline(flush_interval=0.05, spill=self.spill)
+        pipeline.submit(TABLE, {"WorkoutId": "w1"}, row_id="w1")
+        pipeline.close()
+        self.assertEqual(len(self._merges()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()